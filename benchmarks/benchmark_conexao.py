@@ -0,0 +1,55 @@
+"""Latência por rerun do Streamlit: conexão nova a cada rerun x pool de conexões.
+
+Uso:
+    python -m benchmarks.benchmark_conexao --repeticoes 200
+"""
+import argparse
+
+import psycopg2
+
+from benchmarks.comum import cronometrar, imprimir_tabela, parametros_benchmark, preparar_banco
+from model.bancodedados import BancoDados
+
+CONSULTA_RERUN = "SELECT COUNT(*) FROM eletronicos"
+
+
+def rerun_sem_pool():
+    """Comportamento antigo: conecta, verifica o esquema, consulta e descarta a conexão"""
+    conexao = psycopg2.connect(**parametros_benchmark())
+    cursor = conexao.cursor()
+    cursor.execute("""
+        SELECT EXISTS (
+            SELECT FROM information_schema.tables
+            WHERE table_name = 'itens'
+        )
+    """)
+    cursor.fetchone()
+    cursor.execute(CONSULTA_RERUN)
+    cursor.fetchone()
+    conexao.close()
+
+
+def rerun_com_pool(banco):
+    """Comportamento novo: o esquema já foi verificado e a conexão vem do pool"""
+    with banco._cursor() as cursor:
+        cursor.execute(CONSULTA_RERUN)
+        cursor.fetchone()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=200)
+    args = parser.parse_args()
+
+    preparar_banco()
+    banco = BancoDados()
+
+    resultados = [
+        dict(cenario="conexão por rerun", **cronometrar(rerun_sem_pool, args.repeticoes)),
+        dict(cenario="pool de conexões", **cronometrar(lambda: rerun_com_pool(banco), args.repeticoes)),
+    ]
+    imprimir_tabela(resultados, ["cenario", "media_ms", "p50_ms", "p99_ms", "max_ms"])
+
+
+if __name__ == "__main__":
+    main()
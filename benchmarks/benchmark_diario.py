@@ -0,0 +1,79 @@
+"""Tempo para esvaziar o diário offline de vendas, por tamanho de lote do sincronizador.
+
+Grava N vendas no diário (como se o banco tivesse ficado fora do ar),
+sincroniza com cada tamanho de lote e mede vendas por segundo. Depois
+sincroniza de novo as mesmas chaves para conferir que nenhuma venda é
+contada duas vezes.
+
+Uso:
+    python -m benchmarks.benchmark_diario --vendas 5000 --lotes 1 50 200 1000
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.comum import imprimir_tabela, popular_banco, preparar_banco
+from benchmarks.estresse_pdv import estoque_total
+from model.bancodedados import BancoDados
+from model.diario_vendas import PENDENTE, DiarioVendas, SincronizadorDiario
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vendas", type=int, default=2000)
+    parser.add_argument("--lotes", type=int, nargs="+", default=[1, 50, 200, 1000])
+    args = parser.parse_args()
+
+    preparar_banco()
+    banco = BancoDados()
+    # Chaves novas a cada execução: vendas_idempotencia não é apagada entre execuções
+    execucao = time.time_ns()
+    linhas = []
+    for tamanho_lote in args.lotes:
+        # Um lote por venda: cada venda baixa uma unidade e nenhuma passa do estoque
+        popular_banco(banco, freezers=4, lotes=args.vendas)
+        lotes = banco.listar_lotes()
+        estoque_inicial, _ = estoque_total(banco)
+
+        pasta = tempfile.mkdtemp(prefix="diario_benchmark_")
+        diario = DiarioVendas(os.path.join(pasta, "vendas.sqlite3"))
+        for n in range(args.vendas):
+            lote = lotes[n % len(lotes)]
+            diario.registrar(f"bench-{execucao}-{tamanho_lote}-{n}", {
+                "data": datetime.now(), "operador": "benchmark", "forma_pagamento": "Dinheiro", "desconto": 0.0,
+                "reserva_cupom": None,
+                "carrinho": [{"id": lote["id"], "nome": lote["nome"], "sabor": lote["sabor"],
+                              "valor_venda": lote["valor_venda"], "quantidade": 1}],
+            })
+
+        sincronizador = SincronizadorDiario(diario, banco, lote=tamanho_lote)
+        inicio = time.perf_counter()
+        totais = sincronizador.sincronizar()
+        segundos = time.perf_counter() - inicio
+
+        # Reenvia tudo: o banco tem de ignorar todas as chaves
+        diario.marcar([f"bench-{execucao}-{tamanho_lote}-{n}" for n in range(args.vendas)], PENDENTE)
+        repetidas = sincronizador.sincronizar()
+        estoque_final, _ = estoque_total(banco)
+        diario.fechar()
+
+        linhas.append({
+            "lote": tamanho_lote,
+            "vendas": args.vendas,
+            "segundos": round(segundos, 3),
+            "vendas_por_s": round(totais["aplicadas"] / segundos, 1) if segundos else "-",
+            "aplicadas": totais["aplicadas"],
+            "reenvio_aplicadas": repetidas["aplicadas"],
+            "baixado": estoque_inicial - estoque_final,
+        })
+
+    imprimir_tabela(linhas, ["lote", "vendas", "segundos", "vendas_por_s", "aplicadas", "reenvio_aplicadas", "baixado"])
+    if any(linha["reenvio_aplicadas"] or linha["baixado"] != linha["aplicadas"] for linha in linhas):
+        raise SystemExit("❌ O reenvio do diário contou vendas duas vezes.")
+    print("✅ Reenvio do diário não duplicou nenhuma venda.")
+
+
+if __name__ == "__main__":
+    main()
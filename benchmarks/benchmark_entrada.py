@@ -0,0 +1,68 @@
+"""Entrada de estoque: adicionar_item linha a linha x adicionar_itens_em_lote (COPY + upsert).
+
+Uso:
+    python -m benchmarks.benchmark_entrada --linhas 10000 --linhas-unitarias 1000
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+from benchmarks.comum import imprimir_tabela, popular_banco, preparar_banco
+from model.bancodedados import BancoDados
+from model.item import Item
+
+
+def linhas_entrega(quantidade, freezers):
+    """Linhas de uma entrega: metade reabastece lotes já existentes, metade cria lotes novos"""
+    return [
+        {
+            "nome": f"Picolé {n % 40}",
+            "sabor": f"Sabor {n % 25}",
+            "valor_compra": 1.5,
+            "valor_venda": 4.0 + n % 7,
+            "quantidade": 1 + n % 12,
+            "validade": date.today() + timedelta(days=30 + n % 90),
+            "freezer_id": 1 + n % freezers,
+            "codigo_barras": f"789{n % (quantidade // 2 or 1):010d}"
+        }
+        for n in range(quantidade)
+    ]
+
+
+def medir(cenario, linhas, funcao):
+    inicio = time.perf_counter()
+    funcao()
+    duracao = time.perf_counter() - inicio
+    return {"cenario": cenario, "linhas": linhas, "segundos": round(duracao, 3), "linhas_por_s": round(linhas / duracao)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linhas", type=int, default=10_000)
+    parser.add_argument("--linhas-unitarias", type=int, default=1_000)
+    parser.add_argument("--freezers", type=int, default=20)
+    args = parser.parse_args()
+
+    preparar_banco()
+    banco = BancoDados()
+    resultados = []
+
+    popular_banco(banco, freezers=args.freezers, lotes=0)
+    unitarias = linhas_entrega(args.linhas_unitarias, args.freezers)
+
+    def uma_a_uma():
+        for linha in unitarias:
+            item = Item(**{campo: valor for campo, valor in linha.items() if campo != "freezer_id"})
+            banco.adicionar_item(item, linha["freezer_id"])
+
+    resultados.append(medir("adicionar_item", len(unitarias), uma_a_uma))
+
+    popular_banco(banco, freezers=args.freezers, lotes=0)
+    lote = linhas_entrega(args.linhas, args.freezers)
+    resultados.append(medir("adicionar_itens_em_lote", len(lote), lambda: banco.adicionar_itens_em_lote(lote)))
+
+    imprimir_tabela(resultados, ["cenario", "linhas", "segundos", "linhas_por_s"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Página Financeiro: lista completa filtrada em Python x agregações e paginação no banco.
+
+Uso:
+    python -m benchmarks.benchmark_financeiro --lancamentos 10000 200000
+"""
+import argparse
+from datetime import date, timedelta
+
+from benchmarks.comum import cronometrar, imprimir_tabela, popular_banco, preparar_banco
+from model.bancodedados import BancoDados
+
+
+def pagina_em_python(banco, inicio, fim):
+    """O que a página fazia antes: carregar o período inteiro e agregar na aplicação"""
+    resultados = banco.listar_lancamentos(inicio, fim)
+    sum(l["valor"] for l in resultados if l["tipo"] == "Receita")
+    sum(l["valor"] for l in resultados if l["tipo"] == "Despesa")
+    tipos = set(l["tipo"] for l in resultados)
+    categorias = set(l["categoria"] for l in resultados)
+    operadores = set(l["operador"] for l in resultados)
+    [l for l in resultados if l["tipo"] in tipos and l["categoria"] in categorias and l["operador"] in operadores]
+    por_dia = {}
+    for l in resultados:
+        por_dia.setdefault((l["data"], l["tipo"]), 0)
+        por_dia[(l["data"], l["tipo"])] += l["valor"]
+
+
+def pagina_no_banco(banco, inicio, fim):
+    banco.totais_financeiro(inicio, fim)
+    banco.facetas_financeiro(inicio, fim)
+    banco.listar_lancamentos_pagina(inicio, fim, limite=50)
+    banco.financeiro_por_dia(inicio, fim)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lancamentos", type=int, nargs="+", default=[10_000, 200_000])
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+
+    preparar_banco()
+    banco = BancoDados()
+    fim = date.today()
+    inicio = fim - timedelta(days=365)
+
+    resultados = []
+    for tamanho in args.lancamentos:
+        popular_banco(banco, freezers=2, lotes=10, lancamentos=tamanho)
+        resultados.append(dict(
+            lancamentos=tamanho, cenario="lista + Python",
+            **cronometrar(lambda: pagina_em_python(banco, inicio, fim), args.repeticoes)
+        ))
+        resultados.append(dict(
+            lancamentos=tamanho, cenario="SQL + paginação",
+            **cronometrar(lambda: pagina_no_banco(banco, inicio, fim), args.repeticoes)
+        ))
+
+    imprimir_tabela(resultados, ["lancamentos", "cenario", "media_ms", "p50_ms", "p99_ms", "max_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Tempo de parede das leituras de cada página: uma após a outra (síncrono) x ao mesmo tempo (asyncio).
+
+Usa dois controladores sem cache sobre o mesmo banco populado: um com as
+leituras assíncronas desligadas, que chama os métodos de BancoDados em
+sequência, e outro que as dispara juntas pelo BancoDadosAsync.
+
+Uso:
+    python -m benchmarks.benchmark_leituras_async --lotes 200000 --lancamentos 1000000
+"""
+import argparse
+from datetime import date, timedelta
+
+from benchmarks.comum import cronometrar, imprimir_tabela, popular_banco, preparar_banco
+from controller.controlador_item import ControladorItem
+from model.bancodedados import BancoDados
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--freezers", type=int, default=50)
+    parser.add_argument("--lotes", type=int, default=50_000)
+    parser.add_argument("--lancamentos", type=int, default=500_000)
+    parser.add_argument("--repeticoes", type=int, default=30)
+    args = parser.parse_args()
+
+    preparar_banco()
+    popular_banco(BancoDados(), freezers=args.freezers, lotes=args.lotes, lancamentos=args.lancamentos)
+
+    fim = date.today()
+    inicio = fim - timedelta(days=365)
+    paginas = {
+        "Estoque Aberto": lambda c: c.obter_pagina_estoque("Estoque Aberto"),
+        "Estoque Fechado": lambda c: c.obter_pagina_estoque("Estoque Fechado"),
+        "Financeiro (resumo)": lambda c: c.obter_resumo_financeiro_periodo(inicio, fim),
+        "Financeiro (tabela e gráfico)": lambda c: c.obter_lancamentos_e_grafico(inicio, fim),
+    }
+
+    sincrono = ControladorItem(ttl_cache=0, leituras_async=False)
+    assincrono = ControladorItem(ttl_cache=0, leituras_async=True)
+
+    linhas = []
+    for pagina, ler in paginas.items():
+        antes = cronometrar(lambda: ler(sincrono), args.repeticoes)
+        depois = cronometrar(lambda: ler(assincrono), args.repeticoes)
+        linhas.append({
+            "pagina": pagina,
+            "sincrono_p50_ms": antes["p50_ms"],
+            "async_p50_ms": depois["p50_ms"],
+            "sincrono_p99_ms": antes["p99_ms"],
+            "async_p99_ms": depois["p99_ms"],
+            "ganho": f"{antes['p50_ms'] / depois['p50_ms']:.2f}x" if depois["p50_ms"] else "-",
+        })
+
+    imprimir_tabela(linhas, ["pagina", "sincrono_p50_ms", "async_p50_ms", "sincrono_p99_ms", "async_p99_ms", "ganho"])
+
+
+if __name__ == "__main__":
+    main()
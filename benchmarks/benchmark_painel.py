@@ -0,0 +1,51 @@
+"""Painel de ambiente: sete consultas separadas x uma consulta com CTEs.
+
+Uso:
+    python -m benchmarks.benchmark_painel --tamanhos 10000 100000
+"""
+import argparse
+
+from benchmarks.comum import cronometrar, imprimir_tabela, popular_banco, preparar_banco
+from model.bancodedados import BancoDados
+
+AMBIENTE = "Estoque Aberto"
+
+
+def painel_separado(banco):
+    """Consultas feitas pela página antes do painel consolidado"""
+    banco.calcular_estoque()
+    banco.calcular_estoque_por_ambiente(AMBIENTE)
+    banco.calcular_consumo_energia(0.90, AMBIENTE)
+    banco.listar_status_freezers(AMBIENTE)
+    banco.top_produtos(ambiente=AMBIENTE)
+    banco.calcular_total_armazenamento()
+    banco.buscar_produto(None, ambiente=AMBIENTE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--freezers", type=int, default=20)
+    parser.add_argument("--repeticoes", type=int, default=30)
+    args = parser.parse_args()
+
+    preparar_banco()
+    banco = BancoDados()
+
+    resultados = []
+    for tamanho in args.tamanhos:
+        popular_banco(banco, freezers=args.freezers, lotes=tamanho)
+        resultados.append(dict(
+            itens=tamanho, cenario="7 consultas",
+            **cronometrar(lambda: painel_separado(banco), args.repeticoes)
+        ))
+        resultados.append(dict(
+            itens=tamanho, cenario="painel_ambiente",
+            **cronometrar(lambda: banco.painel_ambiente(AMBIENTE), args.repeticoes)
+        ))
+
+    imprimir_tabela(resultados, ["itens", "cenario", "media_ms", "p50_ms", "p99_ms", "max_ms"])
+
+
+if __name__ == "__main__":
+    main()
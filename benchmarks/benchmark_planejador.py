@@ -0,0 +1,58 @@
+"""Tempo do planejador de rebalanceamento para redes grandes de freezers e sabores.
+
+Não usa banco de dados.
+
+Uso:
+    python -m benchmarks.benchmark_planejador --tamanhos 20x30 200x150 500x300
+"""
+import argparse
+import random
+import time
+
+from benchmarks.comum import imprimir_tabela
+from model.planejador import ESTOQUE_ABERTO, ESTOQUE_FECHADO, planejar_rebalanceamento
+
+
+def cenario(freezers, sabores, sabores_por_freezer=10, semente=1):
+    """Um terço dos freezers no Aberto com pouco estoque; o Fechado cheio, alguns acima da ocupação alvo"""
+    aleatorio = random.Random(semente)
+    lista_freezers = [
+        {"id": i, "ambiente": ESTOQUE_ABERTO if i % 3 == 0 else ESTOQUE_FECHADO, "capacidade_total": 500, "ocupado": 0}
+        for i in range(1, freezers + 1)
+    ]
+    estoque = []
+    for freezer in lista_freezers:
+        for sabor in aleatorio.sample(range(sabores), min(sabores_por_freezer, sabores)):
+            maximo = 60 if freezer["ambiente"] == ESTOQUE_FECHADO else 5
+            quantidade = aleatorio.randint(0, maximo)
+            estoque.append({
+                "freezer_id": freezer["id"], "sabor": f"Sabor {sabor}",
+                "quantidade": quantidade, "vencendo": aleatorio.randint(0, quantidade // 4)
+            })
+            freezer["ocupado"] += quantidade
+    return lista_freezers, estoque
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", nargs="+", default=["20x30", "200x150", "500x300"],
+                        help="freezers x sabores")
+    args = parser.parse_args()
+
+    resultados = []
+    for tamanho in args.tamanhos:
+        freezers, sabores = (int(parte) for parte in tamanho.split("x"))
+        lista_freezers, estoque = cenario(freezers, sabores)
+        inicio = time.perf_counter()
+        plano = planejar_rebalanceamento(lista_freezers, estoque)
+        resultados.append({
+            "freezers": freezers, "sabores": sabores, "linhas_estoque": len(estoque),
+            "picoles": plano["resumo"]["picoles"], "transferencias": plano["resumo"]["transferencias"],
+            "segundos": round(time.perf_counter() - inicio, 3)
+        })
+
+    imprimir_tabela(resultados, ["freezers", "sabores", "linhas_estoque", "picoles", "transferencias", "segundos"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Tempo da previsão de demanda e dos pontos de reposição para muitos sabores e freezers.
+
+Não usa banco de dados: gera o histórico diário de vendas (com dia da semana
+e estação), as vendas por freezer e o estoque, e mede `prever_estoque` com
+a mesma entrada que `dados_previsao_demanda` devolve.
+
+Uso:
+    python -m benchmarks.benchmark_previsao --tamanhos 30x10 500x8 2000x10
+"""
+import argparse
+import math
+import random
+import time
+from datetime import date, timedelta
+
+from benchmarks.comum import imprimir_tabela
+from model.previsao import periodo_previsao, prever_estoque
+
+
+def cenario(sabores, freezers_por_sabor, hoje, semente=1):
+    """Vendas com pico no fim de semana e no verão; cada sabor em alguns freezers"""
+    aleatorio = random.Random(semente)
+    inicio, fim, inicio_janela = periodo_previsao(hoje)
+    historico, participacoes, estoque = [], [], []
+    for sabor in range(sabores):
+        nome = f"Sabor {sabor}"
+        base = aleatorio.uniform(0.5, 30)
+        dia = inicio
+        while dia <= fim:
+            verao = 1 + 0.6 * math.cos(2 * math.pi * (dia.timetuple().tm_yday - 15) / 365)
+            fim_de_semana = 1.8 if dia.weekday() >= 5 else 1.0
+            quantidade = round(base * verao * fim_de_semana * aleatorio.uniform(0.6, 1.4))
+            if quantidade:
+                historico.append((dia, nome, quantidade))
+            dia += timedelta(days=1)
+        for freezer in aleatorio.sample(range(1, 200), freezers_por_sabor):
+            participacoes.append((nome, freezer, aleatorio.randint(0, 400)))
+            estoque.append((nome, freezer, aleatorio.randint(0, 150)))
+    return historico, participacoes, estoque
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tamanhos", nargs="+", default=["30x10", "500x8", "2000x10"],
+                        help="sabores x freezers por sabor")
+    args = parser.parse_args()
+
+    hoje = date.today()
+    resultados = []
+    for tamanho in args.tamanhos:
+        sabores, freezers_por_sabor = (int(parte) for parte in tamanho.split("x"))
+        historico, participacoes, estoque = cenario(sabores, freezers_por_sabor, hoje)
+        inicio = time.perf_counter()
+        previsao = prever_estoque(historico, participacoes, estoque, hoje)
+        resultados.append({
+            "sabores": sabores, "series": len(estoque), "linhas_historico": len(historico),
+            "criticos": sum(par["critico"] for par in previsao),
+            "segundos": round(time.perf_counter() - inicio, 3),
+        })
+
+    imprimir_tabela(resultados, ["sabores", "series", "linhas_historico", "criticos", "segundos"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Recibos por segundo: geração sequencial, pool de threads e lote em processos.
+
+Não usa banco de dados.
+
+Uso:
+    python -m benchmarks.benchmark_recibos --recibos 500
+"""
+import argparse
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.comum import imprimir_tabela
+from controller.gerador_recibos import GeradorRecibos, renderizar_recibo
+
+
+def venda_exemplo(numero):
+    itens = [
+        {"nome": "Picolé", "sabor": f"Sabor {n}", "quantidade": 1 + n % 3, "valor_venda": 4.5 + n}
+        for n in range(1 + numero % 6)
+    ]
+    subtotal = sum(item["quantidade"] * item["valor_venda"] for item in itens)
+    return {
+        "id": numero,
+        "data": datetime.now(),
+        "operador": "Operador 1",
+        "itens": itens,
+        "subtotal": subtotal,
+        "desconto": 0.0,
+        "total": subtotal,
+        "forma_pagamento": "Pix"
+    }
+
+
+def medir(cenario, recibos, funcao):
+    inicio = time.perf_counter()
+    funcao()
+    duracao = time.perf_counter() - inicio
+    return {"cenario": cenario, "recibos": recibos, "segundos": round(duracao, 3), "recibos_por_s": round(recibos / duracao, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recibos", type=int, default=500)
+    parser.add_argument("--trabalhadores", type=int, default=4)
+    args = parser.parse_args()
+
+    vendas = [venda_exemplo(n) for n in range(args.recibos)]
+
+    with tempfile.TemporaryDirectory() as pasta:
+        gerador = GeradorRecibos(trabalhadores=args.trabalhadores, pasta=pasta)
+
+        def em_threads():
+            trabalhos = [gerador.enviar(venda) for venda in vendas]
+            for trabalho in trabalhos:
+                trabalho.pdf()
+
+        resultados = [
+            medir("sequencial (memória)", args.recibos, lambda: [renderizar_recibo(venda) for venda in vendas]),
+            medir(f"pool de {args.trabalhadores} threads", args.recibos, em_threads),
+            medir("lote em processos", args.recibos, lambda: gerador.reemitir(vendas)),
+        ]
+        gerador.encerrar()
+
+    imprimir_tabela(resultados, ["cenario", "recibos", "segundos", "recibos_por_s"])
+
+
+if __name__ == "__main__":
+    main()
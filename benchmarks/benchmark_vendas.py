@@ -0,0 +1,92 @@
+"""Vendas por sabor: descrições do financeiro interpretadas em Python x tabelas estruturadas.
+
+Gera D dias de vendas no formato de descrição do PDV ("Ana | 2x Picolé - Morango | ..."),
+cria as vendas estruturadas com o passo de migração que interpreta as
+descrições (medindo o tempo dele) e compara, para a última semana e para o
+período inteiro, "quanto de cada sabor foi vendido" lendo e interpretando as
+descrições contra a consulta ao resumo diário por produto.
+
+Uso:
+    python -m benchmarks.benchmark_vendas --dias 365 1095 --vendas-por-dia 300
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+from benchmarks.comum import cronometrar, imprimir_tabela, popular_banco, preparar_banco
+from model.bancodedados import BancoDados
+from model.migracoes import interpretar_descricao_venda, migrar_descricoes_de_vendas, reconstruir_vendas_diario
+
+
+def gerar_vendas(banco, dias, vendas_por_dia):
+    """Lança as receitas de venda no financeiro, só com a descrição de texto, como antes das tabelas de vendas"""
+    with banco._cursor() as cursor:
+        cursor.execute("""
+            INSERT INTO financeiro (tipo, categoria, descricao, valor, data_lancamento, operador)
+            SELECT 'Receita', 'Venda - Dinheiro',
+                   'Operador ' || (1 + g %% 4) || ' | ' || (1 + g %% 3) || 'x Picolé ' || (g %% 40) || ' - Sabor ' || (g %% 25)
+                       || ' | 1x Pote ' || (g %% 7) || ' - Sabor ' || ((g + 11) %% 25),
+                   4.0 * (1 + g %% 3) + 12.0,
+                   current_date - (g %% %(dias)s),
+                   'Operador ' || (1 + g %% 4)
+            FROM generate_series(1, %(total)s) g
+        """, {"dias": dias, "total": dias * vendas_por_dia})
+        cursor.execute("ANALYZE financeiro")
+
+
+def por_sabor_em_python(banco, inicio, fim):
+    """O que era preciso antes: ler as descrições do período e somar as quantidades na aplicação"""
+    quantidades = {}
+    for venda in banco.listar_vendas_financeiro(inicio, fim):
+        for _, sabor, quantidade in interpretar_descricao_venda(venda["descricao"])[1]:
+            quantidades[sabor] = quantidades.get(sabor, 0) + quantidade
+    return quantidades
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dias", type=int, nargs="+", default=[365, 1095])
+    parser.add_argument("--vendas-por-dia", type=int, default=300)
+    parser.add_argument("--repeticoes", type=int, default=10)
+    args = parser.parse_args()
+
+    preparar_banco()
+    banco = BancoDados()
+    fim = date.today()
+    resultados = []
+    for dias in args.dias:
+        popular_banco(banco, freezers=2, lotes=10)
+        gerar_vendas(banco, dias, args.vendas_por_dia)
+
+        inicio_migracao = time.perf_counter()
+        with banco._cursor() as cursor:
+            migrar_descricoes_de_vendas(cursor)
+            reconstruir_vendas_diario(cursor)
+        print(f"{dias} dia(s), {dias * args.vendas_por_dia} vendas: migração das descrições em "
+              f"{time.perf_counter() - inicio_migracao:.1f}s")
+
+        if banco.verificar_vendas_diario():
+            raise SystemExit("❌ Resumo diário das vendas diverge dos itens vendidos.")
+        for periodo, inicio in (("semana", fim - timedelta(days=7)), ("tudo", fim - timedelta(days=dias))):
+            em_python = por_sabor_em_python(banco, inicio, fim)
+            no_banco = {linha["sabor"]: linha["quantidade"] for linha in banco.vendas_por_sabor(inicio, fim)}
+            if em_python != no_banco:
+                raise SystemExit(f"❌ Vendas por sabor ({periodo}) diferentes entre as descrições e as tabelas de vendas.")
+            resultados.append(dict(
+                dias=dias, periodo=periodo, cenario="descrições + Python",
+                **cronometrar(lambda: por_sabor_em_python(banco, inicio, fim), args.repeticoes, aquecimento=1)
+            ))
+            resultados.append(dict(
+                dias=dias, periodo=periodo, cenario="resumo por sabor",
+                **cronometrar(lambda: banco.vendas_por_sabor(inicio, fim), args.repeticoes)
+            ))
+            resultados.append(dict(
+                dias=dias, periodo=periodo, cenario="resumo por produto",
+                **cronometrar(lambda: banco.vendas_por_produto(inicio, fim), args.repeticoes)
+            ))
+
+    imprimir_tabela(resultados, ["dias", "periodo", "cenario", "media_ms", "p50_ms", "p99_ms", "max_ms"])
+
+
+if __name__ == "__main__":
+    main()
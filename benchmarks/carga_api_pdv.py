@@ -0,0 +1,160 @@
+"""Teste de carga da API HTTP do PDV: N terminais lendo códigos e vendendo pela API.
+
+Sobe a API (view/api_pdv.py) numa porta livre deste processo, sobre o banco
+descartável, ou usa uma API já no ar com --url (apontada para o banco
+descartável). Cada terminal é uma thread com uma conexão HTTP keep-alive que
+repete o fluxo de um caixa: consulta de 1 a 3 códigos, validação do carrinho
+e venda. Mede requisições por segundo e latências por rota e, ao final,
+confere o estoque baixado no banco contra as vendas confirmadas (201).
+
+Com a API no mesmo processo, os terminais disputam o GIL com o servidor;
+para medir só o servidor, rode a API à parte e use --url.
+
+Uso:
+    python -m benchmarks.carga_api_pdv --terminais 1 8 32 --segundos 20
+    python -m benchmarks.carga_api_pdv --url http://127.0.0.1:8600 --terminais 32
+"""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.comum import imprimir_tabela, parametros_benchmark, popular_banco, preparar_banco
+from benchmarks.estresse_pdv import estoque_total
+from model.bancodedados import BancoDados
+from model.conexao import configurar_pool
+
+ROTAS = ("produto", "validar", "venda")
+
+
+def percentil(valores, fracao):
+    return round(valores[min(len(valores) - 1, int(len(valores) * fracao))], 2) if valores else 0.0
+
+
+def terminal(numero, endereco, codigos, fim, resultado, trava):
+    aleatorio = random.Random(numero)
+    conexao = http.client.HTTPConnection(*endereco, timeout=30)
+    cabecalhos = {"Content-Type": "application/json", "X-Terminal": f"terminal-{numero}"}
+    latencias = {rota: [] for rota in ROTAS}
+    status = {}
+    vendidos = 0
+
+    def chamar(rota, metodo, caminho, corpo=None):
+        inicio = time.perf_counter()
+        conexao.request(metodo, caminho, body=json.dumps(corpo) if corpo is not None else None, headers=cabecalhos)
+        resposta = conexao.getresponse()
+        dados = resposta.read()
+        latencias[rota].append((time.perf_counter() - inicio) * 1000)
+        status[(rota, resposta.status)] = status.get((rota, resposta.status), 0) + 1
+        return resposta.status, dados
+
+    while time.monotonic() < fim:
+        itens = [
+            {"codigo_barras": codigo, "quantidade": aleatorio.randint(1, 2)}
+            for codigo in aleatorio.sample(codigos, aleatorio.randint(1, 3))
+        ]
+        try:
+            for item in itens:
+                chamar("produto", "GET", f"/produtos/{item['codigo_barras']}")
+            codigo_validacao, _ = chamar("validar", "POST", "/carrinho/validar", {"itens": itens})
+            if codigo_validacao != 200:
+                continue
+            codigo_venda, _ = chamar("venda", "POST", "/vendas", {
+                "itens": itens, "operador": f"Terminal {numero}", "forma_pagamento": "Dinheiro"
+            })
+            if codigo_venda == 201:
+                vendidos += sum(item["quantidade"] for item in itens)
+        except (OSError, http.client.HTTPException) as e:
+            status[("conexao", type(e).__name__)] = status.get(("conexao", type(e).__name__), 0) + 1
+            conexao.close()
+            conexao = http.client.HTTPConnection(*endereco, timeout=30)
+    conexao.close()
+
+    with trava:
+        for rota in ROTAS:
+            resultado["latencias"][rota].extend(latencias[rota])
+        for chave, quantidade in status.items():
+            resultado["status"][chave] = resultado["status"].get(chave, 0) + quantidade
+        resultado["vendidos"] += vendidos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--terminais", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--segundos", type=float, default=15)
+    parser.add_argument("--lotes", type=int, default=2000)
+    parser.add_argument("--freezers", type=int, default=4)
+    parser.add_argument("--url", help="API já no ar; sem ela, a API sobe neste processo")
+    args = parser.parse_args()
+
+    preparar_banco()
+    configurar_pool(maximo=max(args.terminais) + 2, **parametros_benchmark())
+    servidor = None
+    if args.url:
+        partes = urlsplit(args.url)
+        endereco = (partes.hostname, partes.port or 80)
+    else:
+        from view.api_pdv import ServidorPDV
+        servidor = ServidorPDV(("127.0.0.1", 0))
+        threading.Thread(target=servidor.serve_forever, name="api-pdv", daemon=True).start()
+        endereco = ("127.0.0.1", servidor.server_port)
+
+    linhas = []
+    for terminais in args.terminais:
+        banco = BancoDados()
+        popular_banco(banco, freezers=args.freezers, lotes=args.lotes)
+        # Os lotes novos chegam ao índice da API pelo canal itens_alterados; espera a recarga
+        time.sleep(1.0)
+        codigos = [lote["codigo_barras"] for lote in banco.listar_lotes()]
+        estoque_inicial, _ = estoque_total(banco)
+
+        resultado = {"latencias": {rota: [] for rota in ROTAS}, "status": {}, "vendidos": 0}
+        trava = threading.Lock()
+        fim = time.monotonic() + args.segundos
+        threads = [
+            threading.Thread(target=terminal, args=(n, endereco, codigos, fim, resultado, trava))
+            for n in range(terminais)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        estoque_final, negativos = estoque_total(banco)
+        requisicoes = sum(len(valores) for valores in resultado["latencias"].values())
+        for rota in ROTAS:
+            latencias = sorted(resultado["latencias"][rota])
+            linhas.append({
+                "terminais": terminais,
+                "rota": rota,
+                "req_por_s": round(len(latencias) / args.segundos, 1),
+                "p50_ms": percentil(latencias, 0.5),
+                "p99_ms": percentil(latencias, 0.99),
+                "respostas": " ".join(
+                    f"{codigo}:{quantidade}" for (nome, codigo), quantidade in sorted(resultado["status"].items(), key=str)
+                    if nome == rota
+                ),
+            })
+        falhas_conexao = {codigo: n for (nome, codigo), n in resultado["status"].items() if nome == "conexao"}
+        linhas.append({
+            "terminais": terminais, "rota": "total",
+            "req_por_s": round(requisicoes / args.segundos, 1),
+            "respostas": " ".join(f"{codigo}:{n}" for codigo, n in falhas_conexao.items()),
+            "acima_estoque": (estoque_inicial - estoque_final - resultado["vendidos"]) + negativos,
+        })
+
+    if servidor is not None:
+        servidor.shutdown()
+        servidor.server_close()
+
+    imprimir_tabela(linhas, ["terminais", "rota", "req_por_s", "p50_ms", "p99_ms", "respostas", "acima_estoque"])
+    if any(linha.get("acima_estoque") for linha in linhas):
+        raise SystemExit("❌ Estoque baixado diferente das vendas confirmadas pela API.")
+    print("✅ Estoque baixado confere com as vendas confirmadas pela API.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""Utilitários compartilhados pelos benchmarks.
+
+Os benchmarks NUNCA usam o banco da loja: rodam em um banco descartável
+(padrão `sorveteria_benchmark`, configurável por SORVETERIA_BENCH_DB) que é
+criado automaticamente no mesmo servidor configurado pelas variáveis
+SORVETERIA_DB_*.
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import psycopg2
+from psycopg2 import extensions
+
+from model.conexao import configurar_pool, parametros_conexao
+
+
+def parametros_benchmark():
+    """Parâmetros de conexão do banco descartável"""
+    parametros = parametros_conexao()
+    parametros["dbname"] = os.environ.get("SORVETERIA_BENCH_DB", "sorveteria_benchmark")
+    return parametros
+
+
+def preparar_banco(recriar=False):
+    """Cria (ou recria) o banco descartável e aponta o pool do processo para ele"""
+    parametros = parametros_benchmark()
+    administracao = dict(parametros, dbname="postgres")
+
+    conexao = psycopg2.connect(**administracao)
+    conexao.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    with conexao.cursor() as cursor:
+        if recriar:
+            cursor.execute(f'DROP DATABASE IF EXISTS "{parametros["dbname"]}"')
+        cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (parametros["dbname"],))
+        if cursor.fetchone() is None:
+            cursor.execute(f'CREATE DATABASE "{parametros["dbname"]}"')
+    conexao.close()
+
+    os.environ["SORVETERIA_DB_NOME"] = parametros["dbname"]
+    # Vendas de benchmark que caírem no diário offline nunca podem ir para o diário da loja
+    os.environ["SORVETERIA_DIARIO"] = os.path.join(tempfile.gettempdir(), f"{parametros['dbname']}_diario.sqlite3")
+    return configurar_pool(**parametros)
+
+
+def popular_banco(banco, freezers=20, lotes=10_000, lancamentos=0, dias=365):
+    """Apaga os dados do banco descartável e gera freezers, lotes de itens e lançamentos financeiros"""
+    with banco._cursor() as cursor:
+        cursor.execute(
+            "TRUNCATE itens, eletronicos, custos_armazenamento, financeiro, financeiro_diario, vendas, venda_itens,"
+            " venda_itens_diario RESTART IDENTITY CASCADE"
+        )
+        cursor.execute("""
+            INSERT INTO eletronicos (nome, kw_por_dia, quantidade, ambiente, capacidade_total)
+            SELECT 'Freezer ' || g, 1.5 + (g %% 5) * 0.1, 1,
+                   CASE WHEN g %% 2 = 0 THEN 'Estoque Aberto' ELSE 'Estoque Fechado' END,
+                   1000000
+            FROM generate_series(1, %(freezers)s) g
+        """, {"freezers": freezers})
+        cursor.execute("""
+            INSERT INTO itens (nome, sabor, valor_compra, valor_venda, quantidade, validade, freezer_id, codigo_barras)
+            SELECT 'Picolé ' || (g %% 40), 'Sabor ' || (g %% 25), 1.50, 4.00 + (g %% 7),
+                   1 + (g %% 50), current_date + (g %% 120), 1 + (g %% %(freezers)s),
+                   '789' || lpad(g::text, 10, '0')
+            FROM generate_series(1, %(lotes)s) g
+        """, {"freezers": freezers, "lotes": lotes})
+        cursor.execute("""
+            INSERT INTO custos_armazenamento (nome, valor, quantidade, categoria)
+            SELECT 'custo ' || g, 10.0 * g, 1, 'Geral' FROM generate_series(1, 10) g
+        """)
+        cursor.execute("""
+            INSERT INTO financeiro (tipo, categoria, descricao, valor, data_lancamento, operador)
+            SELECT CASE WHEN g %% 5 = 0 THEN 'Despesa' ELSE 'Receita' END,
+                   CASE WHEN g %% 5 = 0 THEN 'Fornecedor' ELSE 'Venda - ' || (ARRAY['Dinheiro', 'Cartão', 'Pix'])[1 + g %% 3] END,
+                   'Lançamento gerado ' || g,
+                   5.0 + (g %% 40),
+                   current_date - (g %% %(dias)s),
+                   'Operador ' || (1 + g %% 4)
+            FROM generate_series(1, %(lancamentos)s) g
+        """, {"lancamentos": lancamentos, "dias": dias})
+        cursor.execute("ANALYZE")
+
+
+def cronometrar(funcao, repeticoes=50, aquecimento=3):
+    """Executa `funcao` várias vezes e devolve estatísticas de latência em milissegundos"""
+    for _ in range(aquecimento):
+        funcao()
+
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+
+    tempos.sort()
+    return {
+        "repeticoes": repeticoes,
+        "media_ms": round(statistics.fmean(tempos), 3),
+        "p50_ms": round(tempos[len(tempos) // 2], 3),
+        "p99_ms": round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.99))], 3),
+        "min_ms": round(tempos[0], 3),
+        "max_ms": round(tempos[-1], 3),
+    }
+
+
+def imprimir_tabela(linhas, colunas):
+    """Imprime uma lista de dicionários como tabela de texto"""
+    larguras = {c: max(len(c), *(len(str(l.get(c, ""))) for l in linhas)) for c in colunas}
+    print("  ".join(c.ljust(larguras[c]) for c in colunas))
+    for linha in linhas:
+        print("  ".join(str(linha.get(c, "")).ljust(larguras[c]) for c in colunas))
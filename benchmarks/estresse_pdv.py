@@ -0,0 +1,138 @@
+"""Teste de estresse do PDV: N terminais vendendo ao mesmo tempo os mesmos lotes.
+
+Cada terminal é uma thread que monta carrinhos aleatórios de 1 a 3 linhas
+sobre um conjunto pequeno de lotes disputados e chama
+finalizar_venda_com_carrinho até o tempo acabar. Ao final, o estoque
+baixado no banco é conferido contra as vendas confirmadas: qualquer
+diferença, ou lote com quantidade negativa, é venda acima do estoque.
+
+Uso:
+    python -m benchmarks.estresse_pdv --terminais 8 --segundos 20 --lotes 50
+"""
+import argparse
+import random
+import threading
+import time
+
+from benchmarks.comum import imprimir_tabela, parametros_benchmark, popular_banco, preparar_banco
+from model.bancodedados import BancoDados
+from model.conexao import configurar_pool
+
+
+def contar_esperas(banco):
+    """Sessões aguardando trava neste momento e total de deadlocks do banco"""
+    with banco._cursor() as cursor:
+        cursor.execute("""
+            SELECT (SELECT COUNT(*) FROM pg_stat_activity
+                    WHERE datname = current_database() AND wait_event_type = 'Lock'),
+                   (SELECT deadlocks FROM pg_stat_database WHERE datname = current_database())
+        """)
+        return cursor.fetchone()
+
+
+def estoque_total(banco):
+    with banco._cursor() as cursor:
+        cursor.execute("SELECT COALESCE(SUM(quantidade), 0), COUNT(*) FILTER (WHERE quantidade < 0) FROM itens")
+        return cursor.fetchone()
+
+
+def terminal(numero, banco, lotes, fim, resultado, trava):
+    aleatorio = random.Random(numero)
+    latencias = []
+    vendidos = 0
+    vendas = 0
+    recusas = 0
+    erros = 0
+    while time.monotonic() < fim:
+        carrinho = [
+            {"id": lote["id"], "nome": lote["nome"], "sabor": lote["sabor"],
+             "valor_venda": lote["valor_venda"], "quantidade": aleatorio.randint(1, 3)}
+            for lote in aleatorio.sample(lotes, aleatorio.randint(1, 3))
+        ]
+        inicio = time.perf_counter()
+        sucesso, mensagem, falhas, _ = banco.finalizar_venda_com_carrinho(
+            carrinho, forma_pagamento="Dinheiro", operador=f"Terminal {numero}"
+        )
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        if sucesso:
+            vendas += 1
+            vendidos += sum(item["quantidade"] for item in carrinho)
+        elif falhas:
+            recusas += 1
+        else:
+            erros += 1
+            print(f"Terminal {numero}: {mensagem}")
+
+    with trava:
+        resultado["latencias"].extend(latencias)
+        resultado["vendidos"] += vendidos
+        resultado["vendas"] += vendas
+        resultado["recusas"] += recusas
+        resultado["erros"] += erros
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--terminais", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--segundos", type=float, default=15)
+    parser.add_argument("--lotes", type=int, default=50, help="lotes disputados pelos terminais")
+    parser.add_argument("--freezers", type=int, default=4)
+    args = parser.parse_args()
+
+    preparar_banco()
+    linhas = []
+    for terminais in args.terminais:
+        # Um pool com uma conexão por terminal e mais uma para o monitor
+        configurar_pool(maximo=terminais + 1, **parametros_benchmark())
+        banco = BancoDados()
+        popular_banco(banco, freezers=args.freezers, lotes=args.lotes)
+        lotes = banco.listar_lotes()
+        estoque_inicial, _ = estoque_total(banco)
+        _, deadlocks_inicio = contar_esperas(banco)
+
+        resultado = {"latencias": [], "vendidos": 0, "vendas": 0, "recusas": 0, "erros": 0}
+        trava = threading.Lock()
+        fim = time.monotonic() + args.segundos
+        threads = [
+            threading.Thread(target=terminal, args=(n, banco, lotes, fim, resultado, trava))
+            for n in range(terminais)
+        ]
+        for thread in threads:
+            thread.start()
+
+        amostras_espera = []
+        while any(thread.is_alive() for thread in threads):
+            amostras_espera.append(contar_esperas(banco)[0])
+            time.sleep(0.05)
+        for thread in threads:
+            thread.join()
+
+        estoque_final, negativos = estoque_total(banco)
+        _, deadlocks_fim = contar_esperas(banco)
+        latencias = sorted(resultado["latencias"]) or [0.0]
+        vendido_no_banco = estoque_inicial - estoque_final
+
+        linhas.append({
+            "terminais": terminais,
+            "vendas_por_s": round(resultado["vendas"] / args.segundos, 1),
+            "p50_ms": round(latencias[len(latencias) // 2], 2),
+            "p99_ms": round(latencias[min(len(latencias) - 1, int(len(latencias) * 0.99))], 2),
+            "recusas": resultado["recusas"],
+            "erros": resultado["erros"],
+            "espera_media": round(sum(amostras_espera) / max(len(amostras_espera), 1), 2),
+            "espera_max": max(amostras_espera, default=0),
+            "deadlocks": deadlocks_fim - deadlocks_inicio,
+            "acima_estoque": (vendido_no_banco - resultado["vendidos"]) + negativos,
+        })
+
+    imprimir_tabela(linhas, [
+        "terminais", "vendas_por_s", "p50_ms", "p99_ms", "recusas", "erros",
+        "espera_media", "espera_max", "deadlocks", "acima_estoque"
+    ])
+    if any(linha["acima_estoque"] for linha in linhas):
+        raise SystemExit("❌ Estoque baixado diferente das vendas confirmadas.")
+    print("✅ Nenhuma venda acima do estoque.")
+
+
+if __name__ == "__main__":
+    main()
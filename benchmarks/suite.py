@@ -0,0 +1,380 @@
+"""Suíte de micro-benchmarks de todos os métodos públicos de BancoDados e ControladorItem.
+
+Para cada tamanho o banco descartável é populado com N freezers, M lotes de
+itens e K lançamentos financeiros e cada método é cronometrado. As leituras
+vêm primeiro e as escritas depois, montadas para não esgotar o estoque nem
+mudar o tamanho do banco de forma relevante. O controlador roda com o cache
+desligado (TTL 0), para medir o caminho até o banco. Métodos públicos sem
+caso na suíte são listados ao final, para que métodos novos não fiquem de
+fora.
+
+Uso:
+    python -m benchmarks.suite executar --tamanhos pequeno medio --saida benchmarks/resultados/atual.json
+    python -m benchmarks.suite comparar benchmarks/resultados/base.json benchmarks/resultados/atual.json
+"""
+import argparse
+import inspect
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+from itertools import count
+
+from benchmarks.comum import cronometrar, imprimir_tabela, popular_banco, preparar_banco
+from controller.controlador_item import ControladorItem
+from model.bancodedados import COLUNAS_ENTRADA, BancoDados
+from model.item import Item
+from model.previsao import periodo_previsao
+
+TAMANHOS = {
+    "pequeno": {"freezers": 10, "lotes": 1_000, "lancamentos": 10_000},
+    "medio": {"freezers": 50, "lotes": 20_000, "lancamentos": 200_000},
+    "grande": {"freezers": 200, "lotes": 200_000, "lancamentos": 1_000_000},
+}
+
+AMBIENTE = "Estoque Aberto"
+PASTA_RESULTADOS = os.path.join(os.path.dirname(__file__), "resultados")
+
+
+class Contexto:
+    """Dados de apoio dos casos: ids, códigos e períodos existentes no banco populado"""
+
+    def __init__(self, banco, controlador):
+        self.banco = banco
+        self.controlador = controlador
+        self.sequencia = count(1)
+        self.fim = date.today()
+        self.inicio_mes = self.fim - timedelta(days=30)
+        self.inicio_ano = self.fim - timedelta(days=365)
+
+        # Lote grande só para as vendas, para que as baixas repetidas nunca esgotem o estoque
+        banco.adicionar_item(Item("Benchmark", "Benchmark", 1.0, 5.0, 500_000, self.fim + timedelta(days=365), "BENCH-0001"), 1)
+        lote = banco.buscar_lotes_por_codigo("BENCH-0001")[0]
+        self.lote_venda = {"id": lote["id"], "nome": "Benchmark", "sabor": "Benchmark", "valor_venda": 5.0, "quantidade": 1}
+
+        amostra = banco.listar_lotes()[:100]
+        self.ids_amostra = [lote["id"] for lote in amostra]
+        self.codigo = amostra[0]["codigo_barras"]
+
+        # Um sabor presente em dois freezers, para as transferências de ida e volta
+        freezers, estoque = banco.dados_rebalanceamento()
+        por_sabor = {}
+        for linha in estoque:
+            por_sabor.setdefault(linha["sabor"], []).append(linha["freezer_id"])
+        self.sabor, freezers_sabor = next((s, f) for s, f in por_sabor.items() if len(f) >= 2)
+        self.freezer_a, self.freezer_b = sorted(freezers_sabor)[:2]
+        self.ida = True
+
+        with banco._cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO financeiro (tipo, categoria, descricao, valor, operador)
+                SELECT 'Despesa', 'Benchmark', 'Lançamento para exclusão', 1.0, 'benchmark'
+                FROM generate_series(1, 500)
+                RETURNING id
+            """)
+            self.lancamentos_para_excluir = [linha[0] for linha in cursor.fetchall()]
+
+        banco.cadastrar_cupom("BENCH", 10, self.fim + timedelta(days=30), 1_000_000)
+        self.cupom_id = banco.listar_metadados_cupons()["BENCH"]["id"]
+        self.reservas = []
+        self.cupons_para_excluir = []
+
+    def linhas_entrada(self, quantidade=100):
+        return [
+            {"nome": "Benchmark Lote", "sabor": f"Sabor {n % 10}", "valor_compra": 1.0, "valor_venda": 4.0,
+             "quantidade": 1, "validade": self.fim + timedelta(days=60), "freezer_id": 1 + n % 2,
+             "codigo_barras": f"BENCH-L{n:04d}"}
+            for n in range(quantidade)
+        ]
+
+    def csv_entrada(self, quantidade=100):
+        linhas = [",".join(COLUNAS_ENTRADA)]
+        for linha in self.linhas_entrada(quantidade):
+            linhas.append(",".join(str(linha[coluna]) for coluna in COLUNAS_ENTRADA))
+        return "\n".join(linhas)
+
+    def movimento(self):
+        """Alterna a direção para que o estoque volte ao ponto de partida"""
+        origem, destino = (self.freezer_a, self.freezer_b) if self.ida else (self.freezer_b, self.freezer_a)
+        self.ida = not self.ida
+        return self.sabor, origem, destino, 1
+
+    def proximo_lancamento(self):
+        return self.lancamentos_para_excluir.pop() if self.lancamentos_para_excluir else -1
+
+    def venda_diario(self):
+        """Venda offline de uma unidade do lote de vendas, com chave nova a cada chamada"""
+        return {
+            "chave": f"bench-{time.time_ns()}-{next(self.sequencia)}", "data": self.fim, "carrinho": [self.lote_venda],
+            "operador": "benchmark", "forma_pagamento": "Dinheiro", "desconto": 0.0, "reserva_cupom": None,
+        }
+
+    def novo_cupom(self):
+        codigo = f"BENCH-{next(self.sequencia)}"
+        self.cupons_para_excluir.append(codigo)
+        return codigo
+
+
+def _reservar(ctx):
+    sucesso, _, reserva = ctx.banco.reservar_cupom(ctx.cupom_id)
+    if sucesso:
+        ctx.reservas.append(reserva["id"])
+
+
+def _reservar_controlador(ctx):
+    sucesso, _, reserva = ctx.controlador.reservar_cupom("BENCH")
+    if sucesso:
+        ctx.reservas.append(reserva["id"])
+
+
+def _liberar(ctx, metodo):
+    if ctx.reservas:
+        metodo(ctx.reservas.pop())
+
+
+# (nome do caso, método coberto, função). Leituras primeiro, escritas depois.
+CASOS_BANCO = [
+    ("calcular_estoque", lambda c: c.banco.calcular_estoque()),
+    ("buscar_produto", lambda c: c.banco.buscar_produto("Picolé 1", AMBIENTE)),
+    ("top_produtos", lambda c: c.banco.top_produtos(ambiente=AMBIENTE)),
+    ("listar_custos_armazenamento", lambda c: c.banco.listar_custos_armazenamento()),
+    ("calcular_total_armazenamento", lambda c: c.banco.calcular_total_armazenamento()),
+    ("calcular_consumo_energia", lambda c: c.banco.calcular_consumo_energia(0.90, AMBIENTE)),
+    ("listar_itens", lambda c: c.banco.listar_itens()),
+    ("listar_freezers", lambda c: c.banco.listar_freezers()),
+    ("listar_status_freezers", lambda c: c.banco.listar_status_freezers(AMBIENTE)),
+    ("calcular_estoque_por_ambiente", lambda c: c.banco.calcular_estoque_por_ambiente(AMBIENTE)),
+    ("listar_estoque_critico", lambda c: c.banco.listar_estoque_critico()),
+    ("listar_proximos_vencimento", lambda c: c.banco.listar_proximos_vencimento()),
+    ("painel_ambiente", lambda c: c.banco.painel_ambiente(AMBIENTE)),
+    ("dados_rebalanceamento", lambda c: c.banco.dados_rebalanceamento()),
+    ("obter_quantidade_por_sabor", lambda c: c.banco.obter_quantidade_por_sabor()),
+    ("dados_previsao_demanda", lambda c: c.banco.dados_previsao_demanda(*periodo_previsao(c.fim))),
+    ("obter_resumo_financeiro", lambda c: c.banco.obter_resumo_financeiro(c.inicio_ano, c.fim)),
+    ("verificar_financeiro_diario", lambda c: c.banco.verificar_financeiro_diario()),
+    ("buscar_item_por_codigo", lambda c: c.banco.buscar_item_por_codigo(c.codigo)),
+    ("listar_lotes", lambda c: c.banco.listar_lotes(c.ids_amostra)),
+    ("listar_lotes[todos]", lambda c: c.banco.listar_lotes()),
+    ("buscar_lotes_por_codigo", lambda c: c.banco.buscar_lotes_por_codigo(c.codigo)),
+    ("listar_lancamentos", lambda c: c.banco.listar_lancamentos(c.inicio_mes, c.fim)),
+    ("listar_vendas_financeiro", lambda c: c.banco.listar_vendas_financeiro(c.inicio_mes, c.fim)),
+    ("totais_financeiro", lambda c: c.banco.totais_financeiro(c.inicio_ano, c.fim)),
+    ("vendas_por_sabor", lambda c: c.banco.vendas_por_sabor(c.inicio_ano, c.fim)),
+    ("vendas_por_produto", lambda c: c.banco.vendas_por_produto(c.inicio_ano, c.fim)),
+    ("verificar_vendas_diario", lambda c: c.banco.verificar_vendas_diario()),
+    ("facetas_financeiro", lambda c: c.banco.facetas_financeiro(c.inicio_ano, c.fim)),
+    ("financeiro_por_dia", lambda c: c.banco.financeiro_por_dia(c.inicio_ano, c.fim)),
+    ("listar_lancamentos_pagina", lambda c: c.banco.listar_lancamentos_pagina(c.inicio_ano, c.fim, limite=50)),
+    ("listar_metadados_cupons", lambda c: c.banco.listar_metadados_cupons()),
+    ("buscar_reserva_cupom", lambda c: c.banco.buscar_reserva_cupom(c.reservas[-1] if c.reservas else -1)),
+    ("listar_cupons", lambda c: c.banco.listar_cupons()),
+    ("adicionar_custo_armazenamento", lambda c: c.banco.adicionar_custo_armazenamento("benchmark", 1.0, 1, "Benchmark")),
+    ("adicionar_item", lambda c: c.banco.adicionar_item(
+        Item("Benchmark", "Benchmark", 1.0, 5.0, 1, c.fim + timedelta(days=365), "BENCH-0001"), 1)),
+    ("adicionar_itens_em_lote", lambda c: c.banco.adicionar_itens_em_lote(c.linhas_entrada())),
+    ("transferir_picoles", lambda c: c.banco.transferir_picoles([c.movimento()])),
+    ("mover_picole", lambda c: c.banco.mover_picole(*c.movimento())),
+    ("baixar_estoque", lambda c: c.banco.baixar_estoque(c.lote_venda["id"])),
+    ("baixar_estoque_e_registrar_venda", lambda c: c.banco.baixar_estoque_e_registrar_venda(c.lote_venda["id"], 5.0)),
+    ("finalizar_venda_com_carrinho", lambda c: c.banco.finalizar_venda_com_carrinho([c.lote_venda], "Dinheiro", "benchmark")),
+    ("finalizar_venda_com_carrinho[codigo]", lambda c: c.banco.finalizar_venda_com_carrinho(
+        [dict(c.lote_venda, codigo_barras="BENCH-0001")], "Dinheiro", "benchmark")),
+    ("aplicar_vendas_do_diario", lambda c: c.banco.aplicar_vendas_do_diario([c.venda_diario()])),
+    ("lancar_financeiro", lambda c: c.banco.lancar_financeiro("Despesa", "Benchmark", "benchmark", 1.0, operador="benchmark")),
+    ("excluir_lancamento_financeiro", lambda c: c.banco.excluir_lancamento_financeiro(c.proximo_lancamento())),
+    ("reservar_cupom", _reservar),
+    ("liberar_reserva_cupom", lambda c: _liberar(c, c.banco.liberar_reserva_cupom)),
+    ("liberar_reservas_expiradas", lambda c: c.banco.liberar_reservas_expiradas()),
+    ("cadastrar_cupom", lambda c: c.banco.cadastrar_cupom(c.novo_cupom(), 10, c.fim + timedelta(days=30), 10)),
+    ("excluir_cupom", lambda c: c.banco.excluir_cupom(c.cupons_para_excluir.pop() if c.cupons_para_excluir else "-")),
+    ("adicionar_freezer", lambda c: c.banco.adicionar_freezer("Benchmark", 1.0, 1, "Estoque Fechado", 10)),
+    ("reconstruir_financeiro_diario", lambda c: c.banco.reconstruir_financeiro_diario()),
+    ("reconstruir_vendas_diario", lambda c: c.banco.reconstruir_vendas_diario()),
+]
+
+CASOS_CONTROLADOR = [
+    ("listar_itens", lambda c: c.controlador.listar_itens()),
+    ("obter_estoque", lambda c: c.controlador.obter_estoque()),
+    ("obter_total_armazenamento", lambda c: c.controlador.obter_total_armazenamento()),
+    ("obter_consumo_energia", lambda c: c.controlador.obter_consumo_energia(0.90, AMBIENTE)),
+    ("obter_top_produtos", lambda c: c.controlador.obter_top_produtos(AMBIENTE)),
+    ("buscar_produto", lambda c: c.controlador.buscar_produto("Picolé 1", AMBIENTE)),
+    ("listar_status_freezers", lambda c: c.controlador.listar_status_freezers(AMBIENTE)),
+    ("calcular_estoque_por_ambiente", lambda c: c.controlador.calcular_estoque_por_ambiente(AMBIENTE)),
+    ("obter_estoque_critico", lambda c: c.controlador.obter_estoque_critico()),
+    ("obter_estoque_critico[limite]", lambda c: c.controlador.obter_estoque_critico(10)),
+    ("obter_previsao_estoque", lambda c: c.controlador.obter_previsao_estoque()),
+    ("obter_produtos_vencendo", lambda c: c.controlador.obter_produtos_vencendo()),
+    ("obter_painel_ambiente", lambda c: c.controlador.obter_painel_ambiente(AMBIENTE)),
+    ("obter_pagina_estoque", lambda c: c.controlador.obter_pagina_estoque(AMBIENTE)),
+    ("rebalancear_freezers", lambda c: c.controlador.rebalancear_freezers()),
+    ("listar_freezers", lambda c: c.controlador.listar_freezers()),
+    ("obter_quantidade_por_sabor", lambda c: c.controlador.obter_quantidade_por_sabor()),
+    ("listar_lancamentos", lambda c: c.controlador.listar_lancamentos(c.inicio_mes, c.fim)),
+    ("obter_totais_financeiro", lambda c: c.controlador.obter_totais_financeiro(c.inicio_ano, c.fim)),
+    ("obter_facetas_financeiro", lambda c: c.controlador.obter_facetas_financeiro(c.inicio_ano, c.fim)),
+    ("obter_financeiro_por_dia", lambda c: c.controlador.obter_financeiro_por_dia(c.inicio_ano, c.fim)),
+    ("listar_lancamentos_pagina", lambda c: c.controlador.listar_lancamentos_pagina(c.inicio_ano, c.fim)),
+    ("obter_vendas_por_sabor", lambda c: c.controlador.obter_vendas_por_sabor(c.inicio_ano, c.fim)),
+    ("obter_vendas_por_produto", lambda c: c.controlador.obter_vendas_por_produto(c.inicio_ano, c.fim)),
+    ("obter_resumo_financeiro_periodo", lambda c: c.controlador.obter_resumo_financeiro_periodo(c.inicio_ano, c.fim)),
+    ("obter_lancamentos_e_grafico", lambda c: c.controlador.obter_lancamentos_e_grafico(c.inicio_ano, c.fim)),
+    ("buscar_por_codigo", lambda c: c.controlador.buscar_por_codigo(c.codigo)),
+    ("montar_carrinho", lambda c: c.controlador.montar_carrinho([{"codigo_barras": c.codigo, "quantidade": 1}])),
+    ("validar_carrinho", lambda c: c.controlador.validar_carrinho([{"codigo_barras": c.codigo, "quantidade": 1}])),
+    ("listar_cupons", lambda c: c.controlador.listar_cupons()),
+    ("calcular_desconto_cupom", lambda c: c.controlador.calcular_desconto_cupom(10, 100.0)),
+    ("estatisticas_cache", lambda c: c.controlador.estatisticas_cache()),
+    ("obter_diagnostico", lambda c: c.controlador.obter_diagnostico()),
+    ("exportar_diagnostico_prometheus", lambda c: c.controlador.exportar_diagnostico_prometheus()),
+    ("definir_sessao", lambda c: c.controlador.definir_sessao("benchmark")),
+    ("iniciar_pagina", lambda c: c.controlador.iniciar_pagina("Benchmark")),
+    ("finalizar_pagina", lambda c: c.controlador.finalizar_pagina()),
+    ("ativar_instrumentacao", lambda c: c.controlador.ativar_instrumentacao(False)),
+    ("zerar_diagnostico", lambda c: c.controlador.zerar_diagnostico()),
+    ("gerar_recibo", lambda c: c.controlador.gerar_recibo({
+        "data": datetime.now(), "operador": "benchmark", "itens": [c.lote_venda], "subtotal": 5.0,
+        "desconto": 0.0, "total": 5.0, "forma_pagamento": "Dinheiro"
+    }).pdf()),
+    ("reemitir_recibos", lambda c: c.controlador.reemitir_recibos(c.fim, c.fim)),
+    ("cadastrar_item", lambda c: c.controlador.cadastrar_item(
+        "Benchmark", "Benchmark", 1.0, 5.0, 1, 1, c.fim + timedelta(days=365), "BENCH-0001")),
+    ("cadastrar_itens_em_lote", lambda c: c.controlador.cadastrar_itens_em_lote(c.linhas_entrada())),
+    ("importar_entrada_csv", lambda c: c.controlador.importar_entrada_csv(c.csv_entrada())),
+    ("transferir_picoles", lambda c: c.controlador.transferir_picoles([c.movimento()])),
+    ("mover_picole", lambda c: c.controlador.mover_picole(*c.movimento())),
+    ("finalizar_venda_com_carrinho", lambda c: c.controlador.finalizar_venda_com_carrinho([c.lote_venda], "benchmark", "Dinheiro")),
+    ("obter_situacao_diario", lambda c: c.controlador.obter_situacao_diario()),
+    ("listar_vendas_diario", lambda c: c.controlador.listar_vendas_diario()),
+    ("sincronizar_diario", lambda c: c.controlador.sincronizar_diario()),
+    ("reenviar_venda_diario", lambda c: c.controlador.reenviar_venda_diario("-")),
+    ("vender", lambda c: c.controlador.vender([{"codigo_barras": "BENCH-0001", "quantidade": 1}], "benchmark", "Dinheiro")),
+    ("lancar_financeiro", lambda c: c.controlador.lancar_financeiro("Despesa", "Benchmark", "benchmark", 1.0, date.today(), "benchmark")),
+    ("excluir_lancamento_financeiro", lambda c: c.controlador.excluir_lancamento_financeiro(c.proximo_lancamento())),
+    ("reservar_cupom", _reservar_controlador),
+    ("liberar_cupom", lambda c: _liberar(c, c.controlador.liberar_cupom)),
+    ("cadastrar_cupom", lambda c: c.controlador.cadastrar_cupom(c.novo_cupom(), 10, c.fim + timedelta(days=30), 10)),
+    ("excluir_cupom", lambda c: c.controlador.excluir_cupom(c.cupons_para_excluir.pop() if c.cupons_para_excluir else "-")),
+    ("adicionar_custo_armazenamento", lambda c: c.controlador.adicionar_custo_armazenamento("benchmark", 1.0, 1, "Benchmark")),
+    ("cadastrar_eletronico", lambda c: c.controlador.cadastrar_eletronico("Benchmark", 1.0, 1, "Estoque Fechado", 10)),
+]
+
+
+def metodos_sem_caso(classe, casos):
+    """Métodos públicos da classe que nenhum caso da suíte cobre"""
+    cobertos = {nome.split("[")[0] for nome, _ in casos}
+    return sorted(
+        nome for nome, _ in inspect.getmembers(classe, inspect.isfunction)
+        if not nome.startswith("_") and nome not in cobertos
+    )
+
+
+def commit_atual():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executar(args):
+    preparar_banco()
+    banco = BancoDados()
+    resultados = {}
+
+    for tamanho in args.tamanhos:
+        print(f"⏳ Populando o banco ({tamanho}: {TAMANHOS[tamanho]})...")
+        popular_banco(banco, **TAMANHOS[tamanho])
+        controlador = ControladorItem(ttl_cache=0)
+        contexto = Contexto(banco, controlador)
+
+        resultados[tamanho] = {}
+        for prefixo, casos in (("BancoDados", CASOS_BANCO), ("ControladorItem", CASOS_CONTROLADOR)):
+            for nome, funcao in casos:
+                if args.filtro and args.filtro not in nome:
+                    continue
+                caso = f"{prefixo}.{nome}"
+                resultados[tamanho][caso] = cronometrar(lambda: funcao(contexto), args.repeticoes, aquecimento=1)
+                print(f"  {caso}: p50 {resultados[tamanho][caso]['p50_ms']} ms")
+
+        controlador.indice_codigos.parar()
+        controlador.recibos.encerrar()
+
+    relatorio = {
+        "gerado_em": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit_atual(),
+        "repeticoes": args.repeticoes,
+        "tamanhos": {tamanho: TAMANHOS[tamanho] for tamanho in args.tamanhos},
+        "resultados": resultados,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.saida)), exist_ok=True)
+    with open(args.saida, "w", encoding="utf-8") as arquivo:
+        json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+    print(f"✅ Resultados gravados em {args.saida}")
+
+    for classe, casos in ((BancoDados, CASOS_BANCO), (ControladorItem, CASOS_CONTROLADOR)):
+        faltando = metodos_sem_caso(classe, casos)
+        if faltando:
+            print(f"⚠️ Métodos de {classe.__name__} sem caso na suíte: {', '.join(faltando)}")
+
+
+def comparar(args):
+    """Compara o p50 de cada caso com a base; sinaliza o que ficou mais lento que a tolerância"""
+    with open(args.base, encoding="utf-8") as arquivo:
+        base = json.load(arquivo)
+    with open(args.atual, encoding="utf-8") as arquivo:
+        atual = json.load(arquivo)
+
+    linhas = []
+    regressoes = 0
+    for tamanho, casos in atual["resultados"].items():
+        for caso, estatisticas in casos.items():
+            anterior = base["resultados"].get(tamanho, {}).get(caso)
+            if anterior is None:
+                continue
+            antes, depois = anterior["p50_ms"], estatisticas["p50_ms"]
+            variacao = (depois - antes) / antes if antes else 0.0
+            # Diferenças de fração de milissegundo são ruído, mesmo quando a razão é grande
+            regrediu = variacao > args.tolerancia and depois - antes > args.minimo_ms
+            regressoes += regrediu
+            if regrediu or args.todos:
+                linhas.append({
+                    "tamanho": tamanho, "caso": caso, "base_ms": antes, "atual_ms": depois,
+                    "variacao": f"{variacao:+.0%}", "status": "❌ regressão" if regrediu else "ok"
+                })
+
+    print(f"Base: {base.get('commit')} ({base.get('gerado_em')}) | Atual: {atual.get('commit')} ({atual.get('gerado_em')})")
+    if linhas:
+        imprimir_tabela(linhas, ["tamanho", "caso", "base_ms", "atual_ms", "variacao", "status"])
+    if regressoes:
+        print(f"❌ {regressoes} caso(s) mais lento(s) que a tolerância de {args.tolerancia:.0%}.")
+        sys.exit(1)
+    print("✅ Nenhuma regressão acima da tolerância.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    execucao = comandos.add_parser("executar", help="roda a suíte e grava os resultados em JSON")
+    execucao.add_argument("--tamanhos", nargs="+", choices=list(TAMANHOS), default=["pequeno", "medio"])
+    execucao.add_argument("--repeticoes", type=int, default=20)
+    execucao.add_argument("--filtro", help="roda só os casos cujo nome contém este texto")
+    execucao.add_argument("--saida", default=os.path.join(PASTA_RESULTADOS, f"{datetime.now():%Y%m%d_%H%M%S}.json"))
+    execucao.set_defaults(funcao=executar)
+
+    comparacao = comandos.add_parser("comparar", help="compara dois arquivos de resultados")
+    comparacao.add_argument("base")
+    comparacao.add_argument("atual")
+    comparacao.add_argument("--tolerancia", type=float, default=0.20, help="aumento relativo do p50 aceito (0.20 = 20%%)")
+    comparacao.add_argument("--minimo-ms", type=float, default=0.5, help="diferença absoluta mínima para contar regressão")
+    comparacao.add_argument("--todos", action="store_true", help="mostra também os casos sem regressão")
+    comparacao.set_defaults(funcao=comparar)
+
+    args = parser.parse_args()
+    args.funcao(args)
+
+
+if __name__ == "__main__":
+    main()
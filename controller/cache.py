@@ -0,0 +1,73 @@
+import threading
+import time
+
+
+class CacheTTL:
+    """Cache em memória com expiração por tempo, compartilhado por todas as sessões do processo.
+
+    Cada entrada pertence a um ou mais grupos (ex.: "itens", "freezers").
+    As operações de escrita invalidam os grupos que alteram. Um contador de
+    geração por grupo evita que uma leitura iniciada antes da invalidação grave
+    um valor já desatualizado.
+
+    Os valores guardados são compartilhados entre as sessões e não devem ser
+    alterados por quem os recebe.
+    """
+
+    def __init__(self, ttl=30.0):
+        self.ttl = ttl
+        self.acertos = 0
+        self.falhas = 0
+        self._entradas = {}
+        self._geracoes = {}
+        self._trava = threading.Lock()
+
+    def obter(self, chave, grupos, carregar, usar=True, guardar=True):
+        """Retorna o valor em cache ou chama `carregar()` e guarda o resultado.
+
+        `usar=False` ignora a entrada em cache e `guardar=False` não guarda o
+        valor carregado.
+        """
+        with self._trava:
+            entrada = self._entradas.get(chave) if usar else None
+            if entrada is not None and entrada[0] > time.monotonic():
+                self.acertos += 1
+                return entrada[1]
+            self.falhas += 1
+            geracoes = tuple(self._geracoes.get(grupo, 0) for grupo in grupos)
+
+        valor = carregar()
+
+        with self._trava:
+            if guardar and geracoes == tuple(self._geracoes.get(grupo, 0) for grupo in grupos):
+                self._entradas[chave] = (time.monotonic() + self.ttl, valor, frozenset(grupos))
+        return valor
+
+    def invalidar(self, *grupos):
+        """Descarta as entradas que pertencem a qualquer um dos grupos"""
+        grupos = set(grupos)
+        with self._trava:
+            for grupo in grupos:
+                self._geracoes[grupo] = self._geracoes.get(grupo, 0) + 1
+            self._entradas = {
+                chave: entrada for chave, entrada in self._entradas.items()
+                if not entrada[2] & grupos
+            }
+
+    def limpar(self):
+        with self._trava:
+            for grupo in self._geracoes:
+                self._geracoes[grupo] += 1
+            self._entradas.clear()
+
+    def estatisticas(self):
+        """Retorna os contadores de acertos e falhas do cache"""
+        with self._trava:
+            consultas = self.acertos + self.falhas
+            return {
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": round(self.acertos * 100.0 / consultas, 1) if consultas else 0.0,
+                "entradas": len(self._entradas),
+                "ttl": self.ttl
+            }
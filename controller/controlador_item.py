@@ -1,72 +1,298 @@
+import asyncio
+import csv
+import io
+import os
+import threading
+import time
+import uuid
+from datetime import date, datetime
+
 from model.item import Item
 from model.item import ArmazenamentoDiversos
 from model.item import Eletronico
-from model.bancodedados import BancoDados
+from model.bancodedados import BancoDados, COLUNAS_ENTRADA
+from model.bancodedados_async import BancoDadosAsync, LacoAssincrono
+from model.conexao import definir_sessao
+from model.diario_vendas import ERROS_CONEXAO, DiarioVendas, SincronizadorDiario
+from model.indice_codigos import IndiceCodigosBarras
+from model.instrumentacao import obter_instrumentacao
+from model.planejador import planejar_rebalanceamento
+from model.previsao import periodo_previsao, prever_estoque
+from controller.cache import CacheTTL
+from controller.gerador_recibos import GeradorRecibos
+
+# Grupos de invalidação do cache: cada leitura declara de quais tabelas depende
+ITENS = "itens"
+FREEZERS = "freezers"
+CUSTOS = "custos"
+CUPONS = "cupons"
+
 
 class ControladorItem:
-    def __init__(self):
+    def __init__(self, ttl_cache=None, leituras_async=None):
         self.banco = BancoDados()
+        if ttl_cache is None:
+            ttl_cache = float(os.environ.get("SORVETERIA_CACHE_TTL", "30"))
+        self.cache = CacheTTL(ttl=ttl_cache)
+        self.indice_codigos = IndiceCodigosBarras(self.banco)
+        self.recibos = GeradorRecibos()
+        if leituras_async is None:
+            leituras_async = os.environ.get("SORVETERIA_LEITURAS_ASYNC", "0") == "1"
+        self.leituras_async = leituras_async
+        self._banco_async = None
+        self._laco = None
+        self._async_indisponivel_ate = 0.0
+        self._trava_async = threading.Lock()
+        self.diario = DiarioVendas(os.environ.get("SORVETERIA_DIARIO", os.path.join("diario", "vendas.sqlite3")))
+        self.sincronizador = SincronizadorDiario(self.diario, self.banco, ao_aplicar=lambda: self.cache.invalidar(ITENS))
+        if self.diario.resumo()["pendentes"]:
+            # Vendas que ficaram no diário de uma execução anterior
+            self.sincronizador.iniciar()
+
+    def definir_sessao(self, identificador):
+        """Identifica a sessão do usuário: depois de uma escrita, as leituras dela não vão à réplica atrasada"""
+        definir_sessao(identificador)
+
+    def _obter_em_cache(self, chave, grupos, carregar):
+        """Passa uma leitura pelo cache compartilhado, sem quebrar a leitura das próprias escritas.
+
+        Com réplica, a sessão que acabou de escrever não usa o cache (a entrada
+        pode ter sido lida da réplica por outra sessão antes de ela receber a
+        escrita), e nada é guardado enquanto alguma escrita do processo ainda
+        não tiver chegado à réplica.
+        """
+        replica = self.banco.replica
+        if replica is None:
+            return self.cache.obter(chave, grupos, carregar)
+        return self.cache.obter(
+            chave, grupos, carregar,
+            usar=replica.lsn_pendente() is None, guardar=not replica.ha_escritas_pendentes()
+        )
+
+    def _em_cache(self, grupos, metodo, *args):
+        """Executa uma leitura do banco passando pelo cache compartilhado"""
+        return self._obter_em_cache((metodo.__name__,) + args, grupos, lambda: metodo(*args))
+
+    def _obter_banco_async(self, pausa_falha=30.0):
+        """Cria, na primeira chamada, o laço de eventos e o pool assíncrono das leituras em paralelo.
+
+        Se o pool não abre em poucos segundos, retorna None e as leituras
+        seguem pelo caminho síncrono por `pausa_falha` segundos antes de uma
+        nova tentativa.
+        """
+        if self._banco_async is None and time.monotonic() >= self._async_indisponivel_ate:
+            with self._trava_async:
+                if self._banco_async is None and time.monotonic() >= self._async_indisponivel_ate:
+                    async def abrir():
+                        return await BancoDadosAsync(
+                            minimo=int(os.environ.get("SORVETERIA_POOL_MIN", "1")),
+                            maximo=int(os.environ.get("SORVETERIA_POOL_MAX", "10")),
+                        ).abrir()
+
+                    if self._laco is None:
+                        self._laco = LacoAssincrono()
+                    try:
+                        self._banco_async = self._laco.executar(abrir())
+                    except Exception as e:
+                        self._async_indisponivel_ate = time.monotonic() + pausa_falha
+                        print(f"⚠️ Pool assíncrono indisponível, leituras uma após a outra por {pausa_falha:.0f}s: {e}")
+        return self._banco_async
+
+    def _ler_juntos(self, *chamadas):
+        """Executa leituras independentes, dadas como (método de BancoDados, *argumentos).
+
+        Com as leituras assíncronas ligadas (SORVETERIA_LEITURAS_ASYNC=1), todas
+        vão ao banco ao mesmo tempo, cada uma em uma conexão, e a espera é a da
+        leitura mais lenta; se o pool assíncrono não abrir, elas são feitas uma
+        após a outra. Os resultados voltam na mesma ordem.
+        """
+        if not self.leituras_async:
+            return [getattr(self.banco, metodo)(*args) for metodo, *args in chamadas]
+
+        # O pool assíncrono não aplica migrações; o BancoDados as aplica antes da primeira leitura
+        self.banco._verificar_esquema()
+        banco_async = self._obter_banco_async()
+        if banco_async is None:
+            return [getattr(self.banco, metodo)(*args) for metodo, *args in chamadas]
+
+        async def reunir():
+            return await asyncio.gather(*(getattr(banco_async, metodo)(*args) for metodo, *args in chamadas))
+
+        return self._laco.executar(reunir())
 
     def cadastrar_item(self, nome, sabor, valor_compra, valor_venda, quantidade, freezer_id, validade, codigo_barras):
         """Tenta cadastrar o item e retorna sucesso ou erro"""
         item = Item(nome=nome, sabor=sabor, valor_compra=valor_compra,valor_venda=valor_venda, quantidade=quantidade,validade=validade,codigo_barras=codigo_barras)
         sucesso, mensagem = self.banco.adicionar_item(item, freezer_id)
+        self.cache.invalidar(ITENS)
         return sucesso, mensagem
 
+    def cadastrar_itens_em_lote(self, linhas):
+        """Dá entrada em várias linhas de estoque; retorna (sucesso, mensagem, relatório por linha)"""
+        resultado = self.banco.adicionar_itens_em_lote(linhas)
+        self.cache.invalidar(ITENS)
+        return resultado
+
+    def importar_entrada_csv(self, arquivo):
+        """Dá entrada no estoque a partir de um CSV com as colunas de COLUNAS_ENTRADA.
+
+        Aceita bytes, texto ou um arquivo aberto; o separador pode ser vírgula ou
+        ponto e vírgula, como nas planilhas exportadas em português.
+        """
+        conteudo = arquivo.read() if hasattr(arquivo, "read") else arquivo
+        if isinstance(conteudo, bytes):
+            try:
+                conteudo = conteudo.decode("utf-8-sig")
+            except UnicodeDecodeError:
+                conteudo = conteudo.decode("latin-1")
+
+        primeira_linha = conteudo.split("\n", 1)[0]
+        separador = ";" if primeira_linha.count(";") > primeira_linha.count(",") else ","
+        leitor = csv.DictReader(io.StringIO(conteudo), delimiter=separador)
+
+        faltando = [coluna for coluna in COLUNAS_ENTRADA if coluna not in (leitor.fieldnames or [])]
+        if faltando:
+            return False, f"❌ Coluna(s) ausente(s) no CSV: {', '.join(faltando)}", []
+
+        return self.cadastrar_itens_em_lote(list(leitor))
+
     def listar_itens(self):
         """Lista todos os itens cadastrados"""
-        return self.banco.listar_itens()
-    
+        return self._em_cache((ITENS,), self.banco.listar_itens)
+
     def obter_estoque(self):
         """Obtém o resumo do estoque"""
-        return self.banco.calcular_estoque()
-    
+        return self._em_cache((ITENS, FREEZERS), self.banco.calcular_estoque)
+
     def obter_total_armazenamento(self):
         """Retorna SOMENTE o custo total de armazenamento"""
-        return self.banco.calcular_total_armazenamento()
-    
+        return self._em_cache((CUSTOS,), self.banco.calcular_total_armazenamento)
+
     def adicionar_custo_armazenamento(self, nome, valor, quantidade, categoria):
         """Adiciona um custo de armazenamento"""
         armazenamento = ArmazenamentoDiversos(nome=nome,valor=valor, quantidade=quantidade,categoria=categoria)
         self.banco.adicionar_custo_armazenamento(nome, valor, quantidade, categoria)
-    
+        self.cache.invalidar(CUSTOS)
+
     def cadastrar_eletronico(self, nome, kw_por_dia,quantidade,ambiente,capacidade_total):
         """Cadastra um novo eletrônico"""
         eletronico = Eletronico(nome=nome, kw_por_dia=kw_por_dia,quantidade=quantidade,ambiente=ambiente,capacidade_total=capacidade_total)
         self.banco.adicionar_freezer(eletronico.nome, eletronico.kw_por_dia,eletronico.quantidade ,eletronico.ambiente,eletronico.capacidade_total)
+        self.cache.invalidar(FREEZERS)
 
     def obter_consumo_energia(self, preco_kwh, ambiente):
         """Obtém o consumo mensal de energia e o custo total para um ambiente específico"""
-        return self.banco.calcular_consumo_energia(preco_kwh, ambiente)
-    
+        return self._em_cache((FREEZERS,), self.banco.calcular_consumo_energia, preco_kwh, ambiente)
+
     def obter_top_produtos(self, ambiente="aberto"):
         """Obtém os 3 produtos mais estocados no Estoque Aberto ou Fechado"""
-        return self.banco.top_produtos(ambiente=ambiente)
+        return self._obter_em_cache(
+            ("top_produtos", ambiente), (ITENS, FREEZERS),
+            lambda: self.banco.top_produtos(ambiente=ambiente)
+        )
 
     def buscar_produto(self, nome=None, ambiente="aberto"):
         """Busca um produto no Estoque Aberto ou Fechado"""
-        return self.banco.buscar_produto(nome, ambiente=ambiente)
+        return self._em_cache((ITENS, FREEZERS), self.banco.buscar_produto, nome, ambiente)
 
     def listar_status_freezers(self, ambiente):
         """Retorna o status de ocupação de cada freezer de um ambiente específico"""
-        return self.banco.listar_status_freezers(ambiente)
-    
+        return self._em_cache((ITENS, FREEZERS), self.banco.listar_status_freezers, ambiente)
+
     def calcular_estoque_por_ambiente(self,ambiente_selecionando):
         """Calcula o Estoque por Ambiente"""
-        return self.banco.calcular_estoque_por_ambiente(ambiente_selecionando)
-    
+        return self._em_cache((ITENS, FREEZERS), self.banco.calcular_estoque_por_ambiente, ambiente_selecionando)
+
+    def obter_estoque_critico(self, limite=None):
+        """Obtém os sabores com estoque crítico em cada freezer.
+
+        Sem `limite`, é crítico o estoque no ponto de reposição previsto ou
+        abaixo dele (veja `obter_previsao_estoque`); com `limite`, vale o limite
+        fixo para todos os sabores.
+        """
+        if limite is None:
+            return [par for par in self.obter_previsao_estoque() if par["critico"]]
+        return self._em_cache((ITENS,), self.banco.listar_estoque_critico, limite)
+
+    def obter_previsao_estoque(self, prazo_reposicao=3, nivel_servico=1.65):
+        """Obtém velocidade de venda, ponto de reposição e dias até a ruptura de cada sabor em cada freezer"""
+        def prever():
+            hoje = date.today()
+            dados = self.banco.dados_previsao_demanda(*periodo_previsao(hoje))
+            return prever_estoque(*dados, hoje, prazo_reposicao, nivel_servico)
+
+        return self._obter_em_cache(("previsao_estoque", prazo_reposicao, nivel_servico), (ITENS,), prever)
+
+    def obter_produtos_vencendo(self, dias=10, desconto=0.30):
+        """Obtém os lotes próximos da validade com o preço promocional sugerido"""
+        return self._em_cache((ITENS,), self.banco.listar_proximos_vencimento, dias, desconto)
+
+    def obter_painel_ambiente(self, ambiente):
+        """Obtém todos os números do painel de um ambiente em uma única consulta"""
+        return self._em_cache((ITENS, FREEZERS, CUSTOS), self.banco.painel_ambiente, ambiente)
+
+    def obter_pagina_estoque(self, ambiente, limite_critico=None, dias=10, desconto=0.30):
+        """Painel, estoque crítico e lotes perto da validade de um ambiente, lidos ao mesmo tempo.
+
+        Sem `limite_critico`, o estoque crítico vem da previsão de demanda.
+        """
+        def ler():
+            hoje = date.today()
+            painel, criticos, vencendo = self._ler_juntos(
+                ("painel_ambiente", ambiente),
+                ("dados_previsao_demanda", *periodo_previsao(hoje)) if limite_critico is None
+                else ("listar_estoque_critico", limite_critico),
+                ("listar_proximos_vencimento", dias, desconto),
+            )
+            if limite_critico is None:
+                criticos = [par for par in prever_estoque(*criticos, hoje) if par["critico"]]
+            return {"painel": painel, "estoque_critico": criticos, "produtos_vencendo": vencendo}
+
+        return self._obter_em_cache(
+            ("pagina_estoque", ambiente, limite_critico, dias, desconto), (ITENS, FREEZERS, CUSTOS), ler
+        )
+
     def mover_picole(self,sabor, freezer_origem, freezer_destino, quantidade):
         """Mover os Picoles"""
-        return self.banco.mover_picole(sabor, freezer_origem, freezer_destino, quantidade)
-    
+        resultado = self.banco.mover_picole(sabor, freezer_origem, freezer_destino, quantidade)
+        self.cache.invalidar(ITENS)
+        return resultado
+
+    def transferir_picoles(self, movimentos):
+        """Executa uma lista de transferências (sabor, origem, destino, quantidade) de uma só vez"""
+        resultado = self.banco.transferir_picoles(movimentos)
+        self.cache.invalidar(ITENS)
+        return resultado
+
+    def rebalancear_freezers(self, minimo_por_sabor=20, ocupacao_alvo=0.9, dias_vencimento=10, executar=False):
+        """Planeja as transferências que rebalanceiam os freezers e, se pedido, executa o plano.
+
+        Sem `executar` é só uma simulação. A execução passa pelo transferir_picoles,
+        em uma única transação; se o estoque mudou desde o plano, nada é movido.
+        Retorna o plano com "sucesso" e "mensagem" da execução (ou da simulação).
+        """
+        freezers, estoque = self.banco.dados_rebalanceamento(dias_vencimento)
+        plano = planejar_rebalanceamento(freezers, estoque, minimo_por_sabor, ocupacao_alvo)
+        plano["falhas"] = []
+
+        if not plano["movimentos"]:
+            plano["sucesso"], plano["mensagem"] = True, "✅ Os freezers já estão balanceados."
+        elif not executar:
+            plano["sucesso"] = True
+            plano["mensagem"] = (f"🔎 Simulação: {plano['resumo']['picoles']} picolés em "
+                                 f"{plano['resumo']['transferencias']} transferência(s).")
+        else:
+            plano["sucesso"], plano["mensagem"], plano["falhas"] = self.transferir_picoles(plano["movimentos"])
+        return plano
+
     def listar_freezers(self):
         """Listar Freezers"""
-        return self.banco.listar_freezers()
-    
+        return self._em_cache((FREEZERS,), self.banco.listar_freezers)
+
     def obter_quantidade_por_sabor(self):
         """Obter Quantidade por sabor"""
-        return self.banco.obter_quantidade_por_sabor()
-    
+        return self._em_cache((ITENS,), self.banco.obter_quantidade_por_sabor)
+
     def lancar_financeiro(self, tipo, categoria, descricao, valor, data,operador):
         """Lança uma nova receita ou despesa no financeiro"""
         return self.banco.lancar_financeiro(tipo, categoria, descricao, valor, data,operador)
@@ -78,18 +304,332 @@ class ControladorItem:
     def listar_lancamentos(self, data_inicio, data_fim):
         """Lista os lançamentos financeiros por período"""
         return self.banco.listar_lancamentos(data_inicio, data_fim)
-    
-    def finalizar_venda_com_carrinho(self, carrinho, operador, forma_pagamento):
-        """Lançar os lançamentos financeiros por carrinho"""
-        return self.banco.finalizar_venda_com_carrinho(carrinho, operador, forma_pagamento)
-    
+
+    def obter_totais_financeiro(self, data_inicio, data_fim, tipos=None, categorias=None, operadores=None):
+        """Obtém receitas, despesas e saldo do período, calculados no banco"""
+        return self.banco.totais_financeiro(data_inicio, data_fim, tipos, categorias, operadores)
+
+    def obter_facetas_financeiro(self, data_inicio, data_fim):
+        """Obtém as opções dos filtros de tipo, categoria e operador do período"""
+        return self.banco.facetas_financeiro(data_inicio, data_fim)
+
+    def obter_financeiro_por_dia(self, data_inicio, data_fim, tipos=None, categorias=None, operadores=None):
+        """Obtém receitas e despesas por dia para o gráfico do financeiro"""
+        return self.banco.financeiro_por_dia(data_inicio, data_fim, tipos, categorias, operadores)
+
+    def listar_lancamentos_pagina(self, data_inicio, data_fim, tipos=None, categorias=None, operadores=None,
+                                  limite=50, apos=None):
+        """Lista uma página de lançamentos filtrados; retorna (lancamentos, cursor da próxima página)"""
+        return self.banco.listar_lancamentos_pagina(data_inicio, data_fim, tipos, categorias, operadores, limite, apos)
+
+    def obter_resumo_financeiro_periodo(self, data_inicio, data_fim):
+        """Totais e opções de filtro do período, lidos ao mesmo tempo; retorna (totais, facetas)"""
+        totais, facetas = self._ler_juntos(
+            ("totais_financeiro", data_inicio, data_fim),
+            ("facetas_financeiro", data_inicio, data_fim),
+        )
+        return totais, facetas
+
+    def obter_lancamentos_e_grafico(self, data_inicio, data_fim, tipos=None, categorias=None, operadores=None,
+                                    limite=50, apos=None):
+        """Página de lançamentos e série diária com os mesmos filtros; retorna (lancamentos, proximo, por_dia)"""
+        (lancamentos, proximo), por_dia = self._ler_juntos(
+            ("listar_lancamentos_pagina", data_inicio, data_fim, tipos, categorias, operadores, limite, apos),
+            ("financeiro_por_dia", data_inicio, data_fim, tipos, categorias, operadores),
+        )
+        return lancamentos, proximo, por_dia
+
+    def obter_vendas_por_sabor(self, data_inicio, data_fim):
+        """Obtém quantidade vendida e receita por sabor no período"""
+        return self.banco.vendas_por_sabor(data_inicio, data_fim)
+
+    def obter_vendas_por_produto(self, data_inicio, data_fim, sabor=None):
+        """Obtém quantidade vendida e receita por produto no período, opcionalmente de um sabor"""
+        return self.banco.vendas_por_produto(data_inicio, data_fim, sabor)
+
+    def buscar_por_codigo(self, codigo):
+        """Retorna todos os lotes de um código de barras pelo índice em memória do processo.
+
+        O índice já carregado continua atendendo com o banco fora do ar. Sem
+        índice e sem banco, retorna None.
+        """
+        if self.indice_codigos.carregado or self.indice_codigos.iniciar():
+            return self.indice_codigos.buscar(codigo)
+        try:
+            return self.banco.buscar_lotes_por_codigo(codigo)
+        except ERROS_CONEXAO as e:
+            print(f"❌ Banco indisponível para buscar o código {codigo}: {e}")
+            return None
+
+    def finalizar_venda_com_carrinho(self, carrinho, operador, forma_pagamento, cupom=None, chave=None):
+        """Baixa o carrinho inteiro, confirma o cupom e lança a receita em uma única transação.
+
+        `cupom` é a reserva de `reservar_cupom` (id, codigo, percentual_desconto);
+        o desconto é calculado pelo banco a partir dela. `chave` identifica a
+        venda (o PDV gera uma por carrinho): enviar a mesma venda duas vezes
+        grava uma só. Se o banco não responde, a venda vai para o diário local
+        e é enviada pelo sincronizador quando o banco voltar; o código do cupom
+        vai junto, para descontar o uso de novo se a reserva vencer antes do
+        envio.
+        Retorna (sucesso, mensagem, falhas, venda), com `venda` como em
+        `BancoDados.finalizar_venda_com_carrinho`: os lotes e valores gravados
+        pelo banco ou, no diário, os guardados nele (com id None).
+        """
+        chave = chave or uuid.uuid4().hex
+        reserva_cupom = cupom["id"] if cupom else None
+        if self.sincronizador.disponivel():
+            sucesso, mensagem, falhas, venda = self.banco.finalizar_venda_com_carrinho(
+                carrinho, forma_pagamento=forma_pagamento, operador=operador, reserva_cupom=reserva_cupom, chave=chave
+            )
+            if falhas is not None:
+                self.cache.invalidar(ITENS)
+                return sucesso, mensagem, falhas, venda
+            self.sincronizador.marcar_indisponivel(mensagem)
+
+        # Sem o banco, o desconto do diário é o do percentual da reserva sobre o carrinho vendido
+        subtotal = sum(item["valor_venda"] * item["quantidade"] for item in carrinho)
+        venda = {
+            "data": datetime.now(), "carrinho": carrinho, "operador": operador, "forma_pagamento": forma_pagamento,
+            "desconto": self.calcular_desconto_cupom(cupom["percentual_desconto"], subtotal) if cupom else 0.0,
+            "reserva_cupom": reserva_cupom, "cupom": cupom["codigo"] if cupom else None
+        }
+        self.diario.registrar(chave, venda)
+        self.sincronizador.iniciar()
+        return True, "✅ Venda guardada no diário local (banco indisponível); será enviada ao banco automaticamente.", [], {
+            "id": None, "data": venda["data"], "itens": carrinho, "subtotal": round(subtotal, 2),
+            "desconto": venda["desconto"], "total": round(max(subtotal - venda["desconto"], 0.0), 2),
+        }
+
+    def obter_situacao_diario(self):
+        """Quantas vendas do diário local aguardam o banco e o estado do envio"""
+        return {
+            **self.diario.resumo(),
+            "banco_disponivel": self.sincronizador.disponivel(),
+            "ultimo_erro": self.sincronizador.ultimo_erro,
+            "ultima_sincronizacao": self.sincronizador.ultima_sincronizacao,
+            "divergencias": list(self.sincronizador.divergencias),
+        }
+
+    def listar_vendas_diario(self, limite=100):
+        """Vendas do diário local ainda pendentes ou rejeitadas pelo banco"""
+        return self.diario.listar(limite=limite)
+
+    def sincronizar_diario(self):
+        """Envia agora as vendas pendentes do diário; retorna os totais do envio"""
+        return self.sincronizador.sincronizar()
+
+    def reenviar_venda_diario(self, chave):
+        """Devolve à fila de envio uma venda rejeitada pelo banco"""
+        self.diario.reenviar(chave)
+        self.sincronizador.iniciar()
+
+    def montar_carrinho(self, linhas):
+        """Converte linhas {"codigo_barras", "quantidade"[, "id"]} em linhas de carrinho.
+
+        A quantidade de cada linha é distribuída pelos lotes do código na ordem
+        de saída (vencimento mais próximo primeiro, Estoque Aberto antes na
+        mesma validade), uma linha de carrinho por lote, levando em conta o que
+        as linhas anteriores do mesmo código já tomaram. Essas linhas levam o
+        `codigo_barras`, e o checkout refaz a distribuição com o estoque do
+        banco. Com "id", só aquele lote serve e a linha fica presa a ele.
+        Retorna (carrinho, falhas).
+        """
+        carrinho, falhas = [], []
+        tomados = {}
+        for numero, linha in enumerate(linhas, start=1):
+            codigo = str(linha.get("codigo_barras") or "").strip()
+            try:
+                quantidade = int(linha.get("quantidade", 1))
+            except (TypeError, ValueError):
+                quantidade = 0
+            if not codigo or quantidade < 1:
+                falhas.append({"linha": numero, "codigo_barras": codigo, "motivo": "código ou quantidade inválidos"})
+                continue
+
+            lotes = self.buscar_por_codigo(codigo)
+            if lotes is None:
+                falhas.append({"linha": numero, "codigo_barras": codigo, "motivo": "banco de dados indisponível"})
+                continue
+            if linha.get("id") is not None:
+                lotes = [lote for lote in lotes if lote["id"] == linha["id"]]
+            if not lotes:
+                falhas.append({"linha": numero, "codigo_barras": codigo, "motivo": "produto não encontrado"})
+                continue
+
+            livres = [(lote, lote["quantidade"] - tomados.get(lote["id"], 0)) for lote in lotes]
+            livres = [(lote, livre) for lote, livre in livres if livre > 0]
+            disponivel = sum(livre for _, livre in livres)
+            if disponivel < quantidade:
+                falhas.append({
+                    "linha": numero, "codigo_barras": codigo, "motivo": "estoque insuficiente",
+                    "solicitado": quantidade, "disponivel": disponivel
+                })
+                continue
+
+            restante = quantidade
+            for lote, livre in livres:
+                baixa = min(livre, restante)
+                item = {
+                    "id": lote["id"], "nome": lote["nome"], "sabor": lote["sabor"],
+                    "valor_venda": lote["valor_venda"], "quantidade": baixa
+                }
+                if linha.get("id") is None:
+                    item["codigo_barras"] = codigo
+                carrinho.append(item)
+                tomados[lote["id"]] = tomados.get(lote["id"], 0) + baixa
+                restante -= baixa
+                if not restante:
+                    break
+        return carrinho, falhas
+
+    def validar_carrinho(self, linhas, reserva_cupom=None):
+        """Confere o carrinho e calcula os totais sem gravar nada.
+
+        Retorna (sucesso, mensagem, resumo) com resumo = {"itens", "falhas",
+        "subtotal", "desconto", "total", "cupom"}; o desconto vem da reserva de
+        cupom informada, nunca de quem chama.
+        """
+        carrinho, falhas = self.montar_carrinho(linhas)
+        subtotal = round(sum(item["valor_venda"] * item["quantidade"] for item in carrinho), 2)
+        resumo = {"itens": carrinho, "falhas": falhas, "subtotal": subtotal, "desconto": 0.0, "total": subtotal, "cupom": None}
+
+        if reserva_cupom is not None:
+            try:
+                reserva = self.banco.buscar_reserva_cupom(reserva_cupom)
+            except ERROS_CONEXAO:
+                return False, ("❌ Banco de dados indisponível: não é possível conferir o cupom agora. "
+                               "Retire o cupom para vender pelo diário local."), resumo
+            if reserva is None:
+                return False, "❌ A reserva do cupom expirou. Aplique o cupom novamente.", resumo
+            resumo["cupom"] = reserva
+            resumo["desconto"] = self.calcular_desconto_cupom(reserva["percentual_desconto"], subtotal)
+            resumo["total"] = round(subtotal - resumo["desconto"], 2)
+
+        if falhas:
+            return False, "❌ Um ou mais itens do carrinho não podem ser vendidos.", resumo
+        if not carrinho:
+            return False, "❌ O carrinho está vazio.", resumo
+        return True, "✅ Carrinho válido.", resumo
+
+    def vender(self, linhas, operador, forma_pagamento, reserva_cupom=None, chave=None):
+        """Valida o carrinho e finaliza a venda.
+
+        Com a mesma `chave`, o terminal pode reenviar uma venda cuja resposta
+        se perdeu sem vendê-la duas vezes. Retorna (sucesso, mensagem, resumo);
+        na venda concluída os itens e totais do resumo passam a ser os gravados
+        pela transação (outro terminal pode ter vendido os lotes previstos na
+        validação), e o resumo traz também "venda", os dados do recibo, que só
+        vira PDF se for pedido (`gerar_recibo`). Uma venda já registrada com a
+        mesma chave volta com "venda" None.
+        """
+        sucesso, mensagem, resumo = self.validar_carrinho(linhas, reserva_cupom)
+        if not sucesso:
+            return False, mensagem, resumo
+
+        chave = chave or uuid.uuid4().hex
+        sucesso, mensagem, falhas, venda = self.finalizar_venda_com_carrinho(
+            resumo["itens"], operador, forma_pagamento, cupom=resumo["cupom"], chave=chave
+        )
+        if not sucesso:
+            resumo["falhas"] = falhas
+            return False, mensagem, resumo
+
+        resumo["venda"] = None
+        if venda is not None:
+            resumo.update(itens=venda["itens"], subtotal=venda["subtotal"], desconto=venda["desconto"], total=venda["total"])
+            resumo["venda"] = {
+                **venda,
+                "chave": chave,
+                "operador": operador,
+                "cupom": resumo["cupom"]["codigo"] if resumo["cupom"] else None,
+                "forma_pagamento": forma_pagamento
+            }
+        return True, mensagem, resumo
+
+    def gerar_recibo(self, venda):
+        """Envia o recibo da venda para geração em segundo plano e devolve o trabalho"""
+        return self.recibos.enviar(venda)
+
+    def reemitir_recibos(self, data_inicio, data_fim):
+        """Gera novamente, em lote, os recibos das vendas do período"""
+        vendas = [
+            {
+                "id": lancamento["id"],
+                "data": lancamento["data"],
+                "operador": lancamento["operador"] or "",
+                "descricao": lancamento["descricao"],
+                "total": lancamento["valor"],
+                "forma_pagamento": lancamento["categoria"].replace("Venda - ", "")
+            }
+            for lancamento in self.banco.listar_vendas_financeiro(data_inicio, data_fim)
+        ]
+        return self.recibos.reemitir(vendas)
+
+    def reservar_cupom(self, codigo):
+        """Reserva um uso do cupom para a venda em andamento.
+
+        Código e validade são conferidos nos dados dos cupons em cache, sem ir
+        ao banco; só o desconto do uso é feito no banco. Retorna (sucesso,
+        mensagem, reserva), com reserva = {"id", "codigo", "percentual_desconto",
+        "expira_em"}.
+        """
+        codigo = (codigo or "").strip()
+        try:
+            cupom = self._em_cache((CUPONS,), self.banco.listar_metadados_cupons).get(codigo)
+        except ERROS_CONEXAO:
+            return False, "❌ Banco de dados indisponível: cupons não podem ser aplicados agora.", None
+        if cupom is None:
+            return False, "❌ Cupom não encontrado.", None
+        if cupom["validade"] and cupom["validade"] < date.today():
+            return False, "❌ Cupom expirado.", None
+
+        sucesso, mensagem, reserva = self.banco.reservar_cupom(cupom["id"])
+        if sucesso:
+            reserva["codigo"] = codigo
+        return sucesso, mensagem, reserva
+
+    def liberar_cupom(self, reserva_id):
+        """Devolve o uso de um cupom reservado em uma venda que não foi concluída; retorna (sucesso, mensagem)"""
+        return self.banco.liberar_reserva_cupom(reserva_id)
+
+    @staticmethod
+    def calcular_desconto_cupom(percentual_desconto, total):
+        """Valor do desconto de um cupom sobre o total do carrinho"""
+        return round((percentual_desconto or 0) / 100 * total, 2)
+
     def cadastrar_cupom(self, codigo, percentual_desconto, validade, limite_uso):
-        return self.banco.cadastrar_cupom(codigo, percentual_desconto, validade, limite_uso)
+        resultado = self.banco.cadastrar_cupom(codigo, percentual_desconto, validade, limite_uso)
+        self.cache.invalidar(CUPONS)
+        return resultado
 
     def listar_cupons(self):
         return self.banco.listar_cupons()
 
     def excluir_cupom(self, codigo):
-        return self.banco.excluir_cupom(codigo)
+        resultado = self.banco.excluir_cupom(codigo)
+        self.cache.invalidar(CUPONS)
+        return resultado
+
+    def estatisticas_cache(self):
+        """Retorna os contadores de acertos e falhas do cache de leituras"""
+        return self.cache.estatisticas()
+
+    def iniciar_pagina(self, pagina):
+        """Atribui as consultas seguintes desta execução do app à página informada"""
+        obter_instrumentacao().iniciar_pagina(pagina)
+
+    def finalizar_pagina(self):
+        return obter_instrumentacao().finalizar_pagina()
+
+    def obter_diagnostico(self):
+        """Consultas, tempo, linhas e commits por método do banco e por página"""
+        return obter_instrumentacao().resumo()
+
+    def ativar_instrumentacao(self, ativa):
+        obter_instrumentacao().ativa = bool(ativa)
 
+    def zerar_diagnostico(self):
+        obter_instrumentacao().zerar()
 
+    def exportar_diagnostico_prometheus(self):
+        return obter_instrumentacao().exportar_prometheus()
@@ -0,0 +1,128 @@
+import hashlib
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from fpdf import FPDF
+
+
+def linhas_itens_recibo(venda):
+    """Linhas de itens do recibo, no mesmo formato exibido no PDV"""
+    if venda.get("itens"):
+        return [
+            f"{item['quantidade']}x {item['nome']} - {item['sabor']} @ R$ {item['valor_venda']:.2f}"
+            for item in venda["itens"]
+        ]
+    # Vendas reemitidas a partir do financeiro só têm a descrição gravada
+    return [linha for linha in venda.get("descricao", "").split(" | ")[1:] if linha]
+
+
+def montar_texto_recibo(venda):
+    """Monta o texto do recibo a partir dos dados da venda"""
+    recibo = f"Recibo - {venda['data'].strftime('%d/%m/%Y %H:%M:%S')}\nOperador: {venda['operador']}\n\n"
+    for linha in linhas_itens_recibo(venda):
+        recibo += linha + "\n"
+    if venda.get("subtotal") is not None:
+        recibo += f"\nSubtotal: R$ {venda['subtotal']:.2f}\n"
+    if venda.get("desconto", 0) > 0:
+        recibo += f"Desconto ({venda.get('cupom') or 'cupom'}): -R$ {venda['desconto']:.2f}\n"
+    recibo += f"Total Final: R$ {venda['total']:.2f}\nForma de Pagamento: {venda['forma_pagamento']}"
+    return recibo
+
+
+def nome_arquivo_recibo(venda):
+    """Nome do PDF arquivado: data e hora da venda mais um identificador da venda.
+
+    Várias vendas caem no mesmo segundo (a API do PDV vende centenas por
+    segundo), então o nome leva o id do lançamento (recibos reemitidos) ou a
+    chave da venda gerada no PDV; chaves com caracteres fora de [A-Za-z0-9_-]
+    entram pelo hash. Sem nenhum dos dois, vão os microssegundos da hora.
+    """
+    nome = f"recibo_{venda['data'].strftime('%Y%m%d_%H%M%S')}"
+    chave = venda.get("chave")
+    if venda.get("id") is not None:
+        nome += f"_{venda['id']}"
+    elif chave:
+        segura = re.fullmatch(r"[A-Za-z0-9_-]{1,64}", chave)
+        nome += f"_{chave}" if segura else f"_{hashlib.sha1(chave.encode('utf-8')).hexdigest()[:16]}"
+    else:
+        nome += venda["data"].strftime("_%f")
+    return nome + ".pdf"
+
+
+def renderizar_recibo(venda):
+    """Gera o PDF do recibo em memória e devolve os bytes"""
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+    for linha in montar_texto_recibo(venda).strip().split("\n"):
+        pdf.cell(200, 10, txt=linha, ln=True)
+
+    conteudo = pdf.output(dest="S")
+    # fpdf 1.x devolve str em latin-1; fpdf2 já devolve bytes
+    if isinstance(conteudo, str):
+        conteudo = conteudo.encode("latin-1")
+    return bytes(conteudo)
+
+
+def _renderizar_e_salvar(venda, pasta):
+    """Tarefa executada pelos workers: gera o PDF e arquiva uma cópia em disco"""
+    conteudo = renderizar_recibo(venda)
+    nome_arquivo = nome_arquivo_recibo(venda)
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+        with open(os.path.join(pasta, nome_arquivo), "wb") as arquivo:
+            arquivo.write(conteudo)
+    return conteudo
+
+
+class TrabalhoRecibo:
+    """Identificador de um recibo em geração"""
+
+    def __init__(self, futuro, nome_arquivo, texto):
+        self._futuro = futuro
+        self.nome_arquivo = nome_arquivo
+        self.texto = texto
+
+    def pronto(self):
+        return self._futuro.done()
+
+    def erro(self):
+        return self._futuro.exception() if self._futuro.done() else None
+
+    def pdf(self, tempo_espera=None):
+        """Bytes do PDF; bloqueia até `tempo_espera` segundos se ainda não estiver pronto"""
+        return self._futuro.result(timeout=tempo_espera)
+
+
+class GeradorRecibos:
+    """Gera recibos em PDF fora do fluxo da venda.
+
+    `enviar` devolve um TrabalhoRecibo na hora; o PDF é gerado por um pool de
+    threads e servido direto da memória, com uma cópia arquivada em `pasta`.
+    `reemitir` gera recibos em lote usando processos, já que o FPDF é limitado
+    pela CPU. Os processos são criados por `spawn` e reaproveitados entre
+    lotes: com `fork`, cada lote copiaria o servidor do Streamlit inteiro,
+    com o pool de conexões e as threads do índice e do laço assíncrono.
+    """
+
+    def __init__(self, trabalhadores=2, pasta="recibos", processos=None):
+        self.pasta = pasta
+        self._executor = ThreadPoolExecutor(max_workers=trabalhadores, thread_name_prefix="recibos")
+        self._processos = ProcessPoolExecutor(max_workers=processos, mp_context=multiprocessing.get_context("spawn"))
+
+    def enviar(self, venda):
+        futuro = self._executor.submit(_renderizar_e_salvar, venda, self.pasta)
+        return TrabalhoRecibo(futuro, nome_arquivo_recibo(venda), montar_texto_recibo(venda))
+
+    def reemitir(self, vendas):
+        """Gera e arquiva os recibos de várias vendas; devolve os nomes dos arquivos gerados"""
+        if not vendas:
+            return []
+        list(self._processos.map(_renderizar_e_salvar, vendas, [self.pasta] * len(vendas), chunksize=16))
+        return [nome_arquivo_recibo(venda) for venda in vendas]
+
+    def encerrar(self):
+        self._executor.shutdown(wait=False)
+        self._processos.shutdown(wait=False)
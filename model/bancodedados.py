@@ -1,139 +1,299 @@
+import csv
+import functools
+import io
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
+from psycopg2.errors import DeadlockDetected, QueryCanceled, SerializationFailure
+from psycopg2.extras import execute_values
+from psycopg2.pool import PoolError
 from model.item import Item
-from datetime import datetime
+from model.conexao import POSICAO_A_LER, falha_de_conexao, obter_pool, obter_replica
+from model.instrumentacao import CursorInstrumentado, metodo_chamador, obter_instrumentacao
+from model.migracoes import aplicar_migracoes, reconstruir_financeiro_diario, reconstruir_vendas_diario, repartir_total
+from datetime import date, datetime
 
-class BancoDados:
-    def __init__(self):
-        """Inicializa a conexão com o banco PostgreSQL"""
-        self.conexao = psycopg2.connect(
-            dbname="sorveteria",  
-            user="postgres",      
-            password="xxxxxx",
-            host="localhost",     
-            port="5432"           
+_esquema_verificado = False
+_trava_esquema = threading.Lock()
+
+# Vezes que uma venda é refeita depois de um deadlock ou conflito de serialização com outra
+TENTATIVAS_CONFLITO = 3
+
+# Chave única de um lote (índice idx_itens_chave_lote), para os ON CONFLICT: a validade faz
+# parte dela, então uma entrega com outra validade vira outro lote, sem perder o vencimento
+CHAVE_LOTE = "(nome, sabor, freezer_id, codigo_barras, (COALESCE(validade, 'infinity'::date)))"
+
+COLUNAS_ENTRADA = ["nome", "sabor", "valor_compra", "valor_venda", "quantidade", "validade", "freezer_id", "codigo_barras"]
+
+
+def _converter_numero(valor):
+    """Aceita números e textos com vírgula decimal (formato das planilhas brasileiras)"""
+    if isinstance(valor, str):
+        valor = valor.strip().replace(",", ".")
+    return float(valor)
+
+
+def _converter_validade(valor):
+    if valor is None or isinstance(valor, date):
+        return valor
+    valor = str(valor).strip()
+    if not valor:
+        return None
+    for formato in ("%Y-%m-%d", "%d/%m/%Y"):
+        try:
+            return datetime.strptime(valor, formato).date()
+        except ValueError:
+            pass
+    raise ValueError(f"validade '{valor}' inválida (use AAAA-MM-DD ou DD/MM/AAAA)")
+
+
+def normalizar_linha_entrada(linha):
+    """Valida uma linha da entrada em lote; retorna (valores, None) ou (None, motivo da rejeição)"""
+    try:
+        texto = {campo: str(linha.get(campo) or "").strip() for campo in ("nome", "sabor", "codigo_barras")}
+        faltando = [campo for campo, valor in texto.items() if not valor]
+        if faltando:
+            return None, f"campo(s) obrigatório(s) vazio(s): {', '.join(faltando)}"
+
+        quantidade = _converter_numero(linha.get("quantidade"))
+        if quantidade != int(quantidade) or quantidade <= 0:
+            return None, "quantidade deve ser um número inteiro maior que zero"
+        valor_compra = _converter_numero(linha.get("valor_compra"))
+        valor_venda = _converter_numero(linha.get("valor_venda"))
+        if valor_compra < 0 or valor_venda < 0:
+            return None, "valores de compra e venda não podem ser negativos"
+
+        return (
+            texto["nome"], texto["sabor"], valor_compra, valor_venda, int(quantidade),
+            _converter_validade(linha.get("validade")), int(_converter_numero(linha.get("freezer_id"))),
+            texto["codigo_barras"]
+        ), None
+    except (TypeError, ValueError) as e:
+        return None, f"valor inválido: {e}"
+
+
+def _descricao_venda(operador, carrinho):
+    """Descrição do lançamento de receita de uma venda: operador e linhas do carrinho"""
+    return f"{operador} | " + " | ".join(
+        f"{item['quantidade']}x {item['nome']} - {item['sabor']}" for item in carrinho
+    )
+
+
+def _gravar_vendas(cursor, vendas):
+    """Grava as vendas e as linhas delas em `vendas` e `venda_itens`, na transação do cursor.
+
+    Cada venda traz financeiro_id, data, operador, forma_pagamento, subtotal,
+    desconto, total, origem e carrinho (linhas com id, nome, sabor,
+    valor_venda e quantidade; id None para lotes que já não existem). A
+    receita de cada linha é a parte dela no total da venda, proporcional ao
+    valor da linha.
+    """
+    ids = dict(execute_values(cursor, """
+        INSERT INTO vendas (financeiro_id, data_venda, operador, forma_pagamento, subtotal, desconto, total, origem)
+        VALUES %s
+        RETURNING financeiro_id, id
+    """, [
+        (venda["financeiro_id"], venda["data"], venda["operador"], venda["forma_pagamento"],
+         venda["subtotal"], venda["desconto"], venda["total"], venda["origem"])
+        for venda in vendas
+    ], page_size=len(vendas), fetch=True))
+
+    linhas = []
+    for venda in vendas:
+        dia = venda["data"].date() if isinstance(venda["data"], datetime) else venda["data"]
+        receitas = repartir_total(venda["total"], [item["valor_venda"] * item["quantidade"] for item in venda["carrinho"]])
+        linhas.extend(
+            (ids[venda["financeiro_id"]], linha, item["id"], item["nome"], item["sabor"], item["quantidade"],
+             item["valor_venda"], receita, dia)
+            for linha, (item, receita) in enumerate(zip(venda["carrinho"], receitas), 1)
         )
-        self.cursor = self.conexao.cursor()
+    if linhas:
+        execute_values(cursor, """
+            INSERT INTO venda_itens (venda_id, linha, item_id, nome, sabor, quantidade, valor_unitario, receita, dia)
+            VALUES %s
+        """, linhas, page_size=1000)
 
-        if not self._tabelas_existem():
-            print("Tabelas não encontradas. Criando...")
-            self._criar_tabela()
-        else:
-            print("Tabelas já existem. Nenhuma alteração feita.")
-
-    def _tabelas_existem(self):
-        """Verifica se as tabelas já existem no banco de dados"""
-        self.cursor.execute("""
-            SELECT EXISTS (
-                SELECT FROM information_schema.tables 
-                WHERE table_name = 'itens'
-            )
-        """)
-        return self.cursor.fetchone()[0]
-
-    def _criar_tabela(self):
-        """Cria as tabelas no PostgreSQL se não existirem"""
-        
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS eletronicos (
-                id SERIAL PRIMARY KEY,
-                nome TEXT NOT NULL,
-                kw_por_dia REAL NOT NULL,
-                quantidade INTEGER NOT NULL,
-                ambiente TEXT NOT NULL,
-                capacidade_total INTEGER NOT NULL,
-                status TEXT DEFAULT 'Disponível',  -- Novo campo para controlar o status do freezer
-                data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS itens (
-                id SERIAL PRIMARY KEY,
-                nome TEXT NOT NULL,
-                sabor TEXT NOT NULL,
-                valor_compra REAL NOT NULL,
-                valor_venda REAL NOT NULL,
-                validade DATE,
-                quantidade INTEGER NOT NULL,
-                data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                freezer_id INTEGER REFERENCES eletronicos(id) ON DELETE CASCADE,
-                codigo_barras TEXT NOT NULL
 
-            )
-        ''')
-
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS custos_armazenamento (
-                id SERIAL PRIMARY KEY,
-                nome TEXT NOT NULL,
-                valor REAL NOT NULL,
-                quantidade INTEGER NOT NULL,
-                categoria TEXT NOT NULL,
-                data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS cupons_desconto (
-            id SERIAL PRIMARY KEY,
-            codigo TEXT UNIQUE NOT NULL,
-            percentual_desconto REAL NOT NULL CHECK (percentual_desconto > 0 AND percentual_desconto <= 100),
-            validade DATE NOT NULL,
-            limite_uso INTEGER NOT NULL CHECK (limite_uso >= 1),
-            usos_restantes INTEGER NOT NULL,
-            criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        self.cursor.execute('''
-            CREATE TABLE IF NOT EXISTS financeiro (
-                id SERIAL PRIMARY KEY,
-                tipo TEXT NOT NULL CHECK (tipo IN ('Receita', 'Despesa')),
-                valor REAL NOT NULL CHECK (valor >= 0),
-                descricao TEXT NOT NULL,
-                categoria TEXT NOT NULL,
-                data_lancamento TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
-                operador TEXT
-            )
-        ''')
-
-        self.cursor.execute('''
-            DROP TRIGGER IF EXISTS trigger_atualizar_status_freezer ON itens;
-        ''')
-
-        self.cursor.execute('''
-            CREATE OR REPLACE FUNCTION atualizar_status_freezer() RETURNS TRIGGER AS $$
-            BEGIN
-                UPDATE eletronicos 
-                SET status = 
-                    CASE 
-                        WHEN (SELECT COALESCE(SUM(quantidade), 0) FROM itens WHERE freezer_id = NEW.freezer_id) >= capacidade_total
-                        THEN 'Cheio'
-                        ELSE 'Disponível'
-                    END
-                WHERE id = NEW.freezer_id;
-                
-                RETURN NEW;
-            END;
-            $$ LANGUAGE plpgsql;
-        ''')
-
-        self.cursor.execute('''
-            CREATE TRIGGER trigger_atualizar_status_freezer
-            AFTER INSERT OR UPDATE ON itens
-            FOR EACH ROW
-            EXECUTE FUNCTION atualizar_status_freezer();
-        ''')
-
-        self.conexao.commit()
+def uma(sql, parametros=None):
+    """Pedido de consulta de um método @leitura que recebe de volta uma linha (ou None)"""
+    return sql, parametros, False
+
+
+def todas(sql, parametros=None):
+    """Pedido de consulta de um método @leitura que recebe de volta todas as linhas"""
+    return sql, parametros, True
+
 
+def conduzir_leitura(consultas, cursor):
+    """Executa no cursor cada consulta pedida pelo gerador e devolve o valor final dele.
+
+    Erros do banco são lançados dentro do gerador, no ponto do `yield`, para
+    que o método trate as exceções como se tivesse chamado o cursor direto.
+    """
+    linhas, erro = None, None
+    while True:
+        try:
+            sql, parametros, varias = consultas.throw(erro) if erro else consultas.send(linhas)
+        except StopIteration as fim:
+            return fim.value
+        try:
+            cursor.execute(sql, parametros)
+            linhas, erro = (cursor.fetchall() if varias else cursor.fetchone()), None
+        except Exception as e:
+            linhas, erro = None, e
+
+
+def leitura(metodo):
+    """Decora um método de leitura escrito como gerador de consultas.
+
+    O método pede cada consulta com `yield uma(...)` ou `yield todas(...)` e
+    recebe as linhas; o `return` é o resultado. Aqui ele roda em uma transação
+    do pool síncrono; o BancoDadosAsync roda o mesmo gerador no pool
+    assíncrono, então o SQL de cada leitura fica escrito em um lugar só.
+    Com réplica configurada, as leituras vão para ela (veja `_pool_leitura`).
+    """
+    @functools.wraps(metodo)
+    def executar(self, *args, **kwargs):
+        self._verificar_esquema()
+        pool = self._pool_leitura()
+        try:
+            with self._cursor(metodo.__name__, pool) as cursor:
+                return conduzir_leitura(metodo(self, *args, **kwargs), cursor)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError, PoolError) as e:
+            if pool is self.pool:
+                raise
+            # Réplica fora do ar, ou consulta cancelada por conflito com a recuperação: refaz no primário
+            if not isinstance(e, QueryCanceled):
+                self.replica.marcar_indisponivel(e)
+            with self._cursor(metodo.__name__, self.pool) as cursor:
+                return conduzir_leitura(metodo(self, *args, **kwargs), cursor)
+
+    executar.consultas = metodo
+    return executar
+
+
+class BancoDados:
+    def __init__(self, pool=None):
+        """Inicializa o acesso ao banco PostgreSQL usando o pool de conexões do processo.
+
+        Nenhuma conexão é aberta aqui: o pool e as migrações ficam para a
+        primeira transação, para que o PDV suba mesmo com o banco fora do ar.
+        """
+        self._pool = pool
+        self.replica = obter_replica()
+
+    @property
+    def pool(self):
+        """Pool do primário, criado na primeira conexão; se o banco não responde, a próxima tenta de novo"""
+        if self._pool is None:
+            self._pool = obter_pool()
+        return self._pool
+
+    def _verificar_esquema(self):
+        """Aplica as migrações pendentes uma única vez por processo, e não a cada rerun do Streamlit.
+
+        Roda antes da primeira transação; com o banco fora do ar o erro de
+        conexão sobe para quem abriu a transação e a próxima tenta de novo.
+        """
+        global _esquema_verificado
+        if _esquema_verificado:
+            return
+        with _trava_esquema:
+            if _esquema_verificado:
+                return
+            with self.pool.conexao() as conexao:
+                if not aplicar_migracoes(conexao):
+                    print("Esquema já está atualizado. Nenhuma alteração feita.")
+            _esquema_verificado = True
+
+    @contextmanager
+    def _cursor(self, metodo=None, pool=None):
+        """Empresta uma conexão do pool e abre um cursor exclusivo para o bloco.
+
+        A transação é confirmada ao final do bloco e desfeita se ocorrer erro;
+        a conexão volta ao pool em ambos os casos. Sem `pool`, o bloco roda no
+        primário e, com réplica configurada, a sessão fica marcada como tendo
+        escrito, para ler as próprias escritas. Com a
+        instrumentação ativa, os números da transação são atribuídos ao método
+        que abriu o cursor.
+        """
+        self._verificar_esquema()
+        instrumentacao = obter_instrumentacao()
+        medir = instrumentacao.ativa
+        if medir:
+            metodo = metodo or metodo_chamador()
+        registrar_escrita = pool is None and self.replica is not None
+
+        with (pool or self.pool).conexao() as conexao:
+            cursor = conexao.cursor(cursor_factory=CursorInstrumentado if medir else None)
+            confirmada = False
+            try:
+                yield cursor
+                conexao.commit()
+                confirmada = True
+            except Exception:
+                if not conexao.closed:
+                    conexao.rollback()
+                raise
+            finally:
+                if not cursor.closed:
+                    cursor.close()
+                if medir:
+                    instrumentacao.registrar_transacao(metodo, cursor, confirmada)
+            if registrar_escrita:
+                self.replica.registrar_escrita()
+
+    def _pool_leitura(self):
+        """Pool onde a próxima leitura deve rodar.
+
+        É a réplica, se houver uma configurada e disponível e se ela já tiver
+        reproduzido a última escrita desta sessão; senão, o primário. Só a
+        sessão que lê depois de escrever paga a consulta da posição do WAL.
+        """
+        if self.replica is None:
+            return self.pool
+        pool_replica = self.replica.pool()
+        if pool_replica is None:
+            return self.pool
+        lsn = self.replica.lsn_pendente()
+        if lsn is None:
+            return pool_replica
+        if lsn == POSICAO_A_LER:
+            # Primeira leitura depois da escrita: a posição atual do primário já cobre o commit dela
+            momento = time.monotonic()
+            try:
+                with self.pool.conexao() as conexao:
+                    with conexao.cursor() as cursor:
+                        cursor.execute(self.replica.SQL_POSICAO)
+                        lsn = cursor.fetchone()[0]
+                    conexao.rollback()
+            except (psycopg2.Error, PoolError):
+                return self.pool
+            self.replica.resolver_posicao(lsn, momento)
+        try:
+            with pool_replica.conexao() as conexao:
+                with conexao.cursor() as cursor:
+                    cursor.execute(self.replica.SQL_ALCANCOU, (lsn,))
+                    alcancou = cursor.fetchone()[0]
+                conexao.rollback()
+        except (psycopg2.Error, PoolError) as e:
+            self.replica.marcar_indisponivel(e)
+            return self.pool
+        if not alcancou:
+            return self.pool
+        self.replica.confirmar(lsn)
+        return pool_replica
+
+    @leitura
     def calcular_estoque(self):
         """Calcula a quantidade total de produtos e valor do estoque,
         separando os itens com base no ambiente do freezer (Estoque Aberto ou Fechado)."""
 
-        self.cursor.execute("""
-            SELECT 
-                SUM(i.quantidade) AS quantidade_total, 
+        resultado = yield uma("""
+            SELECT
+                SUM(i.quantidade) AS quantidade_total,
                 SUM(i.quantidade * i.valor_venda) AS valor_total,
                 SUM(CASE WHEN e.ambiente = 'Estoque Aberto' THEN i.quantidade ELSE 0 END) AS estoque_aberto,
                 SUM(CASE WHEN e.ambiente = 'Estoque Fechado' THEN i.quantidade ELSE 0 END) AS estoque_fechado,
@@ -143,8 +303,6 @@ class BancoDados:
             LEFT JOIN eletronicos e ON i.freezer_id = e.id
         """)
 
-        resultado = self.cursor.fetchone()
-        
         return {
             "quantidade_total": resultado[0] if resultado[0] is not None else 0,
             "valor_total": resultado[1] if resultado[1] is not None else 0.0,
@@ -154,25 +312,24 @@ class BancoDados:
             "valor_fechado": resultado[5] if resultado[5] is not None else 0.0
         }
 
+    @leitura
     def buscar_produto(self, nome=None, ambiente="Estoque Aberto"):
         """Busca um produto pelo nome e filtra apenas os que pertencem ao ambiente especificado."""
 
         if nome:
-            self.cursor.execute("""
+            itens = yield todas("""
                 SELECT i.id, i.nome, i.sabor, i.valor_venda, i.quantidade, i.data_criacao,i.validade
                 FROM itens i
                 LEFT JOIN eletronicos e ON i.freezer_id = e.id
                 WHERE e.ambiente = %s AND i.nome ILIKE %s
             """, (ambiente, f"%{nome}%"))
         else:
-            self.cursor.execute("""
+            itens = yield todas("""
                 SELECT i.id, i.nome, i.sabor, i.valor_venda, i.quantidade, i.data_criacao,i.validade
                 FROM itens i
                 LEFT JOIN eletronicos e ON i.freezer_id = e.id
                 WHERE e.ambiente = %s
             """, (ambiente,))
-
-        itens = self.cursor.fetchall()
         return [
             {
                 "id": item[0],
@@ -186,10 +343,11 @@ class BancoDados:
             for item in itens
         ]
 
+    @leitura
     def top_produtos(self, limite=3, ambiente="Estoque Aberto"):
         """Retorna os produtos mais estocados no ambiente especificado (Aberto ou Fechado)."""
 
-        self.cursor.execute("""
+        return (yield todas("""
             SELECT i.nome, SUM(i.quantidade) AS estoque
             FROM itens i
             LEFT JOIN eletronicos e ON i.freezer_id = e.id
@@ -197,84 +355,76 @@ class BancoDados:
             GROUP BY i.nome
             ORDER BY estoque DESC
             LIMIT %s
-        """, (ambiente, limite))
-        
-        return self.cursor.fetchall()
+        """, (ambiente, limite)))
 
+    @leitura
     def listar_custos_armazenamento(self):
         """Lista os custos de armazenamento"""
-        self.cursor.execute("SELECT nome, valor FROM custos_armazenamento")
-        return self.cursor.fetchall()
-    
+        return (yield todas("SELECT nome, valor FROM custos_armazenamento"))
+
+    @leitura
     def calcular_total_armazenamento(self):
         """Calcula o custo total de armazenamento SOMENTE da tabela de custos"""
-        self.cursor.execute("SELECT SUM(valor) FROM custos_armazenamento")
-        total_custos = self.cursor.fetchone()[0]
-        return total_custos if total_custos is not None else 0.0 
-    
+        total_custos = (yield uma("SELECT SUM(valor) FROM custos_armazenamento"))[0]
+        return total_custos if total_custos is not None else 0.0
+
     def adicionar_custo_armazenamento(self, nome, valor, quantidade, categoria):
         """Adiciona um custo de armazenamento ou soma a quantidade e o valor total se já existir"""
         try:
-            self.cursor.execute("BEGIN;")
-
-            nome_normalizado = nome.strip().lower()
-
-            self.cursor.execute(
-                "SELECT id, quantidade, valor FROM custos_armazenamento WHERE LOWER(nome) = %s AND categoria = %s",
-                (nome_normalizado, categoria)
-            )
-            resultado = self.cursor.fetchone()
-
-            if resultado:
-                custo_id, quantidade_atual, valor_atual = resultado
-                nova_quantidade = quantidade_atual + quantidade
-                novo_valor = valor_atual + (valor * quantidade)
+            with self._cursor() as cursor:
+                nome_normalizado = nome.strip().lower()
 
-                self.cursor.execute(
-                    "UPDATE custos_armazenamento SET quantidade = %s, valor = %s WHERE id = %s",
-                    (nova_quantidade, novo_valor, custo_id)
-                )
-            else:
-                self.cursor.execute(
-                    "INSERT INTO custos_armazenamento (nome, valor, quantidade, categoria) VALUES (%s, %s, %s, %s)",
-                    (nome_normalizado, valor * quantidade, quantidade, categoria)
+                cursor.execute(
+                    "SELECT id, quantidade, valor FROM custos_armazenamento WHERE LOWER(nome) = %s AND categoria = %s",
+                    (nome_normalizado, categoria)
                 )
+                resultado = cursor.fetchone()
+
+                if resultado:
+                    custo_id, quantidade_atual, valor_atual = resultado
+                    nova_quantidade = quantidade_atual + quantidade
+                    novo_valor = valor_atual + (valor * quantidade)
 
-            self.conexao.commit()
+                    cursor.execute(
+                        "UPDATE custos_armazenamento SET quantidade = %s, valor = %s WHERE id = %s",
+                        (nova_quantidade, novo_valor, custo_id)
+                    )
+                else:
+                    cursor.execute(
+                        "INSERT INTO custos_armazenamento (nome, valor, quantidade, categoria) VALUES (%s, %s, %s, %s)",
+                        (nome_normalizado, valor * quantidade, quantidade, categoria)
+                    )
         except Exception as e:
-            self.conexao.rollback()
             print(f"Erro ao adicionar custo de armazenamento: {e}")
-    
+
 
     def adicionar_freezer(self, nome, kw_por_dia,quantidade, ambiente, capacidade_total):
         """Adiciona múltiplos freezers individualmente no banco de dados"""
         try:
-            self.cursor.execute("BEGIN;")
-            
-            for _ in range(quantidade):  
-                self.cursor.execute(
-                    "INSERT INTO eletronicos (nome, kw_por_dia, quantidade, ambiente, capacidade_total) VALUES (%s, %s, %s, %s, %s)",
-                    (nome, kw_por_dia, 1, ambiente, capacidade_total) 
-                )
+            with self._cursor() as cursor:
+                for _ in range(quantidade):
+                    cursor.execute(
+                        "INSERT INTO eletronicos (nome, kw_por_dia, quantidade, ambiente, capacidade_total) VALUES (%s, %s, %s, %s, %s)",
+                        (nome, kw_por_dia, 1, ambiente, capacidade_total)
+                    )
 
-            self.conexao.commit()
             print(f"✅ {quantidade} freezer(s) cadastrado(s) com sucesso!")
 
         except Exception as e:
-            self.conexao.rollback()
             print(f"❌ Erro ao adicionar freezer: {e}")
-    
+
     def calcular_consumo_energia(self, preco_kwh, ambiente):
         """Calcula o consumo total de energia mensal dos eletrônicos para um ambiente específico e o custo total"""
         try:
-            self.cursor.execute(
-                "SELECT SUM(kw_por_dia * 1) FROM eletronicos WHERE ambiente = %s",
-                (ambiente,)
-            )
-            resultado = self.cursor.fetchone()
-            consumo_mensal_kwh = resultado[0] * 30 if resultado[0] is not None else 0 
+            with self._cursor(pool=self._pool_leitura()) as cursor:
+                cursor.execute(
+                    "SELECT SUM(kw_por_dia * 1) FROM eletronicos WHERE ambiente = %s",
+                    (ambiente,)
+                )
+                resultado = cursor.fetchone()
+            consumo_mensal_kwh = resultado[0] * 30 if resultado[0] is not None else 0
 
-            custo_total = consumo_mensal_kwh * preco_kwh 
+            custo_total = consumo_mensal_kwh * preco_kwh
 
             return {
                 "consumo_mensal_kwh": round(consumo_mensal_kwh, 2),
@@ -283,66 +433,69 @@ class BancoDados:
         except Exception as e:
             print(f"Erro ao calcular consumo de energia para {ambiente}: {e}")
             return {"consumo_mensal_kwh": 0, "custo_total": 0}
-    
+
+    @leitura
     def listar_itens(self):
         """Retorna todos os itens cadastrados no banco, garantindo que a data seja lida corretamente."""
-        self.cursor.execute("""
+        itens = yield todas("""
             SELECT id, nome, sabor, valor_compra, valor_venda, quantidade, data_criacao, freezer_id,validade
             FROM itens
         """)
-        itens = self.cursor.fetchall()
-        
+
         return [
             {
-                "id": item[0], 
-                "nome": item[1], 
-                "sabor": item[2], 
-                "valor_compra": item[3],  
-                "valor_venda": item[4],  
-                "quantidade": item[5], 
-                "data_criacao": item[6].strftime("%d/%m/%Y %H:%M:%S") if isinstance(item[6], (str, bytes)) else item[6],  
+                "id": item[0],
+                "nome": item[1],
+                "sabor": item[2],
+                "valor_compra": item[3],
+                "valor_venda": item[4],
+                "quantidade": item[5],
+                "data_criacao": item[6].strftime("%d/%m/%Y %H:%M:%S") if isinstance(item[6], (str, bytes)) else item[6],
                 "freezer_id": item[7],
-                "validade": item[8].strftime("%d/%m/%Y %H:%M:%S") if isinstance(item[8], (str, bytes)) else item[8],  
+                "validade": item[8].strftime("%d/%m/%Y %H:%M:%S") if isinstance(item[8], (str, bytes)) else item[8],
             }
             for item in itens
         ]
 
+    @leitura
     def listar_freezers(self):
         """Retorna todos os freezers cadastrados no banco de dados"""
-        self.cursor.execute("SELECT id, nome, kw_por_dia, ambiente, capacidade_total FROM eletronicos")
-        freezers = self.cursor.fetchall()
+        freezers = yield todas("SELECT id, nome, kw_por_dia, ambiente, capacidade_total FROM eletronicos")
 
         return [
             {
-                "id": freezer[0], 
-                "nome": freezer[1], 
+                "id": freezer[0],
+                "nome": freezer[1],
                 "kw_por_dia": freezer[2],
-                "ambiente": freezer[3],  
+                "ambiente": freezer[3],
                 "capacidade_total": freezer[4]
             }
             for freezer in freezers
         ]
-    
+
+    @leitura
     def listar_status_freezers(self, ambiente, sabor=None):
-        """Retorna o uso dos freezers filtrados por ambiente e, opcionalmente, a quantidade de um sabor específico."""
-        self.cursor.execute("""
-            SELECT 
+        """Retorna o uso dos freezers filtrados por ambiente e, opcionalmente, a quantidade de um sabor específico.
+
+        A ocupação vem do contador `eletronicos.ocupado`, mantido pelos triggers de itens.
+        """
+        freezers = yield todas("""
+            SELECT
                 e.id,
                 e.nome,
                 e.ambiente,
                 e.capacidade_total,
-                COALESCE(SUM(i.quantidade), 0) AS ocupado,
-                (e.capacidade_total - COALESCE(SUM(i.quantidade), 0)) AS disponivel,
-                ROUND((COALESCE(SUM(i.quantidade), 0) * 100.0) / e.capacidade_total, 2) AS percentual_ocupado,
-                COALESCE(SUM(CASE WHEN i.sabor = %s THEN i.quantidade ELSE 0 END), 0) AS quantidade_sabor
+                e.ocupado,
+                e.capacidade_total - e.ocupado AS disponivel,
+                ROUND((e.ocupado * 100.0) / e.capacidade_total, 2) AS percentual_ocupado,
+                CASE WHEN %(sabor)s::text IS NULL THEN 0 ELSE COALESCE((
+                    SELECT SUM(i.quantidade) FROM itens i
+                    WHERE i.sabor = %(sabor)s AND i.freezer_id = e.id
+                ), 0) END AS quantidade_sabor
             FROM eletronicos e
-            LEFT JOIN itens i ON e.id = i.freezer_id
-            WHERE e.ambiente = %s AND e.capacidade_total > 1 -- Filtrando pelo ambiente especificado
-            GROUP BY e.id, e.nome, e.ambiente, e.capacidade_total
+            WHERE e.ambiente = %(ambiente)s AND e.capacidade_total > 1 -- Filtrando pelo ambiente especificado
             ORDER BY e.id;
-        """, (sabor, ambiente))
-
-        freezers = self.cursor.fetchall()
+        """, {"sabor": sabor, "ambiente": ambiente})
         return [
             {
                 "id": freezer[0],
@@ -352,7 +505,7 @@ class BancoDados:
                 "ocupado": freezer[4],
                 "disponivel": freezer[5],
                 "percentual_ocupado": float(freezer[6]),
-                "quantidade_sabor": freezer[7] 
+                "quantidade_sabor": freezer[7]
             }
             for freezer in freezers
         ]
@@ -361,154 +514,502 @@ class BancoDados:
     def adicionar_item(self, item: Item, freezer_id):
         """Adiciona um item ao estoque, respeitando a capacidade do freezer selecionado"""
         try:
-            self.cursor.execute("BEGIN;")
-
-            self.cursor.execute("""
-                SELECT capacidade_total - COALESCE((SELECT SUM(quantidade) FROM itens WHERE freezer_id = e.id), 0) AS espaco_disponivel
-                FROM eletronicos e WHERE id = %s
-            """, (freezer_id,))
-            resultado = self.cursor.fetchone()
-
-            if not resultado:
-                raise Exception(f"❌ Erro: Freezer {freezer_id} não encontrado no banco de dados!")
+            with self._cursor() as cursor:
+                # Trava o freezer até o fim da transação para que duas entradas simultâneas não ultrapassem a capacidade
+                cursor.execute("""
+                    SELECT capacidade_total - ocupado AS espaco_disponivel
+                    FROM eletronicos WHERE id = %s
+                    FOR UPDATE
+                """, (freezer_id,))
+                resultado = cursor.fetchone()
+
+                if not resultado:
+                    raise Exception(f"❌ Erro: Freezer {freezer_id} não encontrado no banco de dados!")
+
+                espaco_disponivel = resultado[0]
+
+                if item.quantidade > espaco_disponivel:
+                    raise Exception(f"❌ O freezer selecionado só tem espaço para {espaco_disponivel} picolés!")
+
+                # Verifica se já existe o lote (nome, sabor, código, freezer e validade)
+                cursor.execute("""
+                    SELECT id, quantidade FROM itens
+                    WHERE nome = %s AND sabor = %s AND freezer_id = %s AND codigo_barras = %s
+                      AND validade IS NOT DISTINCT FROM %s
+                """, (item.nome, item.sabor, freezer_id, item.codigo_barras, item.validade))
+                resultado = cursor.fetchone()
+
+                if resultado:
+                    item_id, quantidade_atual = resultado
+                    nova_quantidade = quantidade_atual + item.quantidade
+
+                    cursor.execute("""
+                        UPDATE itens SET quantidade = %s WHERE id = %s
+                    """, (nova_quantidade, item_id))
+                else:
+                    cursor.execute("""
+                        INSERT INTO itens
+                        (nome, sabor, valor_compra, valor_venda, quantidade, validade, freezer_id, codigo_barras)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                    """, (
+                        item.nome, item.sabor, item.valor_compra, item.valor_venda,
+                        item.quantidade, item.validade, freezer_id, item.codigo_barras
+                    ))
 
-            espaco_disponivel = resultado[0]
+            return True, f"✅ Item '{item.nome}' cadastrado corretamente no Freezer {freezer_id}!"
 
-            if item.quantidade > espaco_disponivel:
-                raise Exception(f"❌ O freezer selecionado só tem espaço para {espaco_disponivel} picolés!")
+        except Exception as e:
+            return False, str(e)
 
-            # Verifica se já existe o item (nome, sabor, código e freezer)
-            self.cursor.execute("""
-                SELECT id, quantidade FROM itens 
-                WHERE nome = %s AND sabor = %s AND freezer_id = %s AND codigo_barras = %s
-            """, (item.nome, item.sabor, freezer_id, item.codigo_barras))
-            resultado = self.cursor.fetchone()
 
-            if resultado:
-                item_id, quantidade_atual = resultado
-                nova_quantidade = quantidade_atual + item.quantidade
+    def adicionar_itens_em_lote(self, linhas):
+        """Dá entrada em várias linhas de estoque de uma vez.
+
+        Cada linha é um dicionário com as colunas de COLUNAS_ENTRADA. As linhas
+        válidas são copiadas (COPY) para uma tabela temporária, os freezers
+        envolvidos são travados e a capacidade é conferida por freezer com uma
+        soma acumulada na ordem das linhas: cada linha entra enquanto couber no
+        espaço livre. As linhas aceitas são somadas por lote (nome, sabor,
+        freezer, código de barras e validade) e gravadas com um único upsert;
+        uma validade nova é um lote novo, nunca somado a um lote de outra data.
+
+        Retorna (sucesso, mensagem, relatorio), com um item por linha de entrada:
+        {"linha", "status": "aceita" | "rejeitada", "motivo"}.
+        """
+        relatorio = []
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        for numero, linha in enumerate(linhas, start=1):
+            valores, motivo = normalizar_linha_entrada(linha)
+            relatorio.append({"linha": numero, "status": "rejeitada" if motivo else "aceita", "motivo": motivo})
+            if valores:
+                escritor.writerow((numero,) + valores)
+
+        if not any(r["status"] == "aceita" for r in relatorio):
+            return False, "❌ Nenhuma linha válida para dar entrada.", relatorio
 
-                self.cursor.execute("""
-                    UPDATE itens SET quantidade = %s WHERE id = %s
-                """, (nova_quantidade, item_id))
-            else:
-                self.cursor.execute("""
-                    INSERT INTO itens 
-                    (nome, sabor, valor_compra, valor_venda, quantidade, validade, freezer_id, codigo_barras)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    item.nome, item.sabor, item.valor_compra, item.valor_venda,
-                    item.quantidade, item.validade, freezer_id, item.codigo_barras
-                ))
-
-            self.conexao.commit()
-            return True, f"✅ Item '{item.nome}' cadastrado corretamente no Freezer {freezer_id}!"
+        try:
+            with self._cursor() as cursor:
+                cursor.execute("""
+                    CREATE TEMP TABLE entrada_estoque (
+                        linha INTEGER PRIMARY KEY,
+                        nome TEXT, sabor TEXT, valor_compra REAL, valor_venda REAL,
+                        quantidade INTEGER, validade DATE, freezer_id INTEGER, codigo_barras TEXT,
+                        motivo TEXT
+                    ) ON COMMIT DROP
+                """)
+                buffer.seek(0)
+                cursor.copy_expert(f"""
+                    COPY entrada_estoque (linha, {", ".join(COLUNAS_ENTRADA)})
+                    FROM STDIN WITH (FORMAT csv)
+                """, buffer)
+
+                # Trava os freezers em ordem de id: entradas simultâneas não ultrapassam a capacidade nem se travam
+                cursor.execute("""
+                    SELECT id FROM eletronicos
+                    WHERE id IN (SELECT DISTINCT freezer_id FROM entrada_estoque)
+                    ORDER BY id
+                    FOR UPDATE
+                """)
+
+                cursor.execute("""
+                    UPDATE entrada_estoque s
+                    SET motivo = CASE
+                        WHEN c.livre IS NULL THEN 'Freezer ' || s.freezer_id || ' não encontrado'
+                        ELSE 'Freezer ' || s.freezer_id || ' sem espaço (' || c.livre || ' livres para a entrada)'
+                    END
+                    FROM (
+                        SELECT l.linha, e.capacidade_total - e.ocupado AS livre,
+                               SUM(l.quantidade) OVER (PARTITION BY l.freezer_id ORDER BY l.linha) AS acumulado
+                        FROM entrada_estoque l
+                        LEFT JOIN eletronicos e ON e.id = l.freezer_id
+                    ) c
+                    WHERE s.linha = c.linha AND (c.livre IS NULL OR c.acumulado > c.livre)
+                    RETURNING s.linha, s.motivo
+                """)
+                rejeitadas = dict(cursor.fetchall())
+
+                # A primeira linha de cada lote define os preços de um lote novo, como no cadastro unitário
+                cursor.execute(f"""
+                    INSERT INTO itens AS i (nome, sabor, valor_compra, valor_venda, quantidade, validade, freezer_id, codigo_barras)
+                    SELECT DISTINCT ON (nome, sabor, freezer_id, codigo_barras, validade)
+                           nome, sabor, valor_compra, valor_venda,
+                           SUM(quantidade) OVER (PARTITION BY nome, sabor, freezer_id, codigo_barras, validade),
+                           validade, freezer_id, codigo_barras
+                    FROM entrada_estoque
+                    WHERE motivo IS NULL
+                    ORDER BY nome, sabor, freezer_id, codigo_barras, validade, linha
+                    ON CONFLICT {CHAVE_LOTE} DO UPDATE
+                    SET quantidade = i.quantidade + EXCLUDED.quantidade
+                """)
+
+            for linha in relatorio:
+                if linha["linha"] in rejeitadas:
+                    linha["status"] = "rejeitada"
+                    linha["motivo"] = rejeitadas[linha["linha"]]
+
+            aceitas = sum(1 for linha in relatorio if linha["status"] == "aceita")
+            if not aceitas:
+                return False, "❌ Nenhuma linha coube nos freezers informados.", relatorio
+            return True, f"✅ {aceitas} de {len(relatorio)} linha(s) deram entrada no estoque.", relatorio
 
         except Exception as e:
-            self.conexao.rollback()
-            return False, str(e)
+            return False, f"❌ Erro na entrada em lote: {str(e)}", relatorio
+
 
-        
+    @leitura
     def calcular_estoque_por_ambiente(self, ambiente):
         """Calcula a quantidade e valor do estoque com base no ambiente do freezer (Aberto ou Fechado)."""
-        self.cursor.execute("""
+        resultado = yield uma("""
             SELECT SUM(i.quantidade), SUM(i.quantidade * i.valor_venda)
             FROM itens i
             JOIN eletronicos e ON i.freezer_id = e.id
             WHERE e.ambiente = %s
         """, (ambiente,))
-        
-        resultado = self.cursor.fetchone()
-        
+
         return {
             "quantidade": resultado[0] if resultado[0] is not None else 0,
             "valor": resultado[1] if resultado[1] is not None else 0.0
         }
-    
-    def mover_picole(self, sabor, freezer_origem, freezer_destino, quantidade):
-        """Move um determinado número de picolés de um freezer para outro"""
-        try:
-            self.cursor.execute("BEGIN;")
 
-            self.cursor.execute("""
-                SELECT id, quantidade FROM itens 
-                WHERE sabor = %s AND freezer_id = %s
-                ORDER BY id
-            """, (sabor, freezer_origem))
-
-            registros_origem = self.cursor.fetchall()
-
-            if not registros_origem:
-                raise Exception(f"❌ Nenhum sorvete de sabor {sabor} encontrado no Freezer {freezer_origem}!")
+    @leitura
+    def listar_estoque_critico(self, limite=10):
+        """Retorna os pares (sabor, freezer) cujo estoque somado está no limite crítico ou abaixo dele"""
+        resultados = yield todas("""
+            SELECT sabor, freezer_id, SUM(quantidade) AS quantidade
+            FROM itens
+            GROUP BY sabor, freezer_id
+            HAVING SUM(quantidade) <= %s
+            ORDER BY quantidade, sabor, freezer_id
+        """, (limite,))
+        return [
+            {"sabor": r[0], "freezer_id": r[1], "quantidade": r[2]}
+            for r in resultados
+        ]
 
-            quantidade_disponivel = sum(item[1] for item in registros_origem)
-            if quantidade_disponivel < quantidade:
-                raise Exception(f"❌ Apenas {quantidade_disponivel} picolés disponíveis no Freezer {freezer_origem}!")
+    @leitura
+    def listar_proximos_vencimento(self, dias=10, desconto=0.30):
+        """Retorna os lotes em estoque que vencem nos próximos `dias`, com o preço promocional sugerido.
 
-            self.cursor.execute("""
-                SELECT e.capacidade_total - COALESCE(SUM(i.quantidade), 0)
-                FROM eletronicos e
-                LEFT JOIN itens i ON e.id = i.freezer_id
-                WHERE e.id = %s
-                GROUP BY e.capacidade_total
-            """, (freezer_destino,))
+        Usa o índice parcial de validade (quantidade > 0), então o custo depende
+        da quantidade de lotes vencendo e não do tamanho do catálogo.
+        """
+        resultados = yield todas("""
+            SELECT id, nome, sabor, valor_venda, validade, quantidade, freezer_id,
+                   ROUND((valor_venda * (1 - %(desconto)s))::numeric, 2) AS preco_promocional
+            FROM itens
+            WHERE quantidade > 0 AND validade <= CURRENT_DATE + %(dias)s
+            ORDER BY validade, id
+        """, {"dias": dias, "desconto": desconto})
+        return [
+            {
+                "id": r[0],
+                "nome": r[1],
+                "sabor": r[2],
+                "valor_venda": r[3],
+                "validade": r[4],
+                "quantidade": r[5],
+                "freezer_id": r[6],
+                "preco_promocional": float(r[7])
+            }
+            for r in resultados
+        ]
 
-            espaco_disponivel = self.cursor.fetchone()[0]
+    @leitura
+    def painel_ambiente(self, ambiente, limite_top=3):
+        """Retorna todos os números do painel de um ambiente em uma única consulta.
+
+        Os itens do ambiente são lidos uma só vez (CTE `base`) e todos os
+        indicadores saem do mesmo snapshot: estoque, consumo mensal de energia,
+        custo de armazenamento, principais produtos, ocupação dos freezers e a
+        lista de produtos do ambiente.
+        """
+        resultado = yield uma("""
+            WITH base AS (
+                SELECT i.id, i.nome, i.sabor, i.valor_venda, i.quantidade, i.data_criacao, i.validade
+                FROM itens i
+                JOIN eletronicos e ON i.freezer_id = e.id
+                WHERE e.ambiente = %(ambiente)s
+            ),
+            freezers AS (
+                SELECT id, nome, ambiente, capacidade_total, ocupado, kw_por_dia
+                FROM eletronicos
+                WHERE ambiente = %(ambiente)s
+            ),
+            top AS (
+                SELECT nome, SUM(quantidade) AS estoque
+                FROM base
+                GROUP BY nome
+                ORDER BY estoque DESC
+                LIMIT %(limite)s
+            )
+            SELECT
+                (SELECT COALESCE(SUM(quantidade), 0) FROM base),
+                (SELECT COALESCE(SUM(quantidade * valor_venda), 0) FROM base),
+                (SELECT COALESCE(SUM(kw_por_dia), 0) * 30 FROM freezers),
+                (SELECT COALESCE(SUM(valor), 0) FROM custos_armazenamento),
+                (SELECT COALESCE(json_agg(json_build_array(nome, estoque) ORDER BY estoque DESC), '[]') FROM top),
+                (SELECT COALESCE(json_agg(json_build_object(
+                    'id', id,
+                    'nome', nome,
+                    'ambiente', ambiente,
+                    'capacidade_total', capacidade_total,
+                    'ocupado', ocupado,
+                    'disponivel', capacidade_total - ocupado,
+                    'percentual_ocupado', ROUND((ocupado * 100.0) / capacidade_total, 2)
+                ) ORDER BY id), '[]') FROM freezers WHERE capacidade_total > 1),
+                (SELECT COALESCE(json_agg(json_build_object(
+                    'id', id,
+                    'nome', nome,
+                    'sabor', sabor,
+                    'valor', valor_venda,
+                    'quantidade', quantidade,
+                    'data_criacao', to_char(data_criacao, 'DD/MM/YYYY HH24:MI:SS'),
+                    'validade', to_char(validade, 'DD/MM/YYYY HH24:MI:SS')
+                )), '[]') FROM base)
+        """, {"ambiente": ambiente, "limite": limite_top})
+
+        freezers = resultado[5]
+        for freezer in freezers:
+            freezer["percentual_ocupado"] = float(freezer["percentual_ocupado"])
 
-            if espaco_disponivel < quantidade:
-                raise Exception(f"❌ O Freezer {freezer_destino} tem apenas {espaco_disponivel} espaços disponíveis!")
+        return {
+            "estoque": {"quantidade": resultado[0], "valor": float(resultado[1])},
+            "consumo_mensal_kwh": round(float(resultado[2]), 2),
+            "total_armazenamento": float(resultado[3]),
+            "top_produtos": [tuple(produto) for produto in resultado[4]],
+            "freezers": freezers,
+            "produtos": resultado[6]
+        }
 
-            self.cursor.execute("""
-                SELECT id, quantidade FROM itens 
-                WHERE sabor = %s AND freezer_id = %s
-            """, (sabor, freezer_destino))
+    def transferir_picoles(self, movimentos):
+        """Executa várias transferências de picolés entre freezers em uma única transação.
+
+        `movimentos` é uma lista de (sabor, origem, destino, quantidade). Os
+        lotes de origem são consumidos do vencimento mais próximo ao mais
+        distante (FEFO): cada movimento ocupa uma faixa da soma acumulada dos
+        pedidos do mesmo sabor e freezer, e recebe de cada lote a interseção
+        com a faixa acumulada desse lote. Os lotes chegam ao destino com nome,
+        preços, código de barras e validade preservados, somando-se ao lote
+        igual (inclusive na validade) que já estiver lá. Os saldos e a
+        capacidade dos destinos são conferidos uma vez por sabor/freezer,
+        sobre o estoque de antes da transferência.
+
+        Retorna (sucesso, mensagem, falhas); se algo falhar nada é movido.
+        """
+        pedidos = []
+        falhas = []
+        for ordem, (sabor, origem, destino, quantidade) in enumerate(movimentos, start=1):
+            try:
+                origem, destino = int(origem), int(destino)
+            except (TypeError, ValueError):
+                falhas.append({"sabor": sabor, "freezer": origem, "motivo": "freezer de origem ou destino inválido"})
+                continue
+            try:
+                quantidade = int(quantidade)
+            except (TypeError, ValueError):
+                falhas.append({"sabor": sabor, "freezer": origem, "motivo": "quantidade inválida"})
+                continue
+            if quantidade <= 0:
+                falhas.append({"sabor": sabor, "freezer": origem, "motivo": "quantidade deve ser maior que zero"})
+            elif origem == destino:
+                falhas.append({"sabor": sabor, "freezer": origem, "motivo": "origem e destino são o mesmo freezer"})
+            else:
+                pedidos.append((ordem, sabor, origem, destino, quantidade))
 
-            destino_existente = self.cursor.fetchone()
+        if falhas:
+            return False, "❌ Transferência inválida.", falhas
+        if not pedidos:
+            return False, "❌ Nenhuma transferência informada.", []
 
-            if destino_existente:
-                item_destino_id, quantidade_destino = destino_existente
-                nova_quantidade_destino = quantidade_destino + quantidade
+        try:
+            with self._cursor() as cursor:
+                cursor.execute("""
+                    CREATE TEMP TABLE transf_movimentos (
+                        ordem INTEGER PRIMARY KEY, sabor TEXT, origem INTEGER, destino INTEGER, quantidade INTEGER
+                    ) ON COMMIT DROP
+                """)
+                execute_values(cursor, "INSERT INTO transf_movimentos VALUES %s", pedidos)
+
+                # Mesma ordem de travas da venda: primeiro os lotes, depois os freezers, sempre por id. Os lotes
+                # do sabor nos destinos entram já aqui: o upsert do destino os travaria na ordem do INSERT, e
+                # duas transferências opostas (A→B e B→A) se travariam mutuamente
+                cursor.execute("""
+                    SELECT id FROM itens
+                    WHERE (sabor, freezer_id) IN (
+                        SELECT sabor, origem FROM transf_movimentos UNION SELECT sabor, destino FROM transf_movimentos
+                    )
+                    ORDER BY id
+                    FOR UPDATE
+                """)
+                cursor.execute("""
+                    SELECT id FROM eletronicos
+                    WHERE id IN (SELECT origem FROM transf_movimentos UNION SELECT destino FROM transf_movimentos)
+                    ORDER BY id
+                    FOR UPDATE
+                """)
+
+                cursor.execute("""
+                    SELECT m.sabor, m.origem, m.pedido, COALESCE(d.disponivel, 0)
+                    FROM (
+                        SELECT sabor, origem, SUM(quantidade) AS pedido
+                        FROM transf_movimentos GROUP BY sabor, origem
+                    ) m
+                    LEFT JOIN (
+                        SELECT sabor, freezer_id, SUM(quantidade) AS disponivel
+                        FROM itens
+                        WHERE (sabor, freezer_id) IN (SELECT sabor, origem FROM transf_movimentos)
+                        GROUP BY sabor, freezer_id
+                    ) d ON d.sabor = m.sabor AND d.freezer_id = m.origem
+                    WHERE m.pedido > COALESCE(d.disponivel, 0)
+                    ORDER BY m.origem, m.sabor
+                """)
+                falhas += [
+                    {"sabor": sabor, "freezer": origem,
+                     "motivo": f"apenas {disponivel} picolés disponíveis no Freezer {origem} (pedido: {pedido})"}
+                    for sabor, origem, pedido, disponivel in cursor.fetchall()
+                ]
+
+                # Capacidade pelo saldo líquido de cada freezer: entradas menos saídas do lote inteiro
+                cursor.execute("""
+                    SELECT f.id, e.id IS NULL, e.capacidade_total - e.ocupado, f.liquido
+                    FROM (
+                        SELECT freezer_id AS id, SUM(quantidade) AS liquido
+                        FROM (
+                            SELECT destino AS freezer_id, quantidade FROM transf_movimentos
+                            UNION ALL
+                            SELECT origem, -quantidade FROM transf_movimentos
+                        ) saldo
+                        GROUP BY freezer_id
+                    ) f
+                    LEFT JOIN eletronicos e ON e.id = f.id
+                    WHERE e.id IS NULL OR f.liquido > e.capacidade_total - e.ocupado
+                    ORDER BY f.id
+                """)
+                for freezer_id, inexistente, livre, liquido in cursor.fetchall():
+                    motivo = (f"Freezer {freezer_id} não encontrado" if inexistente
+                              else f"o Freezer {freezer_id} tem apenas {livre} espaços disponíveis (entrada: {liquido})")
+                    falhas.append({"sabor": None, "freezer": freezer_id, "motivo": motivo})
+
+                if falhas:
+                    cursor.connection.rollback()
+                    return False, "❌ Transferência não realizada.", falhas
+
+                cursor.execute("""
+                    CREATE TEMP TABLE transf_alocacao ON COMMIT DROP AS
+                    WITH lotes AS (
+                        SELECT id, sabor, freezer_id, validade,
+                               SUM(quantidade) OVER w - quantidade AS inicio,
+                               SUM(quantidade) OVER w AS fim
+                        FROM itens
+                        WHERE (sabor, freezer_id) IN (SELECT sabor, origem FROM transf_movimentos) AND quantidade > 0
+                        WINDOW w AS (PARTITION BY sabor, freezer_id ORDER BY validade NULLS LAST, id)
+                    ),
+                    faixas AS (
+                        SELECT ordem, sabor, origem, destino,
+                               SUM(quantidade) OVER w - quantidade AS inicio,
+                               SUM(quantidade) OVER w AS fim
+                        FROM transf_movimentos
+                        WINDOW w AS (PARTITION BY sabor, origem ORDER BY ordem)
+                    )
+                    SELECT l.id AS item_id, f.destino, l.validade,
+                           LEAST(l.fim, f.fim) - GREATEST(l.inicio, f.inicio) AS quantidade
+                    FROM faixas f
+                    JOIN lotes l ON l.sabor = f.sabor AND l.freezer_id = f.origem
+                                AND l.inicio < f.fim AND f.inicio < l.fim
+                """)
+
+                # Destino primeiro, enquanto os dados dos lotes de origem ainda existem
+                cursor.execute(f"""
+                    INSERT INTO itens AS i (nome, sabor, valor_compra, valor_venda, quantidade, validade, freezer_id, codigo_barras)
+                    SELECT o.nome, o.sabor,
+                           (array_agg(o.valor_compra ORDER BY o.id))[1],
+                           (array_agg(o.valor_venda ORDER BY o.id))[1],
+                           SUM(a.quantidade), a.validade, a.destino, o.codigo_barras
+                    FROM transf_alocacao a
+                    JOIN itens o ON o.id = a.item_id
+                    GROUP BY o.nome, o.sabor, a.destino, o.codigo_barras, a.validade
+                    ORDER BY o.nome, o.sabor, a.destino, o.codigo_barras, a.validade
+                    ON CONFLICT {CHAVE_LOTE} DO UPDATE
+                    SET quantidade = i.quantidade + EXCLUDED.quantidade
+                """)
+                cursor.execute("""
+                    UPDATE itens i SET quantidade = i.quantidade - a.quantidade
+                    FROM (SELECT item_id, SUM(quantidade) AS quantidade FROM transf_alocacao GROUP BY item_id) a
+                    WHERE i.id = a.item_id
+                """)
+                cursor.execute("""
+                    DELETE FROM itens
+                    WHERE id IN (SELECT item_id FROM transf_alocacao) AND quantidade = 0
+                """)
+
+            total = sum(pedido[4] for pedido in pedidos)
+            return True, f"✅ {total} picolés movidos em {len(pedidos)} transferência(s)!", []
 
-                self.cursor.execute("""
-                    UPDATE itens SET quantidade = %s WHERE id = %s
-                """, (nova_quantidade_destino, item_destino_id))
-            else:
-                self.cursor.execute("""
-                    INSERT INTO itens (nome, sabor, valor_compra, valor_venda, quantidade, freezer_id, validade)
-                    SELECT nome, sabor, valor_compra, valor_venda, %s, %s, validade
-                    FROM itens WHERE id = %s
-                """, (quantidade, freezer_destino, registros_origem[0][0]))
-
-            quantidade_restante = quantidade
-            for item_id, qtd in registros_origem:
-                if quantidade_restante == 0:
-                    break
-                if qtd > quantidade_restante:
-                    self.cursor.execute("""
-                        UPDATE itens SET quantidade = quantidade - %s WHERE id = %s
-                    """, (quantidade_restante, item_id))
-                    quantidade_restante = 0
-                else:
-                    self.cursor.execute("DELETE FROM itens WHERE id = %s", (item_id,))
-                    quantidade_restante -= qtd
+        except Exception as e:
+            return False, f"❌ Erro na transferência: {str(e)}", []
 
-            self.conexao.commit()
+    def mover_picole(self, sabor, freezer_origem, freezer_destino, quantidade):
+        """Move um determinado número de picolés de um freezer para outro"""
+        sucesso, mensagem, falhas = self.transferir_picoles([(sabor, freezer_origem, freezer_destino, quantidade)])
+        if sucesso:
             return True, f"✅ {quantidade} picolés de {sabor} movidos do Freezer {freezer_origem} para o Freezer {freezer_destino}!"
+        if falhas:
+            return False, "❌ " + falhas[0]["motivo"][0].upper() + falhas[0]["motivo"][1:] + "!"
+        return False, mensagem
+
+
+    @leitura
+    def dados_rebalanceamento(self, dias_vencimento=10):
+        """Ocupação de todos os freezers e estoque por freezer e sabor, com a parte perto da validade"""
+        freezers = yield todas("SELECT id, ambiente, capacidade_total, ocupado FROM eletronicos ORDER BY id")
+        estoque = yield todas("""
+            SELECT freezer_id, sabor, SUM(quantidade),
+                   COALESCE(SUM(quantidade) FILTER (WHERE validade <= CURRENT_DATE + %s), 0)
+            FROM itens
+            WHERE freezer_id IS NOT NULL AND quantidade > 0
+            GROUP BY freezer_id, sabor
+        """, (dias_vencimento,))
+        return (
+            [{"id": r[0], "ambiente": r[1], "capacidade_total": r[2], "ocupado": r[3]} for r in freezers],
+            [{"freezer_id": r[0], "sabor": r[1], "quantidade": r[2], "vencendo": r[3]} for r in estoque]
+        )
 
-        except Exception as e:
-            self.conexao.rollback()
-            return False, str(e)
-
+    @leitura
+    def dados_previsao_demanda(self, data_inicio, data_fim, inicio_janela):
+        """Vendas diárias por sabor, vendas por freezer desde `inicio_janela` e estoque por sabor e freezer.
+
+        Entrada de `model.previsao.prever_estoque`; as vendas por freezer vêm do
+        freezer atual do lote de cada linha vendida.
+        """
+        historico = yield todas("""
+            SELECT dia, sabor, SUM(quantidade)
+            FROM venda_itens_diario
+            WHERE dia BETWEEN %s AND %s
+            GROUP BY dia, sabor
+        """, (data_inicio, data_fim))
+        participacoes = yield todas("""
+            SELECT v.sabor, i.freezer_id, SUM(v.quantidade)
+            FROM venda_itens v
+            JOIN itens i ON i.id = v.item_id
+            WHERE v.dia BETWEEN %s AND %s
+            GROUP BY v.sabor, i.freezer_id
+        """, (inicio_janela, data_fim))
+        estoque = yield todas("""
+            SELECT sabor, freezer_id, SUM(quantidade)
+            FROM itens
+            GROUP BY sabor, freezer_id
+        """)
+        return historico, participacoes, estoque
 
+    @leitura
     def obter_quantidade_por_sabor(self):
         """Retorna a quantidade de cada sabor dentro de cada freezer"""
-        self.cursor.execute("""
+        resultado = yield todas("""
             SELECT freezer_id, sabor, SUM(quantidade)
             FROM itens
             GROUP BY freezer_id, sabor
         """)
-        
-        resultado = self.cursor.fetchall()
 
         quantidades = {}
         for freezer_id, sabor, quantidade in resultado:
@@ -518,43 +1019,119 @@ class BancoDados:
 
         return quantidades
 
-    
+
     def lancar_financeiro(self, tipo, categoria, descricao, valor, data=None, operador=None):
         try:
             if data is None:
                 data = datetime.now().date()
-            self.cursor.execute("""
-                INSERT INTO financeiro (tipo, categoria, descricao, valor, data_lancamento, operador)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (tipo, categoria, descricao, valor, data, operador))
-            self.conexao.commit()
+            with self._cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO financeiro (tipo, categoria, descricao, valor, data_lancamento, operador)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, (tipo, categoria, descricao, valor, data, operador))
             return True
         except Exception as e:
             print("Erro ao lançar financeiro:", e)
-            self.conexao.rollback()
             return False
 
+    @leitura
     def obter_resumo_financeiro(self, data_inicio, data_fim):
-        self.cursor.execute("""
-            SELECT tipo, SUM(valor)
-            FROM financeiro
-            WHERE data_lancamento BETWEEN %s AND %s
+        """Retorna (tipo, total) do período, lidos do resumo diário do financeiro"""
+        return (yield todas("""
+            SELECT tipo, SUM(total)::float8
+            FROM financeiro_diario
+            WHERE dia BETWEEN %s AND %s
             GROUP BY tipo
+        """, (data_inicio, data_fim)))
+
+    def reconstruir_financeiro_diario(self):
+        """Recalcula o resumo diário inteiro a partir dos lançamentos do financeiro"""
+        with self._cursor() as cursor:
+            reconstruir_financeiro_diario(cursor)
+            cursor.execute("SELECT COUNT(*) FROM financeiro_diario")
+            return cursor.fetchone()[0]
+
+    @leitura
+    def verificar_financeiro_diario(self):
+        """Compara o resumo diário com os lançamentos; retorna as chaves divergentes"""
+        return (yield todas("""
+            SELECT COALESCE(r.dia, l.dia), COALESCE(r.tipo, l.tipo), COALESCE(r.categoria, l.categoria),
+                   COALESCE(r.operador, l.operador), COALESCE(r.total, 0)::float8, COALESCE(l.total, 0)::float8
+            FROM financeiro_diario r
+            FULL JOIN (
+                SELECT data_lancamento::date AS dia, tipo, categoria, COALESCE(operador, '') AS operador,
+                       SUM(valor::numeric(14, 2)) AS total, COUNT(*) AS quantidade
+                FROM financeiro
+                GROUP BY 1, 2, 3, 4
+            ) l ON r.dia = l.dia AND r.tipo = l.tipo AND r.categoria = l.categoria AND r.operador = l.operador
+            WHERE r.total IS DISTINCT FROM l.total OR r.quantidade IS DISTINCT FROM l.quantidade
+            ORDER BY 1, 2, 3, 4
+        """))
+
+    @leitura
+    def vendas_por_sabor(self, data_inicio, data_fim):
+        """Retorna quantidade vendida e receita por sabor no período, do mais vendido ao menos vendido"""
+        resultados = yield todas("""
+            SELECT sabor, SUM(quantidade), SUM(receita)::float8
+            FROM venda_itens_diario
+            WHERE dia BETWEEN %s AND %s
+            GROUP BY sabor
+            ORDER BY 2 DESC, sabor
         """, (data_inicio, data_fim))
-        return self.cursor.fetchall()
-    
-    def excluir_lancamento_financeiro(self, id_lancamento):
-        self.cursor.execute("DELETE FROM financeiro WHERE id = %s", (id_lancamento,))
-        self.conexao.commit()
-        return True
-    
-
+        return [{"sabor": r[0], "quantidade": r[1], "receita": r[2]} for r in resultados]
+
+    @leitura
+    def vendas_por_produto(self, data_inicio, data_fim, sabor=None):
+        """Retorna quantidade vendida e receita por produto (nome e sabor) no período, opcionalmente de um sabor"""
+        resultados = yield todas("""
+            SELECT nome, sabor, SUM(quantidade), SUM(receita)::float8
+            FROM venda_itens_diario
+            WHERE dia BETWEEN %(inicio)s AND %(fim)s
+              AND (%(sabor)s::text IS NULL OR sabor = %(sabor)s::text)
+            GROUP BY nome, sabor
+            ORDER BY 3 DESC, nome, sabor
+        """, {"inicio": data_inicio, "fim": data_fim, "sabor": sabor})
+        return [{"nome": r[0], "sabor": r[1], "quantidade": r[2], "receita": r[3]} for r in resultados]
+
+    def reconstruir_vendas_diario(self):
+        """Recalcula o resumo diário das vendas por produto a partir das linhas das vendas"""
+        with self._cursor() as cursor:
+            reconstruir_vendas_diario(cursor)
+            cursor.execute("SELECT COUNT(*) FROM venda_itens_diario")
+            return cursor.fetchone()[0]
+
+    @leitura
+    def verificar_vendas_diario(self):
+        """Compara o resumo diário das vendas com as linhas das vendas; retorna as chaves divergentes"""
+        return (yield todas("""
+            SELECT COALESCE(r.dia, l.dia), COALESCE(r.nome, l.nome), COALESCE(r.sabor, l.sabor),
+                   COALESCE(r.quantidade, 0), COALESCE(l.quantidade, 0)
+            FROM venda_itens_diario r
+            FULL JOIN (
+                SELECT dia, nome, sabor, SUM(quantidade) AS quantidade, SUM(receita) AS receita
+                FROM venda_itens
+                GROUP BY 1, 2, 3
+            ) l ON r.dia = l.dia AND r.nome = l.nome AND r.sabor = l.sabor
+            WHERE r.quantidade IS DISTINCT FROM l.quantidade OR r.receita IS DISTINCT FROM l.receita
+            ORDER BY 1, 2, 3
+        """))
+
+
+    @leitura
     def buscar_item_por_codigo(self, codigo):
-        self.cursor.execute("""
-            SELECT id, nome, sabor, valor_venda, quantidade FROM itens
-            WHERE codigo_barras = %s
+        """Retorna o próximo lote a sair do código: o de vencimento mais próximo com estoque.
+
+        Na mesma validade, o lote de um freezer do Estoque Aberto vem antes.
+        Retorna None se nenhum lote do código tiver estoque.
+        """
+        resultado = yield uma("""
+            SELECT i.id, i.nome, i.sabor, i.valor_venda, i.quantidade
+            FROM itens i
+            LEFT JOIN eletronicos e ON i.freezer_id = e.id
+            WHERE i.codigo_barras = %s AND i.quantidade > 0
+            ORDER BY i.validade NULLS LAST, e.ambiente IS DISTINCT FROM 'Estoque Aberto', i.id
+            LIMIT 1
         """, (codigo,))
-        resultado = self.cursor.fetchone()
         if resultado:
             return {
                 "id": resultado[0],
@@ -564,167 +1141,704 @@ class BancoDados:
                 "quantidade": resultado[4]
             }
         return None
-    
-    def baixar_estoque_e_registrar_venda(self, item_id, valor_venda):
-        try:
-            self.cursor.execute("BEGIN;")
 
-            self.cursor.execute("""
-                SELECT quantidade FROM itens WHERE id = %s
-            """, (item_id,))
-            qtd_atual = self.cursor.fetchone()
+    @leitura
+    def listar_lotes(self, ids=None):
+        """Retorna os lotes de itens com o ambiente do freezer; todos ou apenas os ids informados"""
+        resultados = yield todas("""
+            SELECT i.id, i.codigo_barras, i.nome, i.sabor, i.valor_venda, i.quantidade,
+                   i.validade, i.freezer_id, e.ambiente
+            FROM itens i
+            LEFT JOIN eletronicos e ON i.freezer_id = e.id
+            WHERE %(ids)s::integer[] IS NULL OR i.id = ANY(%(ids)s::integer[])
+        """, {"ids": list(ids) if ids is not None else None})
+        return [
+            {
+                "id": r[0],
+                "codigo_barras": r[1],
+                "nome": r[2],
+                "sabor": r[3],
+                "valor_venda": r[4],
+                "quantidade": r[5],
+                "validade": r[6],
+                "freezer_id": r[7],
+                "ambiente": r[8]
+            }
+            for r in resultados
+        ]
 
-            if not qtd_atual or qtd_atual[0] <= 0:
-                raise Exception("Produto sem estoque disponível.")
+    @leitura
+    def buscar_lotes_por_codigo(self, codigo):
+        """Retorna todos os lotes de um código de barras, com o estoque de cada um, na ordem de saída"""
+        resultados = yield todas("""
+            SELECT i.id, i.codigo_barras, i.nome, i.sabor, i.valor_venda, i.quantidade,
+                   i.validade, i.freezer_id, e.ambiente
+            FROM itens i
+            LEFT JOIN eletronicos e ON i.freezer_id = e.id
+            WHERE i.codigo_barras = %s
+            ORDER BY i.validade NULLS LAST, e.ambiente IS DISTINCT FROM 'Estoque Aberto', i.id
+        """, (codigo,))
+        return [
+            {
+                "id": r[0],
+                "codigo_barras": r[1],
+                "nome": r[2],
+                "sabor": r[3],
+                "valor_venda": r[4],
+                "quantidade": r[5],
+                "validade": r[6],
+                "freezer_id": r[7],
+                "ambiente": r[8]
+            }
+            for r in resultados
+        ]
 
-            self.cursor.execute("""
-                UPDATE itens SET quantidade = quantidade - 1
-                WHERE id = %s
-            """, (item_id,))
+    def baixar_estoque_e_registrar_venda(self, item_id, valor_venda):
+        try:
+            with self._cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO financeiro (tipo, categoria, descricao, valor)
+                    VALUES ('Receita', 'Venda', 'Venda realizada via PDV', %s)
+                    RETURNING id, data_lancamento
+                """, (valor_venda,))
+                financeiro_id, data_lancamento = cursor.fetchone()
+
+                # Baixa por último: a trava do lote e do freezer fica retida só até o commit
+                cursor.execute("""
+                    UPDATE itens SET quantidade = quantidade - 1
+                    WHERE id = %s AND quantidade >= 1
+                    RETURNING nome, sabor
+                """, (item_id,))
+                lote = cursor.fetchone()
+                if lote is None:
+                    raise Exception("Produto sem estoque disponível.")
 
-            self.cursor.execute("""
-                INSERT INTO financeiro (tipo, categoria, descricao, valor)
-                VALUES ('Receita', 'Venda', 'Venda realizada via PDV', %s)
-            """, (valor_venda,))
+                _gravar_vendas(cursor, [{
+                    "financeiro_id": financeiro_id, "data": data_lancamento, "operador": None,
+                    "forma_pagamento": None, "subtotal": valor_venda, "desconto": 0.0, "total": valor_venda,
+                    "origem": "pdv",
+                    "carrinho": [{"id": item_id, "nome": lote[0], "sabor": lote[1], "valor_venda": valor_venda, "quantidade": 1}],
+                }])
 
-            self.conexao.commit()
             return True, "✅ Venda registrada com sucesso."
 
         except Exception as e:
-            self.conexao.rollback()
             return False, f"❌ Erro na venda: {str(e)}"
-    
+
+    @leitura
     def listar_lancamentos(self, data_inicio, data_fim):
-        self.cursor.execute("""
+        resultados = yield todas("""
             SELECT id, tipo, categoria, descricao, valor, data_lancamento, operador
             FROM financeiro
             WHERE data_lancamento BETWEEN %s AND %s
             ORDER BY data_lancamento DESC
         """, (data_inicio, data_fim))
-        resultados = self.cursor.fetchall()
         return [
             {
                 "id": r[0], "tipo": r[1], "categoria": r[2], "descricao": r[3],
                 "valor": r[4], "data": r[5].strftime("%d/%m/%Y"), "operador": r[6]
             } for r in resultados
         ]
-    
-    def finalizar_venda_com_carrinho(self, carrinho, forma_pagamento="Dinheiro", operador="Sistema"):
-        """Finaliza a venda com base no carrinho e registra no financeiro"""
-        try:
-            self.cursor.execute("BEGIN;")
-            total = 0
-            descricao_itens = []
-
-            for item in carrinho:
-                item_id = item["id"]
-                valor_unitario = item["valor_venda"]
-                quantidade = item["quantidade"]
-
-                # Baixa do estoque
-                self.cursor.execute("""
-                    SELECT quantidade FROM itens WHERE id = %s
-                """, (item_id,))
-                resultado = self.cursor.fetchone()
-
-                if not resultado or resultado[0] < quantidade:
-                    raise Exception(f"❌ Estoque insuficiente para o item '{item['nome']}'.")
-
-                self.cursor.execute("""
-                    UPDATE itens SET quantidade = quantidade - %s
-                    WHERE id = %s
-                """, (quantidade, item_id))
-
-                total += valor_unitario * quantidade
-                descricao_itens.append(f"{item['nome']} ({item['sabor']}) x{quantidade}")
 
-            descricao_venda = "Itens: " + ", ".join(descricao_itens)
-            categoria = f"Venda - {forma_pagamento}"
-            data_venda = datetime.now().date()
-
-            self.lancar_financeiro("Receita", categoria, f"Venda via PDV por {operador} - {descricao_venda}", total, data_venda)
+    @leitura
+    def listar_vendas_financeiro(self, data_inicio, data_fim):
+        """Lista as receitas de venda do financeiro no período, para reemissão de recibos"""
+        resultados = yield todas("""
+            SELECT id, categoria, descricao, valor, data_lancamento, operador
+            FROM financeiro
+            WHERE tipo = 'Receita' AND categoria LIKE 'Venda%%'
+              AND data_lancamento >= %s AND data_lancamento < %s::date + 1
+            ORDER BY data_lancamento, id
+        """, (data_inicio, data_fim))
+        return [
+            {
+                "id": r[0], "categoria": r[1], "descricao": r[2],
+                "valor": r[3], "data": r[4], "operador": r[5]
+            } for r in resultados
+        ]
 
-            self.conexao.commit()
-            return True, f"✅ Venda concluída. Total: R$ {total:.2f}"
+    @staticmethod
+    def _filtro_financeiro(data_inicio, data_fim, tipos=None, categorias=None, operadores=None,
+                           coluna_data="data_lancamento"):
+        """Monta o WHERE dos relatórios financeiros, sobre `financeiro` ou `financeiro_diario`.
+
+        O período inclui o dia final inteiro. Filtros None não restringem nada;
+        uma lista vazia não deixa passar nenhum lançamento, como no multiselect.
+        Lançamentos sem operador são filtrados pelo operador ''.
+        """
+        condicao = f"""
+            {coluna_data} >= %(inicio)s AND {coluna_data} < %(fim)s::date + 1
+            AND (%(tipos)s::text[] IS NULL OR tipo = ANY(%(tipos)s::text[]))
+            AND (%(categorias)s::text[] IS NULL OR categoria = ANY(%(categorias)s::text[]))
+            AND (%(operadores)s::text[] IS NULL OR COALESCE(operador, '') = ANY(%(operadores)s::text[]))
+        """
+        parametros = {
+            "inicio": data_inicio,
+            "fim": data_fim,
+            "tipos": list(tipos) if tipos is not None else None,
+            "categorias": list(categorias) if categorias is not None else None,
+            "operadores": list(operadores) if operadores is not None else None
+        }
+        return condicao, parametros
+
+    @leitura
+    def totais_financeiro(self, data_inicio, data_fim, tipos=None, categorias=None, operadores=None):
+        """Retorna receitas, despesas, saldo e número de lançamentos do período, a partir do resumo diário"""
+        condicao, parametros = self._filtro_financeiro(data_inicio, data_fim, tipos, categorias, operadores, "dia")
+        receitas, despesas, quantidade = yield uma(f"""
+            SELECT COALESCE(SUM(total) FILTER (WHERE tipo = 'Receita'), 0)::float8,
+                   COALESCE(SUM(total) FILTER (WHERE tipo = 'Despesa'), 0)::float8,
+                   COALESCE(SUM(quantidade), 0)
+            FROM financeiro_diario
+            WHERE {condicao}
+        """, parametros)
+        return {"receitas": receitas, "despesas": despesas, "saldo": receitas - despesas, "quantidade": quantidade}
+
+    @leitura
+    def facetas_financeiro(self, data_inicio, data_fim):
+        """Retorna os tipos, categorias e operadores distintos do período, para os filtros da página"""
+        condicao, parametros = self._filtro_financeiro(data_inicio, data_fim, coluna_data="dia")
+        tipos, categorias, operadores = yield uma(f"""
+            SELECT COALESCE(array_agg(DISTINCT tipo ORDER BY tipo), '{{}}'),
+                   COALESCE(array_agg(DISTINCT categoria ORDER BY categoria), '{{}}'),
+                   COALESCE(array_agg(DISTINCT operador ORDER BY operador), '{{}}')
+            FROM financeiro_diario
+            WHERE {condicao}
+        """, parametros)
+        return {"tipos": tipos, "categorias": categorias, "operadores": operadores}
+
+    @leitura
+    def financeiro_por_dia(self, data_inicio, data_fim, tipos=None, categorias=None, operadores=None):
+        """Retorna (dia, receitas, despesas) por dia do período, já pivotado no banco"""
+        condicao, parametros = self._filtro_financeiro(data_inicio, data_fim, tipos, categorias, operadores, "dia")
+        return (yield todas(f"""
+            SELECT dia,
+                   COALESCE(SUM(total) FILTER (WHERE tipo = 'Receita'), 0)::float8,
+                   COALESCE(SUM(total) FILTER (WHERE tipo = 'Despesa'), 0)::float8
+            FROM financeiro_diario
+            WHERE {condicao}
+            GROUP BY dia
+            ORDER BY dia
+        """, parametros))
+
+    @leitura
+    def listar_lancamentos_pagina(self, data_inicio, data_fim, tipos=None, categorias=None, operadores=None,
+                                  limite=50, apos=None):
+        """Retorna uma página de lançamentos, do mais recente ao mais antigo, com os filtros aplicados.
+
+        A paginação é por chave (data_lancamento, id): `apos` é o cursor devolvido
+        pela página anterior. Retorna (lancamentos, proximo), onde proximo é None
+        na última página.
+        """
+        condicao, parametros = self._filtro_financeiro(data_inicio, data_fim, tipos, categorias, operadores)
+        parametros.update({
+            "apos_data": apos[0] if apos else None,
+            "apos_id": apos[1] if apos else None,
+            "limite": limite + 1
+        })
+        resultados = yield todas(f"""
+            SELECT id, tipo, categoria, descricao, valor, data_lancamento, operador
+            FROM financeiro
+            WHERE {condicao}
+              AND (%(apos_data)s::timestamp IS NULL
+                   OR (data_lancamento, id) < (%(apos_data)s::timestamp, %(apos_id)s::integer))
+            ORDER BY data_lancamento DESC, id DESC
+            LIMIT %(limite)s
+        """, parametros)
+
+        proximo = None
+        if len(resultados) > limite:
+            resultados = resultados[:limite]
+            proximo = (resultados[-1][5], resultados[-1][0])
+        lancamentos = [
+            {
+                "id": r[0], "tipo": r[1], "categoria": r[2], "descricao": r[3],
+                "valor": r[4], "data": r[5].strftime("%d/%m/%Y"), "operador": r[6]
+            } for r in resultados
+        ]
+        return lancamentos, proximo
+
+    @staticmethod
+    def _alocar_lotes(cursor, por_codigo, presas=()):
+        """Distribui a quantidade pedida de cada código de barras pelos lotes em estoque.
+
+        Primeiro vence primeiro sai: validade mais próxima antes (lotes sem
+        validade por último), na mesma validade os freezers do Estoque Aberto,
+        e então o id. O que as linhas `presas` a um lote já pedem dele não
+        entra na conta. A busca usa o índice parcial (codigo_barras, validade)
+        dos lotes com estoque, então não passa pelos lotes esgotados que o
+        código acumula. Retorna (linhas, faltas): as linhas do carrinho, uma
+        por lote, e para cada código sem estoque suficiente o total disponível.
+        """
+        reservado = {}
+        for item in presas:
+            reservado[item["id"]] = reservado.get(item["id"], 0) + item["quantidade"]
+        codigos = sorted(por_codigo)
+        cursor.execute("""
+            SELECT codigo_barras, id, nome, sabor, valor_venda,
+                   LEAST(disponivel, pedido - (acumulado - disponivel)) AS baixa
+            FROM (
+                SELECT i.codigo_barras, i.id, i.nome, i.sabor, i.valor_venda, p.quantidade AS pedido,
+                       d.disponivel, SUM(d.disponivel) OVER w AS acumulado
+                FROM unnest(%(codigos)s::text[], %(quantidades)s::integer[]) AS p(codigo_barras, quantidade)
+                JOIN itens i ON i.codigo_barras = p.codigo_barras AND i.quantidade > 0
+                LEFT JOIN eletronicos e ON e.id = i.freezer_id
+                LEFT JOIN unnest(%(ids)s::integer[], %(reservados)s::integer[]) AS r(id, quantidade) ON r.id = i.id
+                CROSS JOIN LATERAL (SELECT GREATEST(i.quantidade - COALESCE(r.quantidade, 0), 0) AS disponivel) d
+                WINDOW w AS (
+                    PARTITION BY i.codigo_barras
+                    ORDER BY i.validade NULLS LAST, e.ambiente IS DISTINCT FROM 'Estoque Aberto', i.id
+                )
+            ) a
+            WHERE disponivel > 0 AND acumulado - disponivel < pedido
+            ORDER BY codigo_barras, acumulado
+        """, {
+            "codigos": codigos, "quantidades": [por_codigo[codigo] for codigo in codigos],
+            "ids": list(reservado), "reservados": list(reservado.values()),
+        })
+        linhas, alocado = [], {}
+        for codigo, item_id, nome, sabor, valor_venda, baixa in cursor.fetchall():
+            linhas.append({
+                "id": item_id, "codigo_barras": codigo, "nome": nome, "sabor": sabor,
+                "valor_venda": valor_venda, "quantidade": baixa
+            })
+            alocado[codigo] = alocado.get(codigo, 0) + baixa
+        faltas = {codigo: alocado.get(codigo, 0) for codigo in codigos if alocado.get(codigo, 0) < por_codigo[codigo]}
+        return linhas, faltas
+
+    def finalizar_venda_com_carrinho(self, carrinho, forma_pagamento="Dinheiro", operador="Sistema", reserva_cupom=None,
+                                     chave=None):
+        """Finaliza a venda do carrinho inteiro em uma única transação.
+
+        Cada linha do carrinho traz id, nome, sabor, valor_venda e quantidade.
+        Linhas que trazem também `codigo_barras` são alocadas aqui, dentro da
+        transação, aos lotes do código pela validade (`_alocar_lotes`): o id
+        delas é só o lote previsto na validação, e uma venda simultânea que
+        esgote esse lote não derruba esta. Linhas sem código ficam no lote
+        informado.
+        Os lotes do carrinho são travados em ordem de id, para que dois
+        terminais com carrinhos sobrepostos não se travem mutuamente, e todas
+        as linhas são baixadas por um único UPDATE protegido por
+        `quantidade >= n`. A receita é lançada antes da baixa: assim as travas
+        mais disputadas (lotes e contador de ocupação do freezer) ficam retidas
+        só até o commit. A reserva de cupom, se houver, é confirmada na mesma
+        transação, e o desconto sai do percentual do cupom sobre o subtotal
+        dos lotes efetivamente baixados, nunca de quem chama. A venda e as
+        linhas dela vão para `vendas` e `venda_itens` junto com a receita. Se
+        alguma linha não tiver estoque nada é gravado.
+        Com `chave` (gerada no PDV), a venda é registrada em
+        `vendas_idempotencia` na mesma transação; uma chave já registrada não
+        grava nada e conta como sucesso.
+        Um deadlock ou conflito de serialização com outra transação refaz a
+        venda do início, até `TENTATIVAS_CONFLITO` vezes.
+        Retorna (sucesso, mensagem, falhas, venda). `venda` é o que a transação
+        gravou, para o recibo: id do lançamento no financeiro, data, itens
+        (uma linha por lote baixado), subtotal, desconto e total; é None se a
+        venda não foi gravada agora (inclusive com a chave já registrada).
+        `falhas` lista as linhas não atendidas, ou é None só quando a conexão
+        com o banco falhou (veja `falha_de_conexao`). Tempo limite da consulta
+        e pool sem conexão livre voltam como falha comum, com falhas vazia: o
+        banco está no ar e a venda não deve ir para o diário offline.
+        """
+        if not carrinho:
+            return False, "❌ O carrinho está vazio.", [], None
+
+        for tentativa in range(1, TENTATIVAS_CONFLITO + 1):
+            try:
+                return self._gravar_venda_carrinho(carrinho, forma_pagamento, operador, reserva_cupom, chave)
+            except (DeadlockDetected, SerializationFailure) as e:
+                if tentativa == TENTATIVAS_CONFLITO:
+                    return False, f"❌ A venda conflitou com outras vendas simultâneas; tente novamente: {str(e)}", [], None
+            except QueryCanceled as e:
+                return False, f"❌ O banco demorou demais para finalizar a venda; tente novamente: {str(e)}", [], None
+            except PoolError as e:
+                return False, f"❌ Banco de dados ocupado; tente novamente: {str(e)}", [], None
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                if falha_de_conexao(e):
+                    return False, f"❌ Banco de dados indisponível: {str(e)}", None, None
+                return False, f"❌ Erro ao finalizar venda: {str(e)}", [], None
+            except Exception as e:
+                return False, f"❌ Erro ao finalizar venda: {str(e)}", [], None
+
+    def _gravar_venda_carrinho(self, carrinho, forma_pagamento, operador, reserva_cupom, chave):
+        """Uma tentativa da transação de `finalizar_venda_com_carrinho`; os erros do banco sobem para ela"""
+        presas = [item for item in carrinho if not item.get("codigo_barras")]
+        por_codigo = {}
+        for item in carrinho:
+            if item.get("codigo_barras"):
+                por_codigo[item["codigo_barras"]] = por_codigo.get(item["codigo_barras"], 0) + item["quantidade"]
+
+        with self._cursor() as cursor:
+            if chave is not None:
+                cursor.execute("""
+                    INSERT INTO vendas_idempotencia (chave, origem) VALUES (%s, 'online')
+                    ON CONFLICT (chave) DO NOTHING
+                """, (chave,))
+                if cursor.rowcount == 0:
+                    return True, "✅ Venda já registrada.", [], None
+
+            # Uma só passada de travas, em ordem de id, cobre os lotes presos e os lotes com estoque dos códigos
+            cursor.execute("""
+                SELECT id FROM itens
+                WHERE id = ANY(%(ids)s) OR (codigo_barras = ANY(%(codigos)s) AND quantidade > 0)
+                ORDER BY id
+                FOR UPDATE
+            """, {"ids": sorted({item["id"] for item in presas}), "codigos": sorted(por_codigo)})
+            existentes = {linha[0] for linha in cursor.fetchall()}
+
+            linhas = presas
+            if por_codigo:
+                alocadas, faltas = self._alocar_lotes(cursor, por_codigo, presas)
+                if faltas:
+                    cursor.connection.rollback()
+                    falhas = [
+                        {
+                            "id": None,
+                            "codigo_barras": item["codigo_barras"],
+                            "nome": item["nome"],
+                            "sabor": item["sabor"],
+                            "solicitado": por_codigo[item["codigo_barras"]],
+                            "disponivel": faltas[item["codigo_barras"]]
+                        }
+                        for item in {i["codigo_barras"]: i for i in carrinho
+                                     if i.get("codigo_barras") in faltas}.values()
+                    ]
+                    return False, "❌ Estoque insuficiente para um ou mais itens do carrinho.", falhas, None
+                linhas = presas + alocadas
+
+            pedidos = {}
+            for item in linhas:
+                pedidos[item["id"]] = pedidos.get(item["id"], 0) + item["quantidade"]
+            subtotal = sum(item["valor_venda"] * item["quantidade"] for item in linhas)
+
+            desconto = 0.0
+            if reserva_cupom is not None:
+                cursor.execute("""
+                    UPDATE cupons_reservas r SET confirmada_em = CURRENT_TIMESTAMP
+                    FROM cupons_desconto c
+                    WHERE r.id = %s AND r.confirmada_em IS NULL AND c.id = r.cupom_id
+                    RETURNING c.percentual_desconto
+                """, (reserva_cupom,))
+                cupom = cursor.fetchone()
+                if cupom is None:
+                    cursor.connection.rollback()
+                    return False, "❌ A reserva do cupom expirou. Aplique o cupom novamente.", [], None
+                desconto = round(cupom[0] / 100 * subtotal, 2)
+            total = max(subtotal - desconto, 0.0)
+            agora = datetime.now()
+
+            cursor.execute("""
+                INSERT INTO financeiro (tipo, categoria, descricao, valor, data_lancamento, operador)
+                VALUES ('Receita', %s, %s, %s, %s, %s)
+                RETURNING id
+            """, (f"Venda - {forma_pagamento}", _descricao_venda(operador, linhas), total, agora.date(), operador))
+            financeiro_id = cursor.fetchone()[0]
+            _gravar_vendas(cursor, [{
+                "financeiro_id": financeiro_id, "data": agora, "operador": operador,
+                "forma_pagamento": forma_pagamento, "subtotal": subtotal, "desconto": desconto, "total": total,
+                "origem": "pdv",
+                # Lote excluído não pode ir para venda_itens; a baixa abaixo o recusa e desfaz tudo
+                "carrinho": [dict(item, id=item["id"] if item["id"] in existentes else None) for item in linhas],
+            }])
+
+            baixados = execute_values(cursor, """
+                UPDATE itens i SET quantidade = i.quantidade - p.quantidade
+                FROM (VALUES %s) AS p(id, quantidade)
+                WHERE i.id = p.id AND i.quantidade >= p.quantidade
+                RETURNING i.id
+            """, sorted(pedidos.items()), template="(%s::integer, %s::integer)", page_size=len(pedidos), fetch=True)
+
+            nao_atendidos = set(pedidos) - {linha[0] for linha in baixados}
+            if nao_atendidos:
+                cursor.connection.rollback()
+                cursor.execute("SELECT id, quantidade FROM itens WHERE id = ANY(%s)", (list(nao_atendidos),))
+                disponiveis = dict(cursor.fetchall())
+                falhas = [
+                    {
+                        "id": item["id"],
+                        "nome": item["nome"],
+                        "sabor": item["sabor"],
+                        "solicitado": pedidos[item["id"]],
+                        "disponivel": disponiveis.get(item["id"], 0)
+                    }
+                    for item in {i["id"]: i for i in linhas if i["id"] in nao_atendidos}.values()
+                ]
+                return False, "❌ Estoque insuficiente para um ou mais itens do carrinho.", falhas, None
+
+        # O que foi gravado, para o recibo: os lotes baixados e os valores lançados no financeiro
+        venda = {
+            "id": financeiro_id, "data": agora, "itens": linhas,
+            "subtotal": round(subtotal, 2), "desconto": desconto, "total": round(total, 2),
+        }
+        return True, f"✅ Venda concluída. Total: R$ {total:.2f}", [], venda
+
+    def aplicar_vendas_do_diario(self, vendas):
+        """Grava em uma única transação um lote de vendas feitas sem o banco (diário offline).
+
+        Cada venda traz chave, data, carrinho, operador, forma_pagamento,
+        desconto, reserva_cupom e o código do cupom (`cupom`). As chaves já
+        registradas são ignoradas, então refazer um lote não conta nenhuma
+        venda duas vezes. Como os picolés já saíram do freezer, a baixa não é
+        recusada por falta de estoque: o lote vai no máximo a zero e a
+        diferença volta em `divergencias`. Uma reserva de cupom que venceu
+        antes do envio já devolveu o uso ao cupom; o uso é descontado de novo
+        e, se o cupom não tiver mais usos (ou não for encontrado), a venda
+        também volta em `divergencias`. As vendas também vão para `vendas` e
+        `venda_itens`, com origem 'diario'.
+        Retorna (aplicadas, repetidas, divergencias).
+        """
+        if not vendas:
+            return 0, 0, []
+
+        with self._cursor() as cursor:
+            novas = execute_values(cursor, """
+                INSERT INTO vendas_idempotencia (chave, origem) VALUES %s
+                ON CONFLICT (chave) DO NOTHING
+                RETURNING chave
+            """, [(venda["chave"],) for venda in vendas], template="(%s, 'diario')", page_size=len(vendas), fetch=True)
+            novas = {linha[0] for linha in novas}
+            aplicar = [venda for venda in vendas if venda["chave"] in novas]
+            if not aplicar:
+                return 0, len(vendas), []
+
+            # Mesma ordem de travas da venda online: lotes, reservas, financeiro e vendas, e só então a baixa
+            pedidos = {}
+            for venda in aplicar:
+                for item in venda["carrinho"]:
+                    pedidos[item["id"]] = pedidos.get(item["id"], 0) + item["quantidade"]
+            cursor.execute("SELECT id, quantidade FROM itens WHERE id = ANY(%s) ORDER BY id FOR UPDATE", (sorted(pedidos),))
+            estoque = dict(cursor.fetchall())
+            divergencias = [
+                {"id": item_id, "vendido": quantidade, "em_estoque": estoque.get(item_id)}
+                for item_id, quantidade in sorted(pedidos.items())
+                if estoque.get(item_id, 0) < quantidade
+            ]
+
+            reservas = [venda["reserva_cupom"] for venda in aplicar if venda.get("reserva_cupom") is not None]
+            if reservas:
+                cursor.execute("""
+                    UPDATE cupons_reservas SET confirmada_em = CURRENT_TIMESTAMP
+                    WHERE id = ANY(%s) AND confirmada_em IS NULL
+                    RETURNING id
+                """, (reservas,))
+                confirmadas = {linha[0] for linha in cursor.fetchall()}
+                sem_reserva = [
+                    venda for venda in aplicar
+                    if venda.get("reserva_cupom") is not None and venda["reserva_cupom"] not in confirmadas
+                ]
+                if sem_reserva:
+                    divergencias.extend(self._consumir_cupons_sem_reserva(cursor, sem_reserva))
+
+            # Ids do financeiro reservados antes do INSERT, para ligar cada venda à sua receita
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence('financeiro', 'id')) FROM generate_series(1, %s)", (len(aplicar),)
+            )
+            registros = []
+            for venda, (financeiro_id,) in zip(aplicar, cursor.fetchall()):
+                subtotal = sum(item["valor_venda"] * item["quantidade"] for item in venda["carrinho"])
+                registros.append({
+                    "financeiro_id": financeiro_id, "data": venda["data"], "operador": venda["operador"],
+                    "forma_pagamento": venda["forma_pagamento"], "subtotal": subtotal,
+                    "desconto": venda["desconto"] or 0.0, "total": max(subtotal - (venda["desconto"] or 0.0), 0.0),
+                    "origem": "diario",
+                    "carrinho": [dict(item, id=item["id"] if item["id"] in estoque else None) for item in venda["carrinho"]],
+                })
+
+            execute_values(cursor, """
+                INSERT INTO financeiro (id, tipo, categoria, descricao, valor, data_lancamento, operador)
+                VALUES %s
+            """, [
+                (
+                    registro["financeiro_id"], f"Venda - {registro['forma_pagamento']}",
+                    _descricao_venda(registro["operador"], registro["carrinho"]),
+                    registro["total"], registro["data"].date(), registro["operador"]
+                )
+                for registro in registros
+            ], template="(%s, 'Receita', %s, %s, %s, %s, %s)", page_size=len(registros))
+            _gravar_vendas(cursor, registros)
+
+            execute_values(cursor, """
+                UPDATE itens i SET quantidade = GREATEST(i.quantidade - p.quantidade, 0)
+                FROM (VALUES %s) AS p(id, quantidade)
+                WHERE i.id = p.id
+            """, sorted(pedidos.items()), template="(%s::integer, %s::integer)", page_size=len(pedidos))
+
+        return len(aplicar), len(vendas) - len(aplicar), divergencias
+
+    @staticmethod
+    def _consumir_cupons_sem_reserva(cursor, vendas):
+        """Desconta de novo o uso do cupom das vendas do diário cuja reserva já foi devolvida.
+
+        O cupom nunca fica com usos negativos: o que passar do limite volta
+        como divergência, para a conferência do caixa.
+        """
+        usos = {}
+        for venda in vendas:
+            if venda.get("cupom"):
+                usos[venda["cupom"]] = usos.get(venda["cupom"], 0) + 1
+        restantes = {}
+        if usos:
+            cursor.execute(
+                "SELECT codigo, usos_restantes FROM cupons_desconto WHERE codigo = ANY(%s) ORDER BY id FOR UPDATE",
+                (sorted(usos),)
+            )
+            restantes = dict(cursor.fetchall())
+            execute_values(cursor, """
+                UPDATE cupons_desconto c SET usos_restantes = GREATEST(c.usos_restantes - p.usos, 0)
+                FROM (VALUES %s) AS p(codigo, usos)
+                WHERE c.codigo = p.codigo
+            """, sorted(usos.items()), template="(%s, %s::integer)", page_size=len(usos))
+
+        divergencias = []
+        for venda in vendas:
+            codigo = venda.get("cupom")
+            if codigo in restantes and restantes[codigo] > 0:
+                restantes[codigo] -= 1
+                continue
+            divergencias.append({
+                "chave": venda["chave"], "reserva_cupom": venda["reserva_cupom"], "cupom": codigo,
+                "motivo": "cupom sem usos restantes" if codigo in restantes else "cupom não encontrado",
+            })
+        return divergencias
 
-        except Exception as e:
-            self.conexao.rollback()
-            return False, f"❌ Erro ao finalizar venda: {str(e)}"
-    
     def baixar_estoque(self, item_id):
         try:
-            self.cursor.execute("""
-                SELECT quantidade FROM itens WHERE id = %s
-            """, (item_id,))
-            qtd_atual = self.cursor.fetchone()
-
-            if not qtd_atual or qtd_atual[0] <= 0:
-                raise Exception("Produto sem estoque disponível.")
-
-            self.cursor.execute("""
-                UPDATE itens SET quantidade = quantidade - 1
-                WHERE id = %s
-            """, (item_id,))
-            self.conexao.commit()
+            with self._cursor() as cursor:
+                # Confere e baixa no mesmo comando: dois terminais não vendem a mesma última unidade
+                cursor.execute("""
+                    UPDATE itens SET quantidade = quantidade - 1
+                    WHERE id = %s AND quantidade >= 1
+                    RETURNING quantidade
+                """, (item_id,))
+                if cursor.fetchone() is None:
+                    raise Exception("Produto sem estoque disponível.")
             return True, "✅ Estoque atualizado."
         except Exception as e:
-            self.conexao.rollback()
             return False, f"❌ Erro ao baixar estoque: {str(e)}"
-    
+
     def excluir_lancamento_financeiro(self, id_lancamento):
-        self.cursor.execute("DELETE FROM financeiro WHERE id = %s", (id_lancamento,))
-        self.conexao.commit()
+        with self._cursor() as cursor:
+            cursor.execute("DELETE FROM financeiro WHERE id = %s", (id_lancamento,))
         return True
 
-    def aplicar_cupom(self, codigo, total):
-        self.cursor.execute("""
-            SELECT id, percentual_desconto, limite_uso, usos_restantes, validade
-            FROM cupons_desconto
-            WHERE codigo = %s
-        """, (codigo,))
-        cupom = self.cursor.fetchone()
-        
-        if not cupom:
-            return False, "❌ Cupom não encontrado.", 0.0
+    @leitura
+    def listar_metadados_cupons(self):
+        """Retorna os dados fixos dos cupons por código: id, percentual e validade"""
+        cupons = yield todas("SELECT codigo, id, percentual_desconto, validade FROM cupons_desconto")
+        return {
+            r[0]: {"id": r[1], "percentual_desconto": r[2], "validade": r[3]}
+            for r in cupons
+        }
 
-        id_cupom, percentual, uso_unico, usos_restantes, validade = cupom
+    @leitura
+    def buscar_reserva_cupom(self, reserva_id):
+        """Retorna a reserva ainda pendente e não vencida, com o código e o percentual do cupom, ou None"""
+        r = yield uma("""
+            SELECT r.id, c.codigo, c.percentual_desconto, r.expira_em
+            FROM cupons_reservas r
+            JOIN cupons_desconto c ON c.id = r.cupom_id
+            WHERE r.id = %s AND r.confirmada_em IS NULL AND r.expira_em >= CURRENT_TIMESTAMP
+        """, (reserva_id,))
+        if r is None:
+            return None
+        return {"id": r[0], "codigo": r[1], "percentual_desconto": r[2], "expira_em": r[3]}
+
+    def _devolver_reservas_expiradas(self, cursor, cupom_id=None):
+        """Apaga as reservas vencidas e não confirmadas, devolvendo os usos aos cupons"""
+        cursor.execute("""
+            WITH expiradas AS (
+                DELETE FROM cupons_reservas
+                WHERE confirmada_em IS NULL AND expira_em < CURRENT_TIMESTAMP
+                  AND (%(cupom)s::integer IS NULL OR cupom_id = %(cupom)s::integer)
+                RETURNING cupom_id
+            )
+            UPDATE cupons_desconto c
+            SET usos_restantes = c.usos_restantes + e.quantidade
+            FROM (SELECT cupom_id, COUNT(*) AS quantidade FROM expiradas GROUP BY cupom_id) e
+            WHERE c.id = e.cupom_id
+        """, {"cupom": cupom_id})
+        return cursor.rowcount
+
+    def reservar_cupom(self, cupom_id, minutos=15):
+        """Reserva um uso do cupom por `minutos`.
+
+        O uso só é reservado se o cupom estiver dentro da validade e com usos
+        restantes, conferidos no mesmo UPDATE que desconta o uso; cupons
+        disputados por vários terminais nunca passam do limite. Retorna
+        (sucesso, mensagem, reserva) com reserva = {"id", "percentual_desconto",
+        "expira_em"}.
+        """
+        try:
+            with self._cursor() as cursor:
+                self._devolver_reservas_expiradas(cursor, cupom_id)
+                cursor.execute("""
+                    WITH cupom AS (
+                        UPDATE cupons_desconto
+                        SET usos_restantes = usos_restantes - 1
+                        WHERE id = %(cupom)s AND usos_restantes > 0 AND validade >= CURRENT_DATE
+                        RETURNING id, percentual_desconto
+                    )
+                    INSERT INTO cupons_reservas (cupom_id, expira_em)
+                    SELECT id, CURRENT_TIMESTAMP + %(minutos)s * INTERVAL '1 minute' FROM cupom
+                    RETURNING id, (SELECT percentual_desconto FROM cupom), expira_em
+                """, {"cupom": cupom_id, "minutos": minutos})
+                reserva = cursor.fetchone()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError, PoolError) as e:
+            return False, f"❌ Banco de dados indisponível: {str(e)}", None
+        except Exception as e:
+            return False, f"❌ Erro ao reservar o cupom: {str(e)}", None
 
-        if validade and validade < datetime.now().date():
-            return False, "❌ Cupom expirado.", 0.0
-        if usos_restantes <= 0:
-            return False, "❌ Cupom sem usos restantes.", 0.0
+        if reserva is None:
+            return False, "❌ Cupom expirado ou sem usos restantes.", None
+        return True, "✅ Cupom reservado para esta venda.", {
+            "id": reserva[0], "percentual_desconto": reserva[1], "expira_em": reserva[2]
+        }
 
-        # Atualiza os usos restantes
-        if uso_unico:
-            self.cursor.execute("UPDATE cupons_desconto SET usos_restantes = 0 WHERE id = %s", (id_cupom,))
-        else:
-            self.cursor.execute("UPDATE cupons_desconto SET usos_restantes = usos_restantes - 1 WHERE id = %s", (id_cupom,))
-        self.conexao.commit()
+    def liberar_reserva_cupom(self, reserva_id):
+        """Cancela uma reserva ainda não confirmada e devolve o uso ao cupom; retorna (sucesso, mensagem)"""
+        try:
+            with self._cursor() as cursor:
+                cursor.execute("""
+                    WITH liberada AS (
+                        DELETE FROM cupons_reservas
+                        WHERE id = %s AND confirmada_em IS NULL
+                        RETURNING cupom_id
+                    )
+                    UPDATE cupons_desconto c
+                    SET usos_restantes = c.usos_restantes + 1
+                    FROM liberada l
+                    WHERE c.id = l.cupom_id
+                """, (reserva_id,))
+                if cursor.rowcount != 1:
+                    return False, "❌ Reserva não encontrada ou já usada em uma venda."
+            return True, "✅ Uso do cupom devolvido."
+        except (psycopg2.OperationalError, psycopg2.InterfaceError, PoolError) as e:
+            return False, f"❌ Banco de dados indisponível: {str(e)}"
+        except Exception as e:
+            return False, f"❌ Erro ao liberar a reserva do cupom: {str(e)}"
 
-        # Calcula o valor de desconto
-        percentual_desconto = percentual or 0
-        desconto_aplicado = round((percentual_desconto / 100) * total, 2)
+    def liberar_reservas_expiradas(self):
+        """Devolve os usos de todas as reservas vencidas; retorna quantos cupons foram atualizados"""
+        with self._cursor() as cursor:
+            return self._devolver_reservas_expiradas(cursor)
 
-        return True, f"✅ Cupom aplicado com sucesso!", desconto_aplicado
-    
     def cadastrar_cupom(self, codigo, percentual_desconto, validade, limite_uso):
         try:
-            self.cursor.execute("""
-                INSERT INTO cupons_desconto (codigo, percentual_desconto, validade, limite_uso, usos_restantes)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (codigo, percentual_desconto, validade, limite_uso, limite_uso))
-            self.conexao.commit()
+            with self._cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO cupons_desconto (codigo, percentual_desconto, validade, limite_uso, usos_restantes)
+                    VALUES (%s, %s, %s, %s, %s)
+                """, (codigo, percentual_desconto, validade, limite_uso, limite_uso))
             return True, "✅ Cupom cadastrado com sucesso!"
         except Exception as e:
-            self.conexao.rollback()
             return False, f"❌ Erro ao cadastrar cupom: {e}"
 
+    @leitura
     def listar_cupons(self):
-        self.cursor.execute("""
+        resultados = yield todas("""
             SELECT codigo, percentual_desconto, validade, limite_uso, usos_restantes
             FROM cupons_desconto
         """)
-        resultados = self.cursor.fetchall()
         return [
             {
                 "codigo": r[0],
@@ -737,10 +1851,6 @@ class BancoDados:
         ]
 
     def excluir_cupom(self, codigo):
-        self.cursor.execute("DELETE FROM cupons_desconto WHERE codigo = %s", (codigo,))
-        self.conexao.commit()
+        with self._cursor() as cursor:
+            cursor.execute("DELETE FROM cupons_desconto WHERE codigo = %s", (codigo,))
         return True
-
-
-        
-
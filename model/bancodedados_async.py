@@ -0,0 +1,198 @@
+"""Leituras assíncronas do banco, sobre um pool de conexões do psycopg 3.
+
+BancoDadosAsync espelha todos os métodos @leitura de BancoDados: cada método
+assíncrono roda o mesmo gerador de consultas do método síncrono, então o SQL
+e a montagem dos resultados são os mesmos nos dois caminhos. Serve para
+disparar ao mesmo tempo as leituras independentes de uma página, cada uma em
+uma conexão do pool. As migrações continuam a cargo do BancoDados síncrono.
+"""
+import asyncio
+import contextvars
+import sys
+import threading
+import time
+
+import psycopg
+from psycopg.conninfo import make_conninfo
+from psycopg.errors import QueryCanceled
+from psycopg_pool import AsyncConnectionPool, PoolTimeout
+
+from model.bancodedados import BancoDados
+from model.conexao import POSICAO_A_LER, obter_replica, parametros_conexao
+from model.instrumentacao import Medicao, obter_instrumentacao
+
+
+def _conninfo(parametros):
+    """Converte os parâmetros do psycopg2 (campos separados ou `dsn`) em conninfo do psycopg 3"""
+    parametros = dict(parametros)
+    return make_conninfo(parametros.pop("dsn", ""), **parametros)
+
+
+async def conduzir_leitura_async(consultas, cursor, medicao=None):
+    """Versão assíncrona de `conduzir_leitura`: mesmo protocolo, cursor do psycopg 3"""
+    linhas, erro = None, None
+    while True:
+        try:
+            sql, parametros, varias = consultas.throw(erro) if erro else consultas.send(linhas)
+        except StopIteration as fim:
+            return fim.value
+        try:
+            inicio = time.perf_counter()
+            await cursor.execute(sql, parametros)
+            linhas, erro = (await cursor.fetchall() if varias else await cursor.fetchone()), None
+            if medicao is not None:
+                medicao.registrar((time.perf_counter() - inicio) * 1000,
+                                  len(linhas) if varias else int(linhas is not None))
+        except Exception as e:
+            linhas, erro = None, e
+
+
+class BancoDadosAsync:
+    """Leituras de BancoDados como corrotinas, sobre um AsyncConnectionPool.
+
+    O pool é aberto com `await abrir()` (ou `async with`) dentro do laço de
+    eventos que vai usá-lo. As conexões ficam em autocommit e cada leitura
+    roda em um bloco `transaction()`, como uma transação do `_cursor` síncrono.
+    Com réplica configurada, as leituras seguem as mesmas regras do
+    BancoDados: réplica quando ela já tem as escritas da sessão, primário
+    caso contrário ou se ela falhar.
+    """
+
+    _filtro_financeiro = staticmethod(BancoDados._filtro_financeiro)
+
+    def __init__(self, minimo=1, maximo=10, **parametros):
+        self.parametros = parametros or parametros_conexao()
+        self.pool = AsyncConnectionPool(
+            _conninfo(self.parametros), min_size=minimo, max_size=maximo,
+            kwargs={"autocommit": True}, open=False
+        )
+        self.replica = obter_replica()
+        self.pool_replica = None
+        if self.replica is not None:
+            self.pool_replica = AsyncConnectionPool(
+                _conninfo(self.replica.parametros), min_size=minimo, max_size=maximo,
+                kwargs={"autocommit": True}, timeout=self.replica.tempo_espera, open=False
+            )
+
+    async def abrir(self, tempo_espera=5.0):
+        """Abre os pools; se o primário não der as conexões mínimas em `tempo_espera` segundos, fecha tudo e falha"""
+        try:
+            await self.pool.open(wait=True, timeout=tempo_espera)
+        except Exception:
+            await self.pool.close()
+            raise
+        if self.pool_replica is not None:
+            # Sem esperar: com a réplica fora do ar as leituras caem no primário
+            await self.pool_replica.open(wait=False)
+        return self
+
+    async def fechar(self):
+        await self.pool.close()
+        if self.pool_replica is not None:
+            await self.pool_replica.close()
+
+    async def _pool_leitura(self):
+        """Mesma escolha de `BancoDados._pool_leitura`, sobre os pools assíncronos"""
+        if self.pool_replica is None or not self.replica.disponivel():
+            return self.pool
+        lsn = self.replica.lsn_pendente()
+        if lsn is None:
+            return self.pool_replica
+        if lsn == POSICAO_A_LER:
+            momento = time.monotonic()
+            try:
+                async with self.pool.connection() as conexao:
+                    cursor = await conexao.execute(self.replica.SQL_POSICAO)
+                    lsn = (await cursor.fetchone())[0]
+            except (psycopg.Error, PoolTimeout):
+                return self.pool
+            self.replica.resolver_posicao(lsn, momento)
+        try:
+            async with self.pool_replica.connection() as conexao:
+                cursor = await conexao.execute(self.replica.SQL_ALCANCOU, (lsn,))
+                alcancou = (await cursor.fetchone())[0]
+        except (psycopg.Error, PoolTimeout) as e:
+            self.replica.marcar_indisponivel(e)
+            return self.pool
+        if not alcancou:
+            return self.pool
+        self.replica.confirmar(lsn)
+        return self.pool_replica
+
+    async def __aenter__(self):
+        return await self.abrir()
+
+    async def __aexit__(self, *erro):
+        await self.fechar()
+
+    async def _executar_em(self, pool, metodo, consultas):
+        """Roda o gerador de consultas de um método @leitura em uma conexão do pool"""
+        instrumentacao = obter_instrumentacao()
+        medicao = Medicao() if instrumentacao.ativa else None
+        confirmada = False
+        try:
+            async with pool.connection() as conexao:
+                async with conexao.transaction():
+                    async with conexao.cursor() as cursor:
+                        resultado = await conduzir_leitura_async(consultas, cursor, medicao)
+            confirmada = True
+            return resultado
+        finally:
+            if medicao is not None:
+                instrumentacao.registrar_transacao(metodo, medicao, confirmada)
+
+    async def _executar(self, metodo, criar_consultas):
+        pool = await self._pool_leitura()
+        try:
+            return await self._executar_em(pool, metodo, criar_consultas())
+        except (psycopg.OperationalError, psycopg.InterfaceError, PoolTimeout) as e:
+            if pool is self.pool:
+                raise
+            if not isinstance(e, QueryCanceled):
+                self.replica.marcar_indisponivel(e)
+            return await self._executar_em(self.pool, metodo, criar_consultas())
+
+
+def _espelhar(nome, consultas):
+    async def metodo(self, *args, **kwargs):
+        return await self._executar(nome, lambda: consultas(self, *args, **kwargs))
+
+    metodo.__name__ = nome
+    metodo.__qualname__ = f"BancoDadosAsync.{nome}"
+    metodo.__doc__ = consultas.__doc__
+    return metodo
+
+
+for _nome, _metodo in vars(BancoDados).items():
+    if hasattr(_metodo, "consultas"):
+        setattr(BancoDadosAsync, _nome, _espelhar(_nome, _metodo.consultas))
+
+
+async def _no_contexto(corrotina, contexto):
+    # Leva para a tarefa as variáveis de contexto de quem chamou (ex.: a página instrumentada)
+    for variavel, valor in contexto.items():
+        variavel.set(valor)
+    return await corrotina
+
+
+class LacoAssincrono:
+    """Laço de eventos em uma thread própria, para chamar corrotinas a partir de código síncrono.
+
+    O Streamlit roda cada execução da página em uma thread sem laço de
+    eventos; o pool assíncrono precisa de um laço que viva o processo todo.
+    """
+
+    def __init__(self):
+        # O psycopg 3 assíncrono não funciona com o ProactorEventLoop, padrão no Windows
+        self.laco = asyncio.SelectorEventLoop() if sys.platform == "win32" else asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.laco.run_forever, name="laco-assincrono", daemon=True)
+        self._thread.start()
+
+    def executar(self, corrotina, tempo_espera=None):
+        """Roda a corrotina no laço e espera o resultado"""
+        futuro = asyncio.run_coroutine_threadsafe(_no_contexto(corrotina, contextvars.copy_context()), self.laco)
+        return futuro.result(tempo_espera)
+
+    def parar(self):
+        self.laco.call_soon_threadsafe(self.laco.stop)
+        self._thread.join()
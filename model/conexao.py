@@ -0,0 +1,361 @@
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions, pool
+
+
+def parametros_conexao():
+    """Lê os parâmetros de conexão do ambiente, mantendo os valores padrão do projeto.
+
+    SORVETERIA_DB_DSN, se definida, substitui as variáveis separadas.
+    """
+    if os.environ.get("SORVETERIA_DB_DSN"):
+        return {"dsn": os.environ["SORVETERIA_DB_DSN"]}
+    return {
+        "dbname": os.environ.get("SORVETERIA_DB_NOME", "sorveteria"),
+        "user": os.environ.get("SORVETERIA_DB_USUARIO", "postgres"),
+        "password": os.environ.get("SORVETERIA_DB_SENHA", "xxxxxx"),
+        "host": os.environ.get("SORVETERIA_DB_HOST", "localhost"),
+        "port": os.environ.get("SORVETERIA_DB_PORTA", "5432"),
+    }
+
+
+class PoolConexoes:
+    """Pool de conexões compartilhado pelo processo.
+
+    Cada checkout devolve uma conexão saudável: conexões fechadas ou em estado
+    desconhecido são descartadas e conexões ociosas há mais de `verificar_apos`
+    segundos passam por um `SELECT 1` antes de serem entregues. Quando todas as
+    conexões estão em uso, o checkout espera até `tempo_espera` segundos.
+    """
+
+    def __init__(self, minimo=1, maximo=10, verificar_apos=30.0, tempo_espera=10.0, **parametros):
+        self.minimo = minimo
+        self.maximo = maximo
+        self.verificar_apos = verificar_apos
+        self.tempo_espera = tempo_espera
+        self.parametros = parametros or parametros_conexao()
+        self._pool = pool.ThreadedConnectionPool(minimo, maximo, **self.parametros)
+        self._vagas = threading.BoundedSemaphore(maximo)
+        self._ultimo_uso = {}
+
+    def _saudavel(self, conexao):
+        """Verifica se a conexão ainda pode ser usada"""
+        if conexao.closed:
+            return False
+        if conexao.get_transaction_status() == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+
+        ultimo_uso = self._ultimo_uso.get(id(conexao), 0.0)
+        if time.monotonic() - ultimo_uso < self.verificar_apos:
+            return True
+
+        try:
+            with conexao.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conexao.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    def obter(self):
+        """Retira uma conexão saudável do pool, reconectando se necessário"""
+        if not self._vagas.acquire(timeout=self.tempo_espera):
+            raise pool.PoolError(f"Nenhuma conexão livre após {self.tempo_espera}s de espera.")
+
+        try:
+            # Uma conexão derrubada é descartada e o pool abre outra no lugar
+            for _ in range(self.maximo + 1):
+                conexao = self._pool.getconn()
+                if self._saudavel(conexao):
+                    return conexao
+                self._descartar(conexao)
+            raise psycopg2.OperationalError("Não foi possível obter uma conexão saudável com o banco.")
+        except Exception:
+            self._vagas.release()
+            raise
+
+    def devolver(self, conexao, descartar=False):
+        """Devolve a conexão ao pool; conexões quebradas são fechadas"""
+        try:
+            if descartar or conexao.closed:
+                self._descartar(conexao)
+            else:
+                if conexao.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conexao.rollback()
+                self._ultimo_uso[id(conexao)] = time.monotonic()
+                self._pool.putconn(conexao)
+        finally:
+            self._vagas.release()
+
+    def _descartar(self, conexao):
+        self._ultimo_uso.pop(id(conexao), None)
+        try:
+            self._pool.putconn(conexao, close=True)
+        except pool.PoolError:
+            pass
+
+    @contextmanager
+    def conexao(self):
+        """Empresta uma conexão pelo tempo do bloco `with`"""
+        conexao = self.obter()
+        descartar = False
+        try:
+            yield conexao
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            descartar = True
+            raise
+        finally:
+            self.devolver(conexao, descartar=descartar)
+
+    def fechar(self):
+        self._pool.closeall()
+
+
+# Servidor encerrando ou ainda subindo: a conexão caiu ou não abre, como na classe 08
+CODIGOS_SERVIDOR_FORA = ("57P01", "57P02", "57P03")
+
+
+def falha_de_conexao(erro):
+    """Diz se o erro é de conexão com o banco (servidor fora do ar, conexão caída) e não da transação.
+
+    No psycopg2, deadlock (40P01), conflito de serialização (40001), trava
+    não obtida (55P03) e tempo limite da consulta (57014) também são
+    OperationalError, mas com o banco no ar: só contam como falha de conexão
+    os erros sem SQLSTATE (a conexão não abriu ou caiu no meio), os da classe
+    08 e o InterfaceError (conexão já fechada). A espera esgotada por uma
+    conexão livre do pool (PoolError) também não é falha de conexão.
+    """
+    if isinstance(erro, psycopg2.InterfaceError):
+        return True
+    if isinstance(erro, psycopg2.OperationalError):
+        return erro.pgcode is None or erro.pgcode.startswith("08") or erro.pgcode in CODIGOS_SERVIDOR_FORA
+    return False
+
+
+_pool = None
+_trava_pool = threading.Lock()
+
+
+def obter_pool():
+    """Retorna o pool do processo, criando-o na primeira chamada"""
+    global _pool
+    if _pool is None:
+        with _trava_pool:
+            if _pool is None:
+                _pool = PoolConexoes(
+                    minimo=int(os.environ.get("SORVETERIA_POOL_MIN", "1")),
+                    maximo=int(os.environ.get("SORVETERIA_POOL_MAX", "10")),
+                )
+    return _pool
+
+
+def configurar_pool(**opcoes):
+    """Substitui o pool do processo (usado por scripts e benchmarks)"""
+    global _pool
+    with _trava_pool:
+        if _pool is not None:
+            _pool.fechar()
+        _pool = PoolConexoes(**opcoes)
+    return _pool
+
+
+# Sessão do app que está usando o banco nesta thread/tarefa (ex.: a sessão do Streamlit)
+_sessao_atual = contextvars.ContextVar("sessao_banco", default=None)
+
+
+_ler_do_primario = contextvars.ContextVar("ler_do_primario", default=False)
+
+
+def definir_sessao(identificador):
+    """Associa as próximas transações desta thread a uma sessão, para a leitura das próprias escritas"""
+    _sessao_atual.set(identificador)
+
+
+@contextmanager
+def ler_do_primario():
+    """Manda ao primário as leituras do bloco, mesmo com réplica (ex.: quem reage a um NOTIFY do primário)"""
+    token = _ler_do_primario.set(True)
+    try:
+        yield
+    finally:
+        _ler_do_primario.reset(token)
+
+
+# Valor de `lsn_pendente` para a sessão que escreveu e cuja posição do WAL ainda não foi lida
+POSICAO_A_LER = "?"
+
+
+class ControleReplica:
+    """Réplica de leitura (streaming replication) e o que ela ainda não recebeu de cada sessão.
+
+    Após cada transação no primário, `registrar_escrita` marca a sessão, sem
+    consulta nenhuma no caminho da escrita. Na próxima leitura da sessão, a
+    posição atual do WAL do primário é lida uma vez (`resolver_posicao`):
+    ela já cobre o commit da escrita. Enquanto a réplica não tiver reproduzido
+    essa posição, as leituras da sessão vão ao primário. Se a réplica não
+    responde, ela é deixada de lado por `pausa_falha` segundos e tudo vai ao
+    primário.
+
+    A posição de uma sessão vale por `validade_escrita` segundos (bem acima
+    do atraso normal da réplica): sessões que escrevem e não leem mais, como
+    abas fechadas ou terminais desligados, não ficam guardadas para sempre.
+    No máximo `maximo_sessoes` sessões são guardadas; as mais antigas saem
+    primeiro.
+    """
+
+    SQL_ALCANCOU = "SELECT COALESCE(pg_last_wal_replay_lsn() >= %s::pg_lsn, true)"
+    SQL_POSICAO = "SELECT pg_current_wal_lsn()::text"
+
+    def __init__(self, parametros, minimo=1, maximo=10, pausa_falha=30.0, tempo_espera=5.0,
+                 validade_escrita=10.0, maximo_sessoes=10000):
+        self.parametros = parametros
+        self.minimo = minimo
+        self.maximo = maximo
+        self.pausa_falha = pausa_falha
+        self.tempo_espera = tempo_espera
+        self.validade_escrita = validade_escrita
+        self.maximo_sessoes = maximo_sessoes
+        self._pool = None
+        self._indisponivel_ate = 0.0
+        self._trava = threading.Lock()
+        # sessão -> (posição do WAL ou None se ainda não lida, momento da escrita), da mais antiga para a mais recente
+        self._pendentes = OrderedDict()
+
+    def disponivel(self):
+        """A réplica pode atender a leitura atual: está no ar e o bloco não pediu o primário"""
+        return not _ler_do_primario.get() and time.monotonic() >= self._indisponivel_ate
+
+    def marcar_indisponivel(self, erro=None):
+        self._indisponivel_ate = time.monotonic() + self.pausa_falha
+        print(f"Réplica indisponível, leituras no primário por {self.pausa_falha:.0f}s: {erro}")
+
+    def pool(self):
+        """Pool da réplica, criado na primeira chamada; None quando a leitura deve ir ao primário"""
+        if not self.disponivel():
+            return None
+        if self._pool is None:
+            with self._trava:
+                if self._pool is None:
+                    try:
+                        self._pool = PoolConexoes(self.minimo, self.maximo, tempo_espera=self.tempo_espera, **self.parametros)
+                    except psycopg2.Error as e:
+                        self.marcar_indisponivel(e)
+                        return None
+        return self._pool
+
+    def _descartar_vencidas(self):
+        """Remove as posições vencidas e as que passam do limite de sessões; chamada com a trava"""
+        limite = time.monotonic() - self.validade_escrita
+        while self._pendentes:
+            _, momento = next(iter(self._pendentes.values()))
+            if momento >= limite and len(self._pendentes) <= self.maximo_sessoes:
+                break
+            self._pendentes.popitem(last=False)
+
+    def lsn_pendente(self):
+        """Posição do WAL da última escrita da sessão atual que a réplica ainda pode não ter.
+
+        None se a sessão não tem escrita pendente; POSICAO_A_LER se a posição
+        ainda não foi lida do primário.
+        """
+        with self._trava:
+            entrada = self._pendentes.get(_sessao_atual.get())
+        if entrada is None or time.monotonic() - entrada[1] > self.validade_escrita:
+            return None
+        return entrada[0] or POSICAO_A_LER
+
+    def resolver_posicao(self, lsn, momento):
+        """Guarda `lsn`, lida do primário em `momento`, para as escritas sem posição feitas antes dele.
+
+        Toda escrita confirmada antes da leitura da posição tem o commit em
+        `lsn` ou antes, então a mesma consulta serve a todas as sessões.
+        """
+        with self._trava:
+            for sessao, (pendente, escrita) in list(self._pendentes.items()):
+                if pendente is None and escrita <= momento:
+                    self._pendentes[sessao] = (lsn, escrita)
+
+    def ha_escritas_pendentes(self):
+        """Alguma sessão do processo tem escrita que a réplica ainda pode não ter reproduzido"""
+        with self._trava:
+            self._descartar_vencidas()
+            return bool(self._pendentes)
+
+    def confirmar(self, lsn):
+        """A réplica já reproduziu `lsn`: a sessão, e as que escreveram antes dessa posição, voltam a ler dela"""
+        alcancada = _numero_lsn(lsn)
+        with self._trava:
+            for sessao in [s for s, (pendente, _) in self._pendentes.items()
+                           if pendente is not None and _numero_lsn(pendente) <= alcancada]:
+                del self._pendentes[sessao]
+            self._descartar_vencidas()
+
+    def registrar_escrita(self):
+        """Marca a sessão atual logo após o commit de uma transação no primário; a posição é lida depois"""
+        sessao = _sessao_atual.get()
+        with self._trava:
+            self._pendentes.pop(sessao, None)
+            self._pendentes[sessao] = (None, time.monotonic())
+            self._descartar_vencidas()
+
+    def fechar(self):
+        if self._pool is not None:
+            self._pool.fechar()
+
+
+def _numero_lsn(lsn):
+    """Converte a posição do WAL no formato do PostgreSQL ("16/B374D848") em número, para comparar"""
+    alto, baixo = lsn.split("/")
+    return (int(alto, 16) << 32) + int(baixo, 16)
+
+
+_replica = None
+_replica_verificada = False
+
+
+def parametros_replica():
+    """Parâmetros da réplica: SORVETERIA_REPLICA_DSN ou SORVETERIA_REPLICA_HOST/PORTA sobre os do primário"""
+    if os.environ.get("SORVETERIA_REPLICA_DSN"):
+        return {"dsn": os.environ["SORVETERIA_REPLICA_DSN"]}
+    parametros = parametros_conexao()
+    if os.environ.get("SORVETERIA_REPLICA_HOST") and "dsn" not in parametros:
+        parametros["host"] = os.environ["SORVETERIA_REPLICA_HOST"]
+        parametros["port"] = os.environ.get("SORVETERIA_REPLICA_PORTA", parametros["port"])
+        return parametros
+    return None
+
+
+def obter_replica():
+    """Retorna o controle da réplica do processo, ou None se nenhuma réplica estiver configurada"""
+    global _replica, _replica_verificada
+    if not _replica_verificada:
+        with _trava_pool:
+            if not _replica_verificada:
+                parametros = parametros_replica()
+                if parametros is not None:
+                    _replica = ControleReplica(
+                        parametros,
+                        minimo=int(os.environ.get("SORVETERIA_POOL_MIN", "1")),
+                        maximo=int(os.environ.get("SORVETERIA_POOL_MAX", "10")),
+                        pausa_falha=float(os.environ.get("SORVETERIA_REPLICA_PAUSA", "30")),
+                        validade_escrita=float(os.environ.get("SORVETERIA_REPLICA_VALIDADE_ESCRITA", "10")),
+                    )
+                _replica_verificada = True
+    return _replica
+
+
+def configurar_replica(parametros=None, **opcoes):
+    """Substitui a réplica do processo; None desliga o roteamento (usado por scripts e benchmarks)"""
+    global _replica, _replica_verificada
+    with _trava_pool:
+        if _replica is not None:
+            _replica.fechar()
+        _replica = ControleReplica(parametros, **opcoes) if parametros else None
+        _replica_verificada = True
+    return _replica
@@ -0,0 +1,274 @@
+"""Diário local das vendas do PDV, para continuar vendendo com o banco fora do ar.
+
+Quando o PostgreSQL não responde, a venda finalizada vai para um arquivo
+SQLite local (modo WAL, gravação sincronizada em disco a cada venda) junto
+com a chave de idempotência gerada no PDV. O SincronizadorDiario reenvia as
+vendas pendentes em lotes por `BancoDados.aplicar_vendas_do_diario`; como o
+banco ignora chaves já registradas, reenviar um lote que caiu no meio do
+commit não conta nenhuma venda duas vezes.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timedelta
+
+import psycopg2
+from psycopg2.pool import PoolError
+
+from model.conexao import falha_de_conexao
+
+PENDENTE = "pendente"
+SINCRONIZADA = "sincronizada"
+REJEITADA = "rejeitada"
+
+# Erros em que a venda não chegou ao banco e deve ser tentada de novo mais tarde; só os que
+# `falha_de_conexao` reconhece tiram o banco das vendas (deadlock e pool cheio não)
+ERROS_CONEXAO = (psycopg2.OperationalError, psycopg2.InterfaceError, PoolError)
+
+
+def _json_padrao(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    raise TypeError(f"{type(valor).__name__} não é serializável em JSON")
+
+
+class DiarioVendas:
+    """Fila durável de vendas em SQLite, compartilhável entre processos da mesma máquina"""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+        self._trava = threading.Lock()
+        self._conexao = sqlite3.connect(caminho, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conexao.execute("PRAGMA journal_mode=WAL")
+        # FULL: a venda só é dada como gravada depois do fsync do WAL
+        self._conexao.execute("PRAGMA synchronous=FULL")
+        self._conexao.execute("""
+            CREATE TABLE IF NOT EXISTS vendas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chave TEXT NOT NULL UNIQUE,
+                criada_em TEXT NOT NULL,
+                dados TEXT NOT NULL,
+                situacao TEXT NOT NULL DEFAULT 'pendente',
+                tentativas INTEGER NOT NULL DEFAULT 0,
+                ultimo_erro TEXT,
+                sincronizada_em TEXT
+            )
+        """)
+        self._conexao.execute("CREATE INDEX IF NOT EXISTS idx_vendas_situacao ON vendas (situacao, id)")
+
+    def _executar(self, sql, parametros=()):
+        with self._trava:
+            return self._conexao.execute(sql, parametros).fetchall()
+
+    def registrar(self, chave, venda):
+        """Grava a venda (data e hora, carrinho, operador, forma_pagamento, desconto, reserva_cupom, cupom) como pendente"""
+        self._executar(
+            "INSERT OR IGNORE INTO vendas (chave, criada_em, dados) VALUES (?, ?, ?)",
+            (chave, datetime.now().isoformat(timespec="seconds"), json.dumps(venda, default=_json_padrao))
+        )
+
+    def pendentes(self, limite=200):
+        """As vendas pendentes mais antigas, no formato de `aplicar_vendas_do_diario`"""
+        vendas = []
+        for chave, dados in self._executar(
+            "SELECT chave, dados FROM vendas WHERE situacao = ? ORDER BY id LIMIT ?", (PENDENTE, limite)
+        ):
+            venda = json.loads(dados)
+            venda["chave"] = chave
+            venda["data"] = datetime.fromisoformat(venda["data"])
+            vendas.append(venda)
+        return vendas
+
+    def marcar(self, chaves, situacao, erro=None):
+        """Muda a situação das vendas; falhas de envio (situação pendente) somam uma tentativa"""
+        agora = datetime.now().isoformat(timespec="seconds")
+        with self._trava:
+            self._conexao.execute("BEGIN IMMEDIATE")
+            try:
+                self._conexao.executemany("""
+                    UPDATE vendas
+                    SET situacao = ?, ultimo_erro = ?, tentativas = tentativas + (? = 'pendente'),
+                        sincronizada_em = CASE WHEN ? = 'sincronizada' THEN ? END
+                    WHERE chave = ?
+                """, [(situacao, erro, situacao, situacao, agora, chave) for chave in chaves])
+                self._conexao.execute("COMMIT")
+            except Exception:
+                self._conexao.execute("ROLLBACK")
+                raise
+
+    def reenviar(self, chave):
+        """Devolve uma venda rejeitada para a fila, depois de corrigido o problema"""
+        self._executar("UPDATE vendas SET situacao = ? WHERE chave = ? AND situacao = ?", (PENDENTE, chave, REJEITADA))
+
+    def limpar_sincronizadas(self, dias=7):
+        """Apaga do arquivo as vendas já sincronizadas há mais de `dias` dias"""
+        limite = (datetime.now() - timedelta(days=dias)).isoformat(timespec="seconds")
+        self._executar("DELETE FROM vendas WHERE situacao = ? AND sincronizada_em < ?", (SINCRONIZADA, limite))
+
+    def listar(self, situacoes=(PENDENTE, REJEITADA), limite=100):
+        """Vendas do diário nas situações informadas, das mais antigas às mais novas"""
+        marcadores = ", ".join("?" * len(situacoes))
+        linhas = self._executar(f"""
+            SELECT chave, criada_em, situacao, tentativas, ultimo_erro, dados
+            FROM vendas WHERE situacao IN ({marcadores}) ORDER BY id LIMIT ?
+        """, (*situacoes, limite))
+        vendas = []
+        for chave, criada_em, situacao, tentativas, ultimo_erro, dados in linhas:
+            venda = json.loads(dados)
+            vendas.append({
+                "chave": chave, "criada_em": criada_em, "situacao": situacao, "tentativas": tentativas,
+                "erro": ultimo_erro, "operador": venda["operador"],
+                "total": round(max(sum(i["valor_venda"] * i["quantidade"] for i in venda["carrinho"]) - (venda["desconto"] or 0.0), 0.0), 2),
+            })
+        return vendas
+
+    def resumo(self):
+        """Quantidade de vendas por situação e a venda pendente mais antiga"""
+        contagem = dict(self._executar("SELECT situacao, COUNT(*) FROM vendas GROUP BY situacao"))
+        mais_antiga = self._executar("SELECT MIN(criada_em) FROM vendas WHERE situacao = ?", (PENDENTE,))[0][0]
+        return {
+            "pendentes": contagem.get(PENDENTE, 0),
+            "rejeitadas": contagem.get(REJEITADA, 0),
+            "sincronizadas": contagem.get(SINCRONIZADA, 0),
+            "pendente_desde": datetime.fromisoformat(mais_antiga) if mais_antiga else None,
+        }
+
+    def fechar(self):
+        with self._trava:
+            self._conexao.close()
+
+
+class SincronizadorDiario:
+    """Thread que envia ao banco, em lotes, as vendas pendentes do diário.
+
+    Também decide quando o PDV deve gravar direto no diário: depois de uma
+    falha de conexão o banco fica `pausa_falha` segundos fora das vendas, para
+    que o caixa não espere o tempo limite do pool a cada venda; a próxima
+    sincronização bem-sucedida o devolve.
+    """
+
+    def __init__(self, diario, banco, lote=200, intervalo=5.0, pausa_falha=15.0, ao_aplicar=None):
+        self.diario = diario
+        self.banco = banco
+        self.ao_aplicar = ao_aplicar
+        self.lote = lote
+        self.intervalo = intervalo
+        self.pausa_falha = pausa_falha
+        self.ultimo_erro = None
+        self.ultima_sincronizacao = None
+        self.divergencias = deque(maxlen=100)
+        self._indisponivel_ate = 0.0
+        self._trava_envio = threading.Lock()
+        self._trava = threading.Lock()
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+
+    def disponivel(self):
+        """O banco pode receber vendas agora (nenhuma falha de conexão recente)"""
+        return time.monotonic() >= self._indisponivel_ate
+
+    def marcar_indisponivel(self, erro):
+        self._indisponivel_ate = time.monotonic() + self.pausa_falha
+        self.ultimo_erro = str(erro)
+        print(f"⚠️ Banco indisponível para vendas por {self.pausa_falha:.0f}s; usando o diário local: {erro}")
+
+    def _falha_envio(self, erro):
+        """O lote fica pendente; só uma falha de conexão tira o banco das vendas, o resto é tentado no próximo envio"""
+        if falha_de_conexao(erro):
+            self.marcar_indisponivel(erro)
+        else:
+            self.ultimo_erro = str(erro)
+            print(f"⚠️ Envio do diário adiado para a próxima tentativa: {erro}")
+
+    def iniciar(self):
+        """Inicia a thread de envio, se ainda não estiver rodando, e pede um envio imediato"""
+        with self._trava:
+            if self._thread is None or not self._thread.is_alive():
+                self._parar.clear()
+                self._thread = threading.Thread(target=self._laco, name="sincronizador-diario", daemon=True)
+                self._thread.start()
+        self._acordar.set()
+
+    def parar(self):
+        self._parar.set()
+        self._acordar.set()
+
+    def _laco(self):
+        while not self._parar.is_set():
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+            if self._parar.is_set():
+                return
+            if not self.disponivel():
+                continue
+            try:
+                self.sincronizar()
+                self.diario.limpar_sincronizadas()
+            except Exception as e:
+                print(f"❌ Erro ao sincronizar o diário de vendas: {e}")
+
+    def sincronizar(self):
+        """Envia todas as vendas pendentes, lote a lote; retorna os totais do envio"""
+        totais = {"aplicadas": 0, "repetidas": 0, "rejeitadas": 0, "divergencias": 0}
+        with self._trava_envio:
+            while True:
+                vendas = self.diario.pendentes(self.lote)
+                if not vendas:
+                    break
+                chaves = [venda["chave"] for venda in vendas]
+                try:
+                    aplicadas, repetidas, divergencias = self.banco.aplicar_vendas_do_diario(vendas)
+                except ERROS_CONEXAO as e:
+                    self.diario.marcar(chaves, PENDENTE, str(e))
+                    self._falha_envio(e)
+                    break
+                except Exception as e:
+                    # Alguma venda do lote tem dados que o banco recusa: envia uma a uma para separá-la
+                    print(f"⚠️ Lote do diário recusado, enviando venda a venda: {e}")
+                    if not self._enviar_uma_a_uma(vendas, totais):
+                        break
+                    continue
+
+                self.diario.marcar(chaves, SINCRONIZADA)
+                self._registrar(totais, aplicadas, repetidas, divergencias)
+
+            if totais["aplicadas"] or totais["repetidas"]:
+                self._indisponivel_ate = 0.0
+                self.ultimo_erro = None
+                self.ultima_sincronizacao = datetime.now()
+        if totais["aplicadas"] and self.ao_aplicar is not None:
+            self.ao_aplicar()
+        return totais
+
+    def _enviar_uma_a_uma(self, vendas, totais):
+        for venda in vendas:
+            try:
+                self._registrar(totais, *self.banco.aplicar_vendas_do_diario([venda]))
+            except ERROS_CONEXAO as e:
+                self.diario.marcar([venda["chave"]], PENDENTE, str(e))
+                self._falha_envio(e)
+                return False
+            except Exception as e:
+                self.diario.marcar([venda["chave"]], REJEITADA, str(e))
+                totais["rejeitadas"] += 1
+                continue
+            self.diario.marcar([venda["chave"]], SINCRONIZADA)
+        return True
+
+    def _registrar(self, totais, aplicadas, repetidas, divergencias):
+        totais["aplicadas"] += aplicadas
+        totais["repetidas"] += repetidas
+        totais["divergencias"] += len(divergencias)
+        for divergencia in divergencias:
+            if "reserva_cupom" in divergencia:
+                print(f"⚠️ Venda offline {divergencia['chave']} com cupom {divergencia['cupom']} "
+                      f"sem a reserva do uso: {divergencia['motivo']}")
+            else:
+                print(f"⚠️ Venda offline acima do estoque do lote {divergencia['id']}: "
+                      f"vendido {divergencia['vendido']}, em estoque {divergencia['em_estoque']}")
+            self.divergencias.append(dict(divergencia, momento=datetime.now()))
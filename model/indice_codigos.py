@@ -0,0 +1,145 @@
+import select
+import threading
+import time
+
+import psycopg2
+from psycopg2 import extensions
+
+from model.conexao import ler_do_primario
+
+CANAL_ITENS_ALTERADOS = "itens_alterados"
+
+
+def _ordem_lote(lote):
+    """Lotes com validade mais próxima primeiro, sem validade por último; na mesma validade, Estoque Aberto antes"""
+    return (lote["validade"] is None, lote["validade"] or 0, lote.get("ambiente") != "Estoque Aberto", lote["id"])
+
+
+class IndiceCodigosBarras:
+    """Índice em memória código de barras → lotes, um por processo.
+
+    É carregado uma vez e mantido atualizado por LISTEN/NOTIFY: os triggers de
+    `itens` publicam os ids alterados no canal `itens_alterados` e uma thread
+    de escuta recarrega apenas esses lotes. Se a escuta cair, a thread
+    reconecta e recarrega o índice inteiro para cobrir o intervalo perdido.
+
+    O estoque guardado aqui serve para a leitura no PDV; a baixa no checkout
+    continua sendo confirmada pelo banco.
+    """
+
+    def __init__(self, banco, intervalo_espera=5.0):
+        self.banco = banco
+        self.intervalo_espera = intervalo_espera
+        self._lotes_por_codigo = {}
+        self._codigo_por_id = {}
+        self._trava = threading.Lock()
+        self._carregado = threading.Event()
+        self._falhou = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+
+    @property
+    def carregado(self):
+        return self._carregado.is_set()
+
+    def iniciar(self, tempo_espera=10.0):
+        """Inicia a thread de escuta e aguarda a primeira carga do índice.
+
+        Se a thread já estiver rodando, apenas informa se o índice está carregado.
+        A espera termina antes de `tempo_espera` se a primeira tentativa falhar
+        (banco fora do ar); a thread continua tentando em segundo plano.
+        """
+        with self._trava:
+            if self._thread is not None and self._thread.is_alive():
+                return self._carregado.is_set()
+            self._parar.clear()
+            self._falhou.clear()
+            self._thread = threading.Thread(target=self._escutar, name="indice-codigos-barras", daemon=True)
+            self._thread.start()
+        limite = time.monotonic() + tempo_espera
+        while not self._carregado.wait(0.05):
+            if self._falhou.is_set() or time.monotonic() >= limite:
+                return False
+        return True
+
+    def parar(self):
+        self._parar.set()
+
+    def buscar(self, codigo):
+        """Retorna cópias de todos os lotes do código, do vencimento mais próximo ao mais distante"""
+        with self._trava:
+            lotes = self._lotes_por_codigo.get(codigo, {})
+            return sorted((dict(lote) for lote in lotes.values()), key=_ordem_lote)
+
+    def _carregar_tudo(self):
+        lotes_por_codigo = {}
+        codigo_por_id = {}
+        # Os avisos vêm do primário; uma réplica atrasada devolveria lotes de antes da alteração
+        with ler_do_primario():
+            lotes = self.banco.listar_lotes()
+        for lote in lotes:
+            lotes_por_codigo.setdefault(lote["codigo_barras"], {})[lote["id"]] = lote
+            codigo_por_id[lote["id"]] = lote["codigo_barras"]
+
+        with self._trava:
+            self._lotes_por_codigo = lotes_por_codigo
+            self._codigo_por_id = codigo_por_id
+        self._carregado.set()
+
+    def _atualizar(self, ids):
+        """Recarrega apenas os lotes alterados; ids que não voltam do banco foram excluídos"""
+        with ler_do_primario():
+            lotes = self.banco.listar_lotes(ids)
+        with self._trava:
+            for item_id in ids:
+                codigo = self._codigo_por_id.pop(item_id, None)
+                if codigo is not None:
+                    lotes_codigo = self._lotes_por_codigo.get(codigo, {})
+                    lotes_codigo.pop(item_id, None)
+                    if not lotes_codigo:
+                        self._lotes_por_codigo.pop(codigo, None)
+            for lote in lotes:
+                self._lotes_por_codigo.setdefault(lote["codigo_barras"], {})[lote["id"]] = lote
+                self._codigo_por_id[lote["id"]] = lote["codigo_barras"]
+
+    def _escutar(self):
+        espera = 1.0
+        while not self._parar.is_set():
+            conexao = None
+            try:
+                conexao = psycopg2.connect(**self.banco.pool.parametros)
+                conexao.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conexao.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CANAL_ITENS_ALTERADOS}")
+
+                # A carga só acontece depois do LISTEN para não perder alterações feitas no meio
+                self._carregar_tudo()
+                espera = 1.0
+
+                while not self._parar.is_set():
+                    if select.select([conexao], [], [], self.intervalo_espera) == ([], [], []):
+                        continue
+                    conexao.poll()
+
+                    ids = set()
+                    recarregar = False
+                    while conexao.notifies:
+                        payload = conexao.notifies.pop(0).payload
+                        if payload == "*":
+                            recarregar = True
+                        else:
+                            ids.update(int(item_id) for item_id in payload.split(","))
+
+                    if recarregar:
+                        self._carregar_tudo()
+                    elif ids:
+                        self._atualizar(ids)
+
+            except Exception as e:
+                print(f"❌ Índice de códigos de barras sem escuta do banco: {e}")
+                self._falhou.set()
+                self._parar.wait(espera)
+                espera = min(espera * 2, 60.0)
+            finally:
+                if conexao is not None and not conexao.closed:
+                    conexao.close()
@@ -0,0 +1,289 @@
+"""Instrumentação das consultas ao banco, por método de BancoDados e por página do app.
+
+Desligada, custa uma verificação de atributo por transação: `BancoDados._cursor`
+só troca o cursor comum pelo `CursorInstrumentado` quando a instrumentação
+está ativa. Ligada (SORVETERIA_INSTRUMENTACAO=1 ou pelo painel de
+diagnóstico), cada transação soma consultas, tempo, maior latência, linhas
+lidas e commits ao método que abriu o cursor e à execução de página em
+andamento. Cada execução de página encerrada vai para um log JSON rotativo.
+"""
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+from psycopg2 import extensions
+
+_execucao_atual = contextvars.ContextVar("execucao_pagina", default=None)
+_arquivo_contextlib = contextmanager.__code__.co_filename
+
+
+class Estatistica:
+    """Totais acumulados de um método ou de uma página"""
+
+    __slots__ = ("chamadas", "consultas", "tempo_ms", "max_ms", "linhas", "commits")
+
+    def __init__(self):
+        self.chamadas = 0
+        self.consultas = 0
+        self.tempo_ms = 0.0
+        self.max_ms = 0.0
+        self.linhas = 0
+        self.commits = 0
+
+    def somar(self, consultas, tempo_ms, max_ms, linhas, commits):
+        self.consultas += consultas
+        self.tempo_ms += tempo_ms
+        self.max_ms = max(self.max_ms, max_ms)
+        self.linhas += linhas
+        self.commits += commits
+
+    def como_dict(self):
+        return {
+            "chamadas": self.chamadas,
+            "consultas": self.consultas,
+            "tempo_ms": round(self.tempo_ms, 3),
+            "max_ms": round(self.max_ms, 3),
+            "linhas": self.linhas,
+            "commits": self.commits,
+        }
+
+
+class CursorInstrumentado(extensions.cursor):
+    """Cursor do psycopg2 que mede cada comando e conta as linhas lidas"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.consultas = 0
+        self.tempo_ms = 0.0
+        self.max_ms = 0.0
+        self.linhas = 0
+
+    def _medir(self, funcao, *args):
+        inicio = time.perf_counter()
+        try:
+            return funcao(*args)
+        finally:
+            duracao = (time.perf_counter() - inicio) * 1000
+            self.consultas += 1
+            self.tempo_ms += duracao
+            self.max_ms = max(self.max_ms, duracao)
+
+    def execute(self, query, vars=None):
+        return self._medir(super().execute, query, vars)
+
+    def executemany(self, query, vars_list):
+        return self._medir(super().executemany, query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        return self._medir(super().copy_expert, sql, file, size)
+
+    def fetchone(self):
+        linha = super().fetchone()
+        if linha is not None:
+            self.linhas += 1
+        return linha
+
+    def fetchmany(self, size=None):
+        linhas = super().fetchmany(self.arraysize if size is None else size)
+        self.linhas += len(linhas)
+        return linhas
+
+    def fetchall(self):
+        linhas = super().fetchall()
+        self.linhas += len(linhas)
+        return linhas
+
+    def __iter__(self):
+        # A iteração nativa do psycopg2 não passa por fetchone
+        while True:
+            linha = self.fetchone()
+            if linha is None:
+                return
+            yield linha
+
+
+class Medicao:
+    """Números de uma transação feita fora do psycopg2 (leituras assíncronas)"""
+
+    def __init__(self):
+        self.consultas = 0
+        self.tempo_ms = 0.0
+        self.max_ms = 0.0
+        self.linhas = 0
+
+    def registrar(self, duracao_ms, linhas):
+        self.consultas += 1
+        self.tempo_ms += duracao_ms
+        self.max_ms = max(self.max_ms, duracao_ms)
+        self.linhas += linhas
+
+
+def metodo_chamador():
+    """Nome da função que abriu `BancoDados._cursor`, pulando os frames do contextlib"""
+    frame = sys._getframe(2)
+    while frame is not None and frame.f_code.co_filename == _arquivo_contextlib:
+        frame = frame.f_back
+    return frame.f_code.co_name if frame is not None else "?"
+
+
+class Instrumentacao:
+    """Coletor do processo, compartilhado por todas as sessões do Streamlit"""
+
+    def __init__(self, ativa=False, arquivo_log=None, tamanho_log=5 * 1024 * 1024, copias_log=3, historico=200):
+        self.ativa = ativa
+        self.arquivo_log = arquivo_log
+        self.tamanho_log = tamanho_log
+        self.copias_log = copias_log
+        self._trava = threading.Lock()
+        self._por_metodo = {}
+        self._por_pagina = {}
+        self._execucoes = deque(maxlen=historico)
+        self._log = None
+        self.desde = datetime.now()
+
+    def registrar_transacao(self, metodo, cursor, commit):
+        """Soma ao método e à página em andamento os números de um bloco `_cursor`"""
+        numeros = (cursor.consultas, cursor.tempo_ms, cursor.max_ms, cursor.linhas, int(commit))
+        with self._trava:
+            estatistica = self._por_metodo.get(metodo)
+            if estatistica is None:
+                estatistica = self._por_metodo[metodo] = Estatistica()
+            estatistica.chamadas += 1
+            estatistica.somar(*numeros)
+
+        execucao = _execucao_atual.get()
+        if execucao is not None:
+            execucao["totais"].somar(*numeros)
+            execucao["metodos"][metodo] = execucao["metodos"].get(metodo, 0) + 1
+
+    def iniciar_pagina(self, pagina):
+        """Marca o início de uma execução (rerun) de página na thread atual"""
+        if not self.ativa:
+            return None
+        return _execucao_atual.set({"pagina": pagina, "inicio": time.perf_counter(), "totais": Estatistica(), "metodos": {}})
+
+    def finalizar_pagina(self):
+        """Encerra a execução de página da thread atual e a registra no histórico e no log"""
+        execucao = _execucao_atual.get()
+        if execucao is None:
+            return None
+        _execucao_atual.set(None)
+
+        totais = execucao["totais"]
+        with self._trava:
+            estatistica = self._por_pagina.get(execucao["pagina"])
+            if estatistica is None:
+                estatistica = self._por_pagina[execucao["pagina"]] = Estatistica()
+            estatistica.chamadas += 1
+            estatistica.somar(totais.consultas, totais.tempo_ms, totais.max_ms, totais.linhas, totais.commits)
+
+            registro = {
+                "momento": datetime.now().isoformat(timespec="seconds"),
+                "pagina": execucao["pagina"],
+                "duracao_ms": round((time.perf_counter() - execucao["inicio"]) * 1000, 3),
+                **totais.como_dict(),
+                "metodos": execucao["metodos"],
+            }
+            del registro["chamadas"]
+            self._execucoes.append(registro)
+            self._gravar_log(registro)
+        return registro
+
+    @contextmanager
+    def pagina(self, nome):
+        self.iniciar_pagina(nome)
+        try:
+            yield
+        finally:
+            self.finalizar_pagina()
+
+    def _gravar_log(self, registro):
+        if not self.arquivo_log:
+            return
+        if self._log is None:
+            pasta = os.path.dirname(os.path.abspath(self.arquivo_log))
+            os.makedirs(pasta, exist_ok=True)
+            self._log = logging.getLogger("sorveteria.instrumentacao")
+            self._log.propagate = False
+            self._log.setLevel(logging.INFO)
+            manipulador = RotatingFileHandler(self.arquivo_log, maxBytes=self.tamanho_log,
+                                              backupCount=self.copias_log, encoding="utf-8")
+            manipulador.setFormatter(logging.Formatter("%(message)s"))
+            self._log.addHandler(manipulador)
+        try:
+            self._log.info(json.dumps(registro, ensure_ascii=False))
+        except OSError as e:
+            print(f"Erro ao gravar o log de instrumentação: {e}")
+
+    def zerar(self):
+        with self._trava:
+            self._por_metodo.clear()
+            self._por_pagina.clear()
+            self._execucoes.clear()
+            self.desde = datetime.now()
+
+    def resumo(self):
+        """Cópia dos números coletados: por método, por página e as últimas execuções"""
+        with self._trava:
+            return {
+                "ativa": self.ativa,
+                "desde": self.desde,
+                "por_metodo": {metodo: e.como_dict() for metodo, e in self._por_metodo.items()},
+                "por_pagina": {pagina: e.como_dict() for pagina, e in self._por_pagina.items()},
+                "execucoes": list(self._execucoes),
+            }
+
+    def exportar_prometheus(self):
+        """Métricas no formato texto de exposição do Prometheus"""
+        resumo = self.resumo()
+        metricas = [
+            ("consultas_total", "counter", "Comandos SQL executados", "consultas", 1),
+            ("tempo_segundos_total", "counter", "Tempo total gasto nos comandos SQL", "tempo_ms", 0.001),
+            ("tempo_max_segundos", "gauge", "Maior latência de um comando SQL", "max_ms", 0.001),
+            ("linhas_total", "counter", "Linhas lidas dos resultados", "linhas", 1),
+            ("commits_total", "counter", "Transações confirmadas", "commits", 1),
+        ]
+        linhas = []
+        for origem, rotulo, chamadas in (("metodo", "metodo", "Transações abertas pelo método"),
+                                         ("pagina", "pagina", "Execuções (reruns) da página")):
+            estatisticas = resumo[f"por_{origem}"]
+            nome = f"sorveteria_db_{origem}_chamadas_total"
+            linhas += [f"# HELP {nome} {chamadas}", f"# TYPE {nome} counter"]
+            linhas += [f'{nome}{{{rotulo}="{_escapar(chave)}"}} {valores["chamadas"]}' for chave, valores in sorted(estatisticas.items())]
+            for sufixo, tipo, ajuda, campo, escala in metricas:
+                nome = f"sorveteria_db_{origem}_{sufixo}"
+                linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} {tipo}"]
+                linhas += [
+                    f'{nome}{{{rotulo}="{_escapar(chave)}"}} {valores[campo] * escala:g}'
+                    for chave, valores in sorted(estatisticas.items())
+                ]
+        return "\n".join(linhas) + "\n"
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_instrumentacao = None
+_trava_instrumentacao = threading.Lock()
+
+
+def obter_instrumentacao():
+    """Retorna o coletor do processo, criando-o na primeira chamada a partir do ambiente"""
+    global _instrumentacao
+    if _instrumentacao is None:
+        with _trava_instrumentacao:
+            if _instrumentacao is None:
+                _instrumentacao = Instrumentacao(
+                    ativa=os.environ.get("SORVETERIA_INSTRUMENTACAO", "0") == "1",
+                    arquivo_log=os.environ.get("SORVETERIA_INSTRUMENTACAO_LOG", os.path.join("diagnostico", "consultas.jsonl")),
+                )
+    return _instrumentacao
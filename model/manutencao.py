@@ -0,0 +1,94 @@
+"""Comandos de manutenção do banco.
+
+Uso:
+    python -m model.manutencao reconstruir-financeiro
+    python -m model.manutencao verificar-financeiro
+    python -m model.manutencao reconstruir-vendas
+    python -m model.manutencao verificar-vendas
+    python -m model.manutencao verificar-replica
+"""
+import argparse
+import os
+import sys
+
+
+def reconstruir_financeiro(banco):
+    linhas = banco.reconstruir_financeiro_diario()
+    print(f"✅ Resumo diário do financeiro reconstruído: {linhas} linha(s).")
+
+
+def verificar_financeiro(banco):
+    divergencias = banco.verificar_financeiro_diario()
+    if not divergencias:
+        print("✅ Resumo diário do financeiro confere com os lançamentos.")
+        return True
+    print(f"❌ {len(divergencias)} divergência(s) entre o resumo diário e os lançamentos:")
+    for dia, tipo, categoria, operador, resumo, lancamentos in divergencias:
+        print(f"  {dia} | {tipo} | {categoria} | {operador or '-'}: resumo R$ {resumo:.2f}, lançamentos R$ {lancamentos:.2f}")
+    print("Rode `python -m model.manutencao reconstruir-financeiro` para corrigir.")
+    return False
+
+
+def reconstruir_vendas(banco):
+    linhas = banco.reconstruir_vendas_diario()
+    print(f"✅ Resumo diário das vendas reconstruído: {linhas} linha(s).")
+
+
+def verificar_vendas(banco):
+    divergencias = banco.verificar_vendas_diario()
+    if not divergencias:
+        print("✅ Resumo diário das vendas confere com os itens vendidos.")
+        return True
+    print(f"❌ {len(divergencias)} divergência(s) entre o resumo diário e os itens vendidos:")
+    for dia, nome, sabor, resumo, itens in divergencias:
+        print(f"  {dia} | {nome} | {sabor}: resumo {resumo} un., itens vendidos {itens} un.")
+    print("Rode `python -m model.manutencao reconstruir-vendas` para corrigir.")
+    return False
+
+
+def verificar_replica(banco):
+    if banco.replica is None:
+        print("ℹ️ Nenhuma réplica configurada: todas as leituras vão ao primário.")
+        return True
+    pool_replica = banco.replica.pool()
+    if pool_replica is None:
+        print("❌ Réplica inacessível: as leituras estão indo ao primário.")
+        return False
+    with banco.pool.conexao() as conexao, conexao.cursor() as cursor:
+        cursor.execute("SELECT pg_current_wal_lsn()::text")
+        lsn_primario = cursor.fetchone()[0]
+    with pool_replica.conexao() as conexao, conexao.cursor() as cursor:
+        cursor.execute(
+            "SELECT pg_is_in_recovery(), pg_last_wal_replay_lsn()::text,"
+            " pg_wal_lsn_diff(%s::pg_lsn, pg_last_wal_replay_lsn()),"
+            " EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())",
+            (lsn_primario,)
+        )
+        em_recuperacao, lsn_replica, atraso_bytes, atraso_segundos = cursor.fetchone()
+    if not em_recuperacao:
+        print("❌ O servidor configurado como réplica não está em recuperação (não é uma réplica).")
+        return False
+    print(f"✅ Réplica no ar. WAL do primário: {lsn_primario} | reproduzido na réplica: {lsn_replica}")
+    print(f"  Atraso: {max(atraso_bytes or 0, 0):.0f} byte(s), última transação reproduzida há {atraso_segundos or 0:.1f}s")
+    return True
+
+
+COMANDOS = {
+    "reconstruir-financeiro": reconstruir_financeiro,
+    "verificar-financeiro": verificar_financeiro,
+    "reconstruir-vendas": reconstruir_vendas,
+    "verificar-vendas": verificar_vendas,
+    "verificar-replica": verificar_replica,
+}
+
+
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+    from model.bancodedados import BancoDados
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("comando", choices=sorted(COMANDOS))
+    args = parser.parse_args()
+
+    if COMANDOS[args.comando](BancoDados()) is False:
+        sys.exit(1)
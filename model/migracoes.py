@@ -0,0 +1,825 @@
+"""Migrações versionadas do esquema do banco.
+
+Cada migração é uma tupla (versao, descricao, passos). Os passos são
+comandos SQL ou funções que recebem o cursor, executados em ordem dentro de
+uma única transação. A versão aplicada fica registrada em `schema_migracoes`,
+então cada migração roda uma única vez por banco.
+
+Para evoluir o esquema, acrescente uma nova entrada ao final de MIGRACOES com
+a próxima versão. Nunca altere uma migração já publicada: os bancos que já a
+aplicaram não vão rodá-la de novo. Os passos devem ser idempotentes
+(IF NOT EXISTS, OR REPLACE) para tolerar bancos criados antes das migrações.
+
+Uso manual:
+    python -m model.migracoes
+"""
+import os
+import re
+import sys
+from decimal import ROUND_FLOOR, ROUND_HALF_UP, Decimal
+
+from psycopg2.extras import execute_values
+
+# Chave do advisory lock que impede dois processos de migrarem ao mesmo tempo
+CHAVE_TRAVA_MIGRACAO = 72_010_001
+
+
+def reconstruir_financeiro_diario(cursor):
+    """Recalcula o resumo diário do financeiro a partir dos lançamentos.
+
+    Bloqueia escritas em `financeiro` até o fim da transação, para que nenhum
+    lançamento entre entre a limpeza e o recálculo. Serve como passo de
+    migração e como comando de manutenção (`python -m model.manutencao`).
+    """
+    cursor.execute("LOCK TABLE financeiro IN SHARE ROW EXCLUSIVE MODE")
+    cursor.execute("TRUNCATE financeiro_diario")
+    cursor.execute("""
+        INSERT INTO financeiro_diario (dia, tipo, categoria, operador, total, quantidade)
+        SELECT data_lancamento::date, tipo, categoria, COALESCE(operador, ''),
+               SUM(valor::numeric(14, 2)), COUNT(*)
+        FROM financeiro
+        GROUP BY 1, 2, 3, 4
+    """)
+
+
+def reconstruir_vendas_diario(cursor):
+    """Recalcula o resumo diário das vendas por produto a partir de `venda_itens`.
+
+    Como em `reconstruir_financeiro_diario`, bloqueia a gravação de vendas até
+    o fim da transação. Serve como passo de migração e como comando de
+    manutenção.
+    """
+    cursor.execute("LOCK TABLE venda_itens IN SHARE ROW EXCLUSIVE MODE")
+    cursor.execute("TRUNCATE venda_itens_diario")
+    cursor.execute("""
+        INSERT INTO venda_itens_diario (dia, nome, sabor, quantidade, receita)
+        SELECT dia, nome, sabor, SUM(quantidade), SUM(receita)
+        FROM venda_itens
+        GROUP BY 1, 2, 3
+    """)
+
+
+def repartir_total(total, pesos):
+    """Divide `total` em partes proporcionais aos pesos, em centavos.
+
+    A última parte fica com a sobra do arredondamento, para que a soma das
+    partes seja exatamente o total. Sem pesos positivos, divide por igual.
+    """
+    centavos = int((Decimal(str(total)) * 100).quantize(Decimal(1), ROUND_HALF_UP))
+    pesos = [Decimal(str(peso)) for peso in pesos]
+    soma = sum(pesos)
+    if soma <= 0:
+        pesos, soma = [Decimal(1)] * len(pesos), Decimal(len(pesos))
+    partes = [int((centavos * peso / soma).to_integral_value(ROUND_FLOOR)) for peso in pesos[:-1]]
+    partes.append(centavos - sum(partes))
+    return [Decimal(parte).scaleb(-2) for parte in partes]
+
+
+# "Venda via PDV por Ana - Itens: Picolé (Morango) x2, Picolé (Uva) x1": carrinho das primeiras versões
+_ITEM_DESCRICAO_ANTIGA = re.compile(r"(.+?) \(([^()]*)\) x(\d+)(?:, |$)")
+# "Ana | 2x Picolé - Morango | 1x Picolé - Uva": PDV e carrinho a partir da venda em uma transação
+_ITEM_DESCRICAO_PDV = re.compile(r"(\d+)x (.+) - (.+)")
+
+
+def interpretar_descricao_venda(descricao):
+    """Extrai (operador, [(nome, sabor, quantidade)]) da descrição de uma receita de venda.
+
+    Descrições sem itens reconhecíveis, como a "Venda realizada via PDV" da
+    baixa de uma unidade, voltam como (None, []).
+    """
+    descricao = (descricao or "").strip()
+    if descricao.startswith("Venda via PDV por ") and " - Itens: " in descricao:
+        operador, _, itens = descricao[len("Venda via PDV por "):].partition(" - Itens: ")
+        return operador, [
+            (nome.strip(), sabor.strip(), int(quantidade))
+            for nome, sabor, quantidade in _ITEM_DESCRICAO_ANTIGA.findall(itens) if int(quantidade) > 0
+        ]
+
+    partes = descricao.split(" | ")
+    itens = [_ITEM_DESCRICAO_PDV.fullmatch(parte.strip()) for parte in partes[1:]]
+    if itens and all(itens):
+        return partes[0], [
+            (item[2].strip(), item[3].strip(), int(item[1])) for item in itens if int(item[1]) > 0
+        ]
+    return None, []
+
+
+def migrar_descricoes_de_vendas(cursor, lote=5000):
+    """Cria as vendas estruturadas das receitas de venda do financeiro que ainda não têm venda.
+
+    Os itens vêm da descrição do lançamento (`interpretar_descricao_venda`).
+    As descrições antigas não trazem o preço unitário nem o lote: a receita
+    do lançamento é repartida entre as linhas pela quantidade e `item_id` e
+    `valor_unitario` ficam nulos. Lançamentos sem itens reconhecíveis viram
+    vendas sem linhas, que contam nos totais de vendas mas não por produto.
+    Bloqueia novos lançamentos até o fim da transação.
+    """
+    cursor.execute("LOCK TABLE financeiro IN SHARE ROW EXCLUSIVE MODE")
+    with cursor.connection.cursor(name="migracao_descricoes_vendas") as lancamentos:
+        lancamentos.itersize = lote
+        lancamentos.execute("""
+            SELECT f.id, f.categoria, f.descricao, f.valor, f.data_lancamento, f.operador
+            FROM financeiro f
+            WHERE f.tipo = 'Receita' AND f.categoria LIKE 'Venda%'
+              AND NOT EXISTS (SELECT 1 FROM vendas v WHERE v.financeiro_id = f.id)
+            ORDER BY f.id
+        """)
+        while True:
+            linhas = lancamentos.fetchmany(lote)
+            if not linhas:
+                break
+            vendas = []
+            for financeiro_id, categoria, descricao, valor, data_lancamento, operador in linhas:
+                operador_descricao, itens = interpretar_descricao_venda(descricao)
+                forma_pagamento = categoria.partition(" - ")[2] or None
+                vendas.append((financeiro_id, data_lancamento, operador or operador_descricao, forma_pagamento, valor, itens))
+
+            ids = dict(execute_values(cursor, """
+                INSERT INTO vendas (financeiro_id, data_venda, operador, forma_pagamento, total, origem)
+                VALUES %s
+                RETURNING financeiro_id, id
+            """, [venda[:5] for venda in vendas], template="(%s, %s, %s, %s, %s, 'migracao')",
+                page_size=len(vendas), fetch=True))
+
+            itens_vendas = []
+            for financeiro_id, data_lancamento, _, _, valor, itens in vendas:
+                receitas = repartir_total(valor, [quantidade for _, _, quantidade in itens])
+                itens_vendas.extend(
+                    (ids[financeiro_id], linha, nome, sabor, quantidade, receita, data_lancamento.date())
+                    for linha, ((nome, sabor, quantidade), receita) in enumerate(zip(itens, receitas), 1)
+                )
+            if itens_vendas:
+                execute_values(cursor, """
+                    INSERT INTO venda_itens (venda_id, linha, nome, sabor, quantidade, receita, dia)
+                    VALUES %s
+                """, itens_vendas, page_size=1000)
+
+
+
+MIGRACOES = [
+    (1, "Esquema inicial", [
+        '''
+        CREATE TABLE IF NOT EXISTS eletronicos (
+            id SERIAL PRIMARY KEY,
+            nome TEXT NOT NULL,
+            kw_por_dia REAL NOT NULL,
+            quantidade INTEGER NOT NULL,
+            ambiente TEXT NOT NULL,
+            capacidade_total INTEGER NOT NULL,
+            status TEXT DEFAULT 'Disponível',  -- Novo campo para controlar o status do freezer
+            data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS itens (
+            id SERIAL PRIMARY KEY,
+            nome TEXT NOT NULL,
+            sabor TEXT NOT NULL,
+            valor_compra REAL NOT NULL,
+            valor_venda REAL NOT NULL,
+            validade DATE,
+            quantidade INTEGER NOT NULL,
+            data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            freezer_id INTEGER REFERENCES eletronicos(id) ON DELETE CASCADE,
+            codigo_barras TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS custos_armazenamento (
+            id SERIAL PRIMARY KEY,
+            nome TEXT NOT NULL,
+            valor REAL NOT NULL,
+            quantidade INTEGER NOT NULL,
+            categoria TEXT NOT NULL,
+            data_criacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS cupons_desconto (
+            id SERIAL PRIMARY KEY,
+            codigo TEXT UNIQUE NOT NULL,
+            percentual_desconto REAL NOT NULL CHECK (percentual_desconto > 0 AND percentual_desconto <= 100),
+            validade DATE NOT NULL,
+            limite_uso INTEGER NOT NULL CHECK (limite_uso >= 1),
+            usos_restantes INTEGER NOT NULL,
+            criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS financeiro (
+            id SERIAL PRIMARY KEY,
+            tipo TEXT NOT NULL CHECK (tipo IN ('Receita', 'Despesa')),
+            valor REAL NOT NULL CHECK (valor >= 0),
+            descricao TEXT NOT NULL,
+            categoria TEXT NOT NULL,
+            data_lancamento TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            operador TEXT
+        )
+        ''',
+        '''
+        CREATE OR REPLACE FUNCTION atualizar_status_freezer() RETURNS TRIGGER AS $$
+        BEGIN
+            UPDATE eletronicos
+            SET status =
+                CASE
+                    WHEN (SELECT COALESCE(SUM(quantidade), 0) FROM itens WHERE freezer_id = NEW.freezer_id) >= capacidade_total
+                    THEN 'Cheio'
+                    ELSE 'Disponível'
+                END
+            WHERE id = NEW.freezer_id;
+
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        ''',
+        "DROP TRIGGER IF EXISTS trigger_atualizar_status_freezer ON itens",
+        '''
+        CREATE TRIGGER trigger_atualizar_status_freezer
+        AFTER INSERT OR UPDATE ON itens
+        FOR EACH ROW
+        EXECUTE FUNCTION atualizar_status_freezer()
+        ''',
+    ]),
+    (2, "Índices das consultas frequentes", [
+        # Leitura de código de barras no PDV
+        "CREATE INDEX IF NOT EXISTS idx_itens_codigo_barras ON itens (codigo_barras)",
+        # Joins com eletronicos e recálculo de ocupação por freezer
+        "CREATE INDEX IF NOT EXISTS idx_itens_freezer_id ON itens (freezer_id)",
+        # Transferência de picolés por sabor entre freezers
+        "CREATE INDEX IF NOT EXISTS idx_itens_sabor_freezer ON itens (sabor, freezer_id)",
+        # Painéis por ambiente
+        "CREATE INDEX IF NOT EXISTS idx_eletronicos_ambiente ON eletronicos (ambiente)",
+        # Relatórios financeiros por período
+        "CREATE INDEX IF NOT EXISTS idx_financeiro_data_lancamento ON financeiro (data_lancamento)",
+    ]),
+    (3, "Contador incremental de ocupação dos freezers", [
+        "ALTER TABLE eletronicos ADD COLUMN IF NOT EXISTS ocupado INTEGER NOT NULL DEFAULT 0",
+        # Impede alterações em itens entre o recálculo e a troca dos triggers
+        "LOCK TABLE itens IN SHARE ROW EXCLUSIVE MODE",
+        "DROP TRIGGER IF EXISTS trigger_atualizar_status_freezer ON itens",
+        "DROP FUNCTION IF EXISTS atualizar_status_freezer()",
+        '''
+        UPDATE eletronicos e
+        SET ocupado = s.total,
+            status = CASE WHEN s.total >= e.capacidade_total THEN 'Cheio' ELSE 'Disponível' END
+        FROM (
+            SELECT f.id, COALESCE(SUM(i.quantidade), 0) AS total
+            FROM eletronicos f
+            LEFT JOIN itens i ON i.freezer_id = f.id
+            GROUP BY f.id
+        ) s
+        WHERE e.id = s.id
+        ''',
+        # Um único trigger por comando: soma os deltas das transition tables por freezer
+        # e aplica um UPDATE por freezer afetado, sem recalcular SUM sobre o freezer inteiro
+        '''
+        CREATE OR REPLACE FUNCTION atualizar_ocupacao_freezer() RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                UPDATE eletronicos e
+                SET ocupado = e.ocupado + d.delta,
+                    status = CASE WHEN e.ocupado + d.delta >= e.capacidade_total THEN 'Cheio' ELSE 'Disponível' END
+                FROM (
+                    SELECT freezer_id, SUM(quantidade) AS delta
+                    FROM novos WHERE freezer_id IS NOT NULL
+                    GROUP BY freezer_id
+                ) d
+                WHERE e.id = d.freezer_id AND d.delta <> 0;
+            ELSIF TG_OP = 'UPDATE' THEN
+                UPDATE eletronicos e
+                SET ocupado = e.ocupado + d.delta,
+                    status = CASE WHEN e.ocupado + d.delta >= e.capacidade_total THEN 'Cheio' ELSE 'Disponível' END
+                FROM (
+                    SELECT freezer_id, SUM(delta) AS delta
+                    FROM (
+                        SELECT freezer_id, quantidade AS delta FROM novos
+                        UNION ALL
+                        SELECT freezer_id, -quantidade FROM antigos
+                    ) m
+                    WHERE freezer_id IS NOT NULL
+                    GROUP BY freezer_id
+                ) d
+                WHERE e.id = d.freezer_id AND d.delta <> 0;
+            ELSE
+                UPDATE eletronicos e
+                SET ocupado = e.ocupado + d.delta,
+                    status = CASE WHEN e.ocupado + d.delta >= e.capacidade_total THEN 'Cheio' ELSE 'Disponível' END
+                FROM (
+                    SELECT freezer_id, -SUM(quantidade) AS delta
+                    FROM antigos WHERE freezer_id IS NOT NULL
+                    GROUP BY freezer_id
+                ) d
+                WHERE e.id = d.freezer_id AND d.delta <> 0;
+            END IF;
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        ''',
+        "DROP TRIGGER IF EXISTS trigger_ocupacao_insert ON itens",
+        '''
+        CREATE TRIGGER trigger_ocupacao_insert
+        AFTER INSERT ON itens
+        REFERENCING NEW TABLE AS novos
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION atualizar_ocupacao_freezer()
+        ''',
+        "DROP TRIGGER IF EXISTS trigger_ocupacao_update ON itens",
+        '''
+        CREATE TRIGGER trigger_ocupacao_update
+        AFTER UPDATE ON itens
+        REFERENCING OLD TABLE AS antigos NEW TABLE AS novos
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION atualizar_ocupacao_freezer()
+        ''',
+        "DROP TRIGGER IF EXISTS trigger_ocupacao_delete ON itens",
+        '''
+        CREATE TRIGGER trigger_ocupacao_delete
+        AFTER DELETE ON itens
+        REFERENCING OLD TABLE AS antigos
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION atualizar_ocupacao_freezer()
+        ''',
+    ]),
+    (4, "Índice parcial de validade para os alertas de vencimento", [
+        "CREATE INDEX IF NOT EXISTS idx_itens_validade_em_estoque ON itens (validade) WHERE quantidade > 0",
+    ]),
+    (5, "Notificação de alterações em itens para o índice de códigos de barras", [
+        # Envia os ids alterados no canal itens_alterados; o payload do NOTIFY é limitado
+        # a 8000 bytes, então comandos muito grandes pedem uma recarga completa ('*')
+        '''
+        CREATE OR REPLACE FUNCTION notificar_itens_alterados() RETURNS TRIGGER AS $$
+        DECLARE
+            ids TEXT;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                SELECT string_agg(DISTINCT id::text, ',') INTO ids FROM antigos;
+            ELSE
+                SELECT string_agg(DISTINCT id::text, ',') INTO ids FROM novos;
+            END IF;
+
+            IF ids IS NOT NULL THEN
+                IF length(ids) > 7900 THEN
+                    ids := '*';
+                END IF;
+                PERFORM pg_notify('itens_alterados', ids);
+            END IF;
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        ''',
+        "DROP TRIGGER IF EXISTS trigger_notificar_itens_insert ON itens",
+        '''
+        CREATE TRIGGER trigger_notificar_itens_insert
+        AFTER INSERT ON itens
+        REFERENCING NEW TABLE AS novos
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION notificar_itens_alterados()
+        ''',
+        "DROP TRIGGER IF EXISTS trigger_notificar_itens_update ON itens",
+        '''
+        CREATE TRIGGER trigger_notificar_itens_update
+        AFTER UPDATE ON itens
+        REFERENCING OLD TABLE AS antigos NEW TABLE AS novos
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION notificar_itens_alterados()
+        ''',
+        "DROP TRIGGER IF EXISTS trigger_notificar_itens_delete ON itens",
+        '''
+        CREATE TRIGGER trigger_notificar_itens_delete
+        AFTER DELETE ON itens
+        REFERENCING OLD TABLE AS antigos
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION notificar_itens_alterados()
+        ''',
+    ]),
+    (6, "Índice da paginação por chave do financeiro", [
+        # Atende o filtro por período e o ORDER BY data_lancamento DESC, id DESC da listagem
+        "CREATE INDEX IF NOT EXISTS idx_financeiro_data_id ON financeiro (data_lancamento, id)",
+        "DROP INDEX IF EXISTS idx_financeiro_data_lancamento",
+    ]),
+    (7, "Resumo diário do financeiro mantido por triggers", [
+        '''
+        CREATE TABLE IF NOT EXISTS financeiro_diario (
+            dia DATE NOT NULL,
+            tipo TEXT NOT NULL,
+            categoria TEXT NOT NULL,
+            operador TEXT NOT NULL,
+            total NUMERIC(14, 2) NOT NULL DEFAULT 0,
+            quantidade INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (dia, tipo, categoria, operador)
+        )
+        ''',
+        reconstruir_financeiro_diario,
+        # Um trigger por comando: agrega os lançamentos das transition tables por
+        # (dia, tipo, categoria, operador) e aplica os deltas com upsert. As chaves
+        # são gravadas em ordem para que vendas simultâneas não se travem mutuamente,
+        # e as linhas que ficam sem lançamentos são removidas.
+        '''
+        CREATE OR REPLACE FUNCTION atualizar_financeiro_diario() RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO financeiro_diario AS d (dia, tipo, categoria, operador, total, quantidade)
+                SELECT data_lancamento::date, tipo, categoria, COALESCE(operador, ''),
+                       SUM(valor::numeric(14, 2)), COUNT(*)
+                FROM novos
+                GROUP BY 1, 2, 3, 4
+                ORDER BY 1, 2, 3, 4
+                ON CONFLICT (dia, tipo, categoria, operador) DO UPDATE
+                SET total = d.total + EXCLUDED.total,
+                    quantidade = d.quantidade + EXCLUDED.quantidade;
+            ELSE
+                IF TG_OP = 'UPDATE' THEN
+                    INSERT INTO financeiro_diario AS d (dia, tipo, categoria, operador, total, quantidade)
+                    SELECT dia, tipo, categoria, operador, SUM(total), SUM(quantidade)
+                    FROM (
+                        SELECT data_lancamento::date AS dia, tipo, categoria, COALESCE(operador, '') AS operador,
+                               valor::numeric(14, 2) AS total, 1 AS quantidade
+                        FROM novos
+                        UNION ALL
+                        SELECT data_lancamento::date, tipo, categoria, COALESCE(operador, ''),
+                               -valor::numeric(14, 2), -1
+                        FROM antigos
+                    ) m
+                    GROUP BY 1, 2, 3, 4
+                    ORDER BY 1, 2, 3, 4
+                    ON CONFLICT (dia, tipo, categoria, operador) DO UPDATE
+                    SET total = d.total + EXCLUDED.total,
+                        quantidade = d.quantidade + EXCLUDED.quantidade;
+                ELSE
+                    UPDATE financeiro_diario d
+                    SET total = d.total - a.total,
+                        quantidade = d.quantidade - a.quantidade
+                    FROM (
+                        SELECT data_lancamento::date AS dia, tipo, categoria, COALESCE(operador, '') AS operador,
+                               SUM(valor::numeric(14, 2)) AS total, COUNT(*) AS quantidade
+                        FROM antigos
+                        GROUP BY 1, 2, 3, 4
+                    ) a
+                    WHERE d.dia = a.dia AND d.tipo = a.tipo AND d.categoria = a.categoria AND d.operador = a.operador;
+                END IF;
+
+                DELETE FROM financeiro_diario d
+                USING antigos a
+                WHERE d.dia = a.data_lancamento::date AND d.tipo = a.tipo
+                  AND d.categoria = a.categoria AND d.operador = COALESCE(a.operador, '')
+                  AND d.quantidade = 0;
+            END IF;
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        ''',
+        "DROP TRIGGER IF EXISTS trigger_financeiro_diario_insert ON financeiro",
+        '''
+        CREATE TRIGGER trigger_financeiro_diario_insert
+        AFTER INSERT ON financeiro
+        REFERENCING NEW TABLE AS novos
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION atualizar_financeiro_diario()
+        ''',
+        "DROP TRIGGER IF EXISTS trigger_financeiro_diario_update ON financeiro",
+        '''
+        CREATE TRIGGER trigger_financeiro_diario_update
+        AFTER UPDATE ON financeiro
+        REFERENCING OLD TABLE AS antigos NEW TABLE AS novos
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION atualizar_financeiro_diario()
+        ''',
+        "DROP TRIGGER IF EXISTS trigger_financeiro_diario_delete ON financeiro",
+        '''
+        CREATE TRIGGER trigger_financeiro_diario_delete
+        AFTER DELETE ON financeiro
+        REFERENCING OLD TABLE AS antigos
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION atualizar_financeiro_diario()
+        ''',
+    ]),
+    (8, "Chave única dos lotes de itens para a entrada em lote", [
+        # Junta no mesmo registro os lotes repetidos (mesmo produto, freezer, código e
+        # validade) antes de criar a chave única. Validades diferentes são lotes
+        # diferentes: juntá-las perderia a data de vencimento de parte dos picolés
+        "LOCK TABLE itens IN SHARE ROW EXCLUSIVE MODE",
+        '''
+        UPDATE itens i
+        SET quantidade = g.quantidade
+        FROM (
+            SELECT MIN(id) AS id, SUM(quantidade) AS quantidade
+            FROM itens
+            WHERE freezer_id IS NOT NULL
+            GROUP BY nome, sabor, freezer_id, codigo_barras, COALESCE(validade, 'infinity'::date)
+            HAVING COUNT(*) > 1
+        ) g
+        WHERE i.id = g.id
+        ''',
+        '''
+        DELETE FROM itens i
+        USING itens k
+        WHERE i.nome = k.nome AND i.sabor = k.sabor AND i.freezer_id = k.freezer_id
+          AND i.codigo_barras = k.codigo_barras
+          AND COALESCE(i.validade, 'infinity'::date) = COALESCE(k.validade, 'infinity'::date) AND i.id > k.id
+        ''',
+        # Lotes sem validade entram na chave como 'infinity', para que também se juntem
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_itens_chave_lote "
+        "ON itens (nome, sabor, freezer_id, codigo_barras, (COALESCE(validade, 'infinity'::date)))",
+    ]),
+    (9, "Baixa de estoque sem corrida entre terminais", [
+        # Rede de segurança para as baixas protegidas por quantidade >= n; NOT VALID
+        # não verifica as linhas antigas, só as novas gravações
+        '''
+        DO $$
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'itens_quantidade_nao_negativa') THEN
+                ALTER TABLE itens ADD CONSTRAINT itens_quantidade_nao_negativa CHECK (quantidade >= 0) NOT VALID;
+            END IF;
+        END;
+        $$
+        ''',
+        # Mesma contagem da migração 3, mas travando os freezers afetados em ordem de id
+        # antes do UPDATE: duas vendas que baixam lotes dos mesmos freezers não se travam
+        # mutuamente em ordens diferentes
+        '''
+        CREATE OR REPLACE FUNCTION atualizar_ocupacao_freezer() RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                PERFORM 1 FROM eletronicos
+                WHERE id IN (SELECT freezer_id FROM novos)
+                ORDER BY id FOR UPDATE;
+
+                UPDATE eletronicos e
+                SET ocupado = e.ocupado + d.delta,
+                    status = CASE WHEN e.ocupado + d.delta >= e.capacidade_total THEN 'Cheio' ELSE 'Disponível' END
+                FROM (
+                    SELECT freezer_id, SUM(quantidade) AS delta
+                    FROM novos WHERE freezer_id IS NOT NULL
+                    GROUP BY freezer_id
+                ) d
+                WHERE e.id = d.freezer_id AND d.delta <> 0;
+            ELSIF TG_OP = 'UPDATE' THEN
+                PERFORM 1 FROM eletronicos
+                WHERE id IN (SELECT freezer_id FROM novos UNION SELECT freezer_id FROM antigos)
+                ORDER BY id FOR UPDATE;
+
+                UPDATE eletronicos e
+                SET ocupado = e.ocupado + d.delta,
+                    status = CASE WHEN e.ocupado + d.delta >= e.capacidade_total THEN 'Cheio' ELSE 'Disponível' END
+                FROM (
+                    SELECT freezer_id, SUM(delta) AS delta
+                    FROM (
+                        SELECT freezer_id, quantidade AS delta FROM novos
+                        UNION ALL
+                        SELECT freezer_id, -quantidade FROM antigos
+                    ) m
+                    WHERE freezer_id IS NOT NULL
+                    GROUP BY freezer_id
+                ) d
+                WHERE e.id = d.freezer_id AND d.delta <> 0;
+            ELSE
+                PERFORM 1 FROM eletronicos
+                WHERE id IN (SELECT freezer_id FROM antigos)
+                ORDER BY id FOR UPDATE;
+
+                UPDATE eletronicos e
+                SET ocupado = e.ocupado + d.delta,
+                    status = CASE WHEN e.ocupado + d.delta >= e.capacidade_total THEN 'Cheio' ELSE 'Disponível' END
+                FROM (
+                    SELECT freezer_id, -SUM(quantidade) AS delta
+                    FROM antigos WHERE freezer_id IS NOT NULL
+                    GROUP BY freezer_id
+                ) d
+                WHERE e.id = d.freezer_id AND d.delta <> 0;
+            END IF;
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        ''',
+    ]),
+    (10, "Reservas de cupons de desconto", [
+        # Cada uso de cupom é reservado ao aplicar no PDV e confirmado na venda;
+        # reservas não confirmadas até expira_em devolvem o uso ao cupom
+        '''
+        CREATE TABLE IF NOT EXISTS cupons_reservas (
+            id SERIAL PRIMARY KEY,
+            cupom_id INTEGER NOT NULL REFERENCES cupons_desconto(id) ON DELETE CASCADE,
+            criada_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            expira_em TIMESTAMP NOT NULL,
+            confirmada_em TIMESTAMP
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_cupons_reservas_pendentes ON cupons_reservas (cupom_id, expira_em) WHERE confirmada_em IS NULL",
+        "ALTER TABLE cupons_desconto DROP CONSTRAINT IF EXISTS cupons_usos_restantes_validos",
+        "ALTER TABLE cupons_desconto ADD CONSTRAINT cupons_usos_restantes_validos CHECK (usos_restantes >= 0) NOT VALID",
+    ]),
+    (11, "Chaves de idempotência das vendas", [
+        # Uma linha por venda gravada, com a chave gerada no PDV: a venda refeita
+        # pelo diário offline (ou reenviada pelo terminal) não é lançada duas vezes
+        '''
+        CREATE TABLE IF NOT EXISTS vendas_idempotencia (
+            chave TEXT PRIMARY KEY CHECK (length(chave) BETWEEN 1 AND 64),
+            origem TEXT NOT NULL CHECK (origem IN ('online', 'diario')),
+            registrada_em TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    (12, "Vendas estruturadas (vendas e venda_itens) com resumo diário por produto", [
+        # Uma linha por venda, ligada à receita lançada no financeiro: excluir o
+        # lançamento exclui a venda e as linhas dela
+        '''
+        CREATE TABLE IF NOT EXISTS vendas (
+            id SERIAL PRIMARY KEY,
+            financeiro_id INTEGER UNIQUE REFERENCES financeiro(id) ON DELETE CASCADE,
+            data_venda TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            operador TEXT,
+            forma_pagamento TEXT,
+            subtotal NUMERIC(12, 2),
+            desconto NUMERIC(12, 2),
+            total NUMERIC(12, 2) NOT NULL CHECK (total >= 0),
+            origem TEXT NOT NULL CHECK (origem IN ('pdv', 'diario', 'migracao'))
+        )
+        ''',
+        # `receita` é a parte da linha no total da venda (já com o desconto); `dia`
+        # repete a data da venda para que o resumo diário não precise de junção
+        '''
+        CREATE TABLE IF NOT EXISTS venda_itens (
+            venda_id INTEGER NOT NULL REFERENCES vendas(id) ON DELETE CASCADE,
+            linha SMALLINT NOT NULL,
+            item_id INTEGER REFERENCES itens(id) ON DELETE SET NULL,
+            nome TEXT NOT NULL,
+            sabor TEXT NOT NULL,
+            quantidade INTEGER NOT NULL CHECK (quantidade > 0),
+            valor_unitario NUMERIC(12, 2),
+            receita NUMERIC(12, 2) NOT NULL,
+            dia DATE NOT NULL,
+            PRIMARY KEY (venda_id, linha)
+        )
+        ''',
+        "CREATE INDEX IF NOT EXISTS idx_vendas_data ON vendas (data_venda)",
+        "CREATE INDEX IF NOT EXISTS idx_vendas_operador_data ON vendas (operador, data_venda)",
+        "CREATE INDEX IF NOT EXISTS idx_venda_itens_item ON venda_itens (item_id) WHERE item_id IS NOT NULL",
+        "CREATE INDEX IF NOT EXISTS idx_venda_itens_sabor_dia ON venda_itens (sabor, dia)",
+        '''
+        CREATE TABLE IF NOT EXISTS venda_itens_diario (
+            dia DATE NOT NULL,
+            nome TEXT NOT NULL,
+            sabor TEXT NOT NULL,
+            quantidade INTEGER NOT NULL DEFAULT 0,
+            receita NUMERIC(14, 2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (dia, nome, sabor)
+        )
+        ''',
+        migrar_descricoes_de_vendas,
+        reconstruir_vendas_diario,
+        # Mesmo esquema do resumo do financeiro: um trigger por comando, deltas
+        # agregados das transition tables aplicados em ordem de chave
+        '''
+        CREATE OR REPLACE FUNCTION atualizar_venda_itens_diario() RETURNS TRIGGER AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO venda_itens_diario AS d (dia, nome, sabor, quantidade, receita)
+                SELECT dia, nome, sabor, SUM(quantidade), SUM(receita)
+                FROM novos
+                GROUP BY 1, 2, 3
+                ORDER BY 1, 2, 3
+                ON CONFLICT (dia, nome, sabor) DO UPDATE
+                SET quantidade = d.quantidade + EXCLUDED.quantidade,
+                    receita = d.receita + EXCLUDED.receita;
+            ELSE
+                IF TG_OP = 'UPDATE' THEN
+                    INSERT INTO venda_itens_diario AS d (dia, nome, sabor, quantidade, receita)
+                    SELECT dia, nome, sabor, SUM(quantidade), SUM(receita)
+                    FROM (
+                        SELECT dia, nome, sabor, quantidade, receita FROM novos
+                        UNION ALL
+                        SELECT dia, nome, sabor, -quantidade, -receita FROM antigos
+                    ) m
+                    GROUP BY 1, 2, 3
+                    ORDER BY 1, 2, 3
+                    ON CONFLICT (dia, nome, sabor) DO UPDATE
+                    SET quantidade = d.quantidade + EXCLUDED.quantidade,
+                        receita = d.receita + EXCLUDED.receita;
+                ELSE
+                    UPDATE venda_itens_diario d
+                    SET quantidade = d.quantidade - a.quantidade,
+                        receita = d.receita - a.receita
+                    FROM (
+                        SELECT dia, nome, sabor, SUM(quantidade) AS quantidade, SUM(receita) AS receita
+                        FROM antigos
+                        GROUP BY 1, 2, 3
+                    ) a
+                    WHERE d.dia = a.dia AND d.nome = a.nome AND d.sabor = a.sabor;
+                END IF;
+
+                DELETE FROM venda_itens_diario d
+                USING antigos a
+                WHERE d.dia = a.dia AND d.nome = a.nome AND d.sabor = a.sabor AND d.quantidade = 0;
+            END IF;
+
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        ''',
+        "DROP TRIGGER IF EXISTS trigger_venda_itens_diario_insert ON venda_itens",
+        '''
+        CREATE TRIGGER trigger_venda_itens_diario_insert
+        AFTER INSERT ON venda_itens
+        REFERENCING NEW TABLE AS novos
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION atualizar_venda_itens_diario()
+        ''',
+        "DROP TRIGGER IF EXISTS trigger_venda_itens_diario_update ON venda_itens",
+        '''
+        CREATE TRIGGER trigger_venda_itens_diario_update
+        AFTER UPDATE ON venda_itens
+        REFERENCING OLD TABLE AS antigos NEW TABLE AS novos
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION atualizar_venda_itens_diario()
+        ''',
+        "DROP TRIGGER IF EXISTS trigger_venda_itens_diario_delete ON venda_itens",
+        '''
+        CREATE TRIGGER trigger_venda_itens_diario_delete
+        AFTER DELETE ON venda_itens
+        REFERENCING OLD TABLE AS antigos
+        FOR EACH STATEMENT
+        EXECUTE FUNCTION atualizar_venda_itens_diario()
+        ''',
+    ]),
+    (13, "Índice das linhas de venda por dia para a previsão de demanda", [
+        # Vendas por freezer das últimas semanas sem ler a tabela inteira
+        "CREATE INDEX IF NOT EXISTS idx_venda_itens_dia ON venda_itens (dia) INCLUDE (item_id, sabor, quantidade)",
+    ]),
+    (14, "Índice dos lotes com estoque por código e validade para a saída no PDV", [
+        # A alocação do checkout percorre só os lotes com estoque do código, já na ordem de vencimento
+        "CREATE INDEX IF NOT EXISTS idx_itens_codigo_validade_em_estoque "
+        "ON itens (codigo_barras, validade) WHERE quantidade > 0",
+    ]),
+]
+
+
+def aplicar_migracoes(conexao):
+    """Aplica, em ordem, as migrações ainda não registradas no banco.
+
+    Retorna a lista de versões aplicadas nesta chamada.
+    """
+    aplicadas_agora = []
+    with conexao.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_lock(%s)", (CHAVE_TRAVA_MIGRACAO,))
+        try:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migracoes (
+                    versao INTEGER PRIMARY KEY,
+                    descricao TEXT NOT NULL,
+                    aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            conexao.commit()
+
+            cursor.execute("SELECT versao FROM schema_migracoes")
+            aplicadas = {linha[0] for linha in cursor.fetchall()}
+
+            for versao, descricao, passos in sorted(MIGRACOES, key=lambda m: m[0]):
+                if versao in aplicadas:
+                    continue
+                try:
+                    for passo in passos:
+                        if callable(passo):
+                            passo(cursor)
+                        else:
+                            cursor.execute(passo)
+                    cursor.execute(
+                        "INSERT INTO schema_migracoes (versao, descricao) VALUES (%s, %s)",
+                        (versao, descricao)
+                    )
+                    conexao.commit()
+                except Exception as e:
+                    conexao.rollback()
+                    raise Exception(f"❌ Erro ao aplicar a migração {versao} ({descricao}): {e}") from e
+
+                print(f"✅ Migração {versao} aplicada: {descricao}")
+                aplicadas_agora.append(versao)
+        finally:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", (CHAVE_TRAVA_MIGRACAO,))
+            conexao.commit()
+
+    return aplicadas_agora
+
+
+def versao_atual(conexao):
+    """Retorna a maior versão de migração aplicada no banco"""
+    with conexao.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('schema_migracoes') IS NOT NULL")
+        if not cursor.fetchone()[0]:
+            return 0
+        cursor.execute("SELECT COALESCE(MAX(versao), 0) FROM schema_migracoes")
+        return cursor.fetchone()[0]
+
+
+if __name__ == "__main__":
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+    from model.conexao import obter_pool
+
+    with obter_pool().conexao() as conexao:
+        versoes = aplicar_migracoes(conexao)
+        if not versoes:
+            print(f"Banco já está na versão {versao_atual(conexao)}. Nenhuma alteração feita.")
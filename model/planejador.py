@@ -0,0 +1,289 @@
+"""Planejador de rebalanceamento dos freezers.
+
+Monta uma rede de fluxo de custo mínimo em que cada unidade de fluxo é um
+picolé movido de um freezer para outro e resolve com caminhos mínimos
+sucessivos. As metas entram como custos negativos (recompensas) e
+cada picolé movido custa 1, então o plano só move o que traz ganho:
+
+1. Lotes perto do vencimento no Estoque Fechado vão para o Estoque Aberto.
+2. Cada sabor tem pelo menos `minimo_por_sabor` unidades no Estoque Aberto.
+3. Nenhum freezer passa de `ocupacao_alvo` da capacidade.
+
+Os destinos só recebem até a ocupação alvo. Freezers e sabores entram na
+rede por nós agregados (um nó por ambiente e um por sabor), para que o
+número de arestas cresça com freezers + sabores e não com o produto.
+"""
+import heapq
+from collections import deque
+
+ESTOQUE_ABERTO = "Estoque Aberto"
+ESTOQUE_FECHADO = "Estoque Fechado"
+
+# Prioridade das metas: vencimento > mínimo no Aberto > ocupação alvo
+RECOMPENSA_VENCIMENTO = 30
+RECOMPENSA_MINIMO = 20
+RECOMPENSA_EXCESSO = 10
+CUSTO_MOVIMENTO = 1
+
+INFINITO = float("inf")
+
+
+class RedeFluxo:
+    """Rede com arestas residuais para fluxo de custo mínimo"""
+
+    def __init__(self):
+        self.destino = []
+        self.capacidade = []
+        self.custo = []
+        self.arestas = []
+        self.indices = {}
+
+    def no(self, chave):
+        """Índice do nó identificado por `chave`, criado na primeira chamada"""
+        if chave not in self.indices:
+            self.indices[chave] = len(self.arestas)
+            self.arestas.append([])
+        return self.indices[chave]
+
+    def adicionar_aresta(self, origem, destino, capacidade, custo):
+        if capacidade <= 0:
+            return None
+        u, v = self.no(origem), self.no(destino)
+        aresta = len(self.destino)
+        self.destino += [v, u]
+        self.capacidade += [capacidade, 0]
+        self.custo += [custo, -custo]
+        self.arestas[u].append(aresta)
+        self.arestas[v].append(aresta + 1)
+        return aresta
+
+    def fluxo(self, aresta):
+        """Fluxo que passou pela aresta (a capacidade acumulada na reversa)"""
+        return self.capacidade[aresta ^ 1]
+
+    def _bellman_ford(self, s):
+        """Distâncias iniciais a partir de `s` (SPFA); aceita os custos negativos das recompensas"""
+        distancia = [INFINITO] * len(self.arestas)
+        na_fila = [False] * len(self.arestas)
+        distancia[s] = 0
+        fila = deque([s])
+        while fila:
+            u = fila.popleft()
+            na_fila[u] = False
+            for aresta in self.arestas[u]:
+                if self.capacidade[aresta] > 0:
+                    v = self.destino[aresta]
+                    nova = distancia[u] + self.custo[aresta]
+                    if nova < distancia[v]:
+                        distancia[v] = nova
+                        if not na_fila[v]:
+                            na_fila[v] = True
+                            fila.append(v)
+        return distancia
+
+    def _bloquear(self, s, t, potencial):
+        """Envia o máximo de fluxo pelas arestas de custo reduzido zero (fluxo bloqueante de Dinic)"""
+        total = 0
+        while True:
+            nivel = [-1] * len(self.arestas)
+            nivel[s] = 0
+            fila = deque([s])
+            while fila:
+                u = fila.popleft()
+                for aresta in self.arestas[u]:
+                    v = self.destino[aresta]
+                    if (nivel[v] < 0 and self.capacidade[aresta] > 0
+                            and self.custo[aresta] + potencial[u] - potencial[v] == 0):
+                        nivel[v] = nivel[u] + 1
+                        fila.append(v)
+            if nivel[t] < 0:
+                return total
+
+            proxima = [0] * len(self.arestas)
+
+            def empurrar(u, limite):
+                if u == t:
+                    return limite
+                arestas = self.arestas[u]
+                while proxima[u] < len(arestas):
+                    aresta = arestas[proxima[u]]
+                    v = self.destino[aresta]
+                    if (self.capacidade[aresta] > 0 and nivel[v] == nivel[u] + 1
+                            and self.custo[aresta] + potencial[u] - potencial[v] == 0):
+                        enviado = empurrar(v, min(limite, self.capacidade[aresta]))
+                        if enviado:
+                            self.capacidade[aresta] -= enviado
+                            self.capacidade[aresta ^ 1] += enviado
+                            return enviado
+                    proxima[u] += 1
+                return 0
+
+            while True:
+                enviado = empurrar(s, INFINITO)
+                if not enviado:
+                    break
+                total += enviado
+
+    def custo_minimo(self, origem, sumidouro):
+        """Envia fluxo enquanto houver caminho de custo negativo; retorna (fluxo, custo).
+
+        Primal-dual: o SPFA calcula os potenciais iniciais (há custos
+        negativos), cada rodada de Dijkstra com custos reduzidos atualiza os
+        potenciais e todo o fluxo possível pelos caminhos mínimos da rodada é
+        enviado de uma vez. Como os custos são poucos inteiros pequenos, são
+        poucas rodadas mesmo com centenas de freezers e sabores.
+        """
+        s, t = self.no(origem), self.no(sumidouro)
+        total_fluxo = total_custo = 0
+        potencial = [d if d < INFINITO else 0 for d in self._bellman_ford(s)]
+
+        while True:
+            distancia = [INFINITO] * len(self.arestas)
+            distancia[s] = 0
+            heap = [(0, s)]
+            while heap:
+                d, u = heapq.heappop(heap)
+                if d > distancia[u]:
+                    continue
+                for aresta in self.arestas[u]:
+                    if self.capacidade[aresta] <= 0:
+                        continue
+                    v = self.destino[aresta]
+                    nova = d + self.custo[aresta] + potencial[u] - potencial[v]
+                    if nova < distancia[v]:
+                        distancia[v] = nova
+                        heapq.heappush(heap, (nova, v))
+
+            if distancia[t] == INFINITO:
+                break
+            for v, d in enumerate(distancia):
+                if d < INFINITO:
+                    potencial[v] += d
+
+            # Custo real dos caminhos da rodada; como só aumenta, parar quando não der mais ganho
+            custo_caminho = potencial[t] - potencial[s]
+            if custo_caminho >= 0:
+                break
+
+            enviado = self._bloquear(s, t, potencial)
+            total_fluxo += enviado
+            total_custo += enviado * custo_caminho
+
+        return total_fluxo, total_custo
+
+
+def _parear(entradas, saidas):
+    """Casa as unidades que entram em um nó agregado com as que saem dele"""
+    movimentos = []
+    saidas = [list(saida) for saida in saidas]
+    indice = 0
+    for freezer_origem, sabor, quantidade in entradas:
+        while quantidade > 0 and indice < len(saidas):
+            destino, disponivel = saidas[indice]
+            parte = min(quantidade, disponivel)
+            movimentos.append((sabor, freezer_origem, destino, parte))
+            quantidade -= parte
+            saidas[indice][1] -= parte
+            if saidas[indice][1] == 0:
+                indice += 1
+    return movimentos
+
+
+def planejar_rebalanceamento(freezers, estoque, minimo_por_sabor=20, ocupacao_alvo=0.9):
+    """Calcula as transferências que cumprem as metas com o menor número de picolés movidos.
+
+    `freezers`: lista de {"id", "ambiente", "capacidade_total", "ocupado"}.
+    `estoque`: lista de {"freezer_id", "sabor", "quantidade", "vencendo"}, onde
+    vencendo é a parte da quantidade perto da validade.
+
+    Retorna {"movimentos": [(sabor, origem, destino, quantidade)], "resumo": {...}}.
+    """
+    por_id = {f["id"]: f for f in freezers}
+    estoque = [e for e in estoque if e["freezer_id"] in por_id and e["quantidade"] > 0]
+    infinito = sum(e["quantidade"] for e in estoque) + 1
+
+    aberto_por_sabor = {}
+    for e in estoque:
+        if por_id[e["freezer_id"]]["ambiente"] == ESTOQUE_ABERTO:
+            aberto_por_sabor[e["sabor"]] = aberto_por_sabor.get(e["sabor"], 0) + e["quantidade"]
+
+    rede = RedeFluxo()
+    S, T = ("fonte",), ("sumidouro",)
+    arestas_ambiente = []
+    arestas_sabor = []
+    arestas_entrada_ambiente = []
+    arestas_entrada_sabor = []
+
+    espaco = {}
+    for f in freezers:
+        limite = int(f["capacidade_total"] * ocupacao_alvo)
+        espaco[f["id"]] = limite - f["ocupado"]
+        if f["ocupado"] > limite:
+            rede.adicionar_aresta(S, ("excesso", f["id"]), f["ocupado"] - limite, -RECOMPENSA_EXCESSO)
+
+    for e in estoque:
+        freezer = por_id[e["freezer_id"]]
+        lote_in, lote_out = ("lote_in", e["freezer_id"], e["sabor"]), ("lote_out", e["freezer_id"], e["sabor"])
+        fechado = freezer["ambiente"] == ESTOQUE_FECHADO
+
+        # Cada (freezer, sabor) libera no máximo o que tem
+        rede.adicionar_aresta(lote_in, lote_out, e["quantidade"], 0)
+        rede.adicionar_aresta(("excesso", e["freezer_id"]), lote_in, infinito, 0)
+
+        if fechado:
+            rede.adicionar_aresta(S, lote_in, infinito, 0)
+            rede.adicionar_aresta(lote_out, ("vencendo", e["freezer_id"], e["sabor"]), e.get("vencendo", 0), -RECOMPENSA_VENCIMENTO)
+            aresta = rede.adicionar_aresta(("vencendo", e["freezer_id"], e["sabor"]), ("sabor", e["sabor"]), infinito, 0)
+            arestas_entrada_sabor.append((aresta, e["freezer_id"], e["sabor"]))
+            aresta = rede.adicionar_aresta(lote_out, ("sabor", e["sabor"]), infinito, 0)
+            arestas_entrada_sabor.append((aresta, e["freezer_id"], e["sabor"]))
+
+        for ambiente in (ESTOQUE_ABERTO, ESTOQUE_FECHADO):
+            aresta = rede.adicionar_aresta(lote_out, ("ambiente", ambiente), infinito, CUSTO_MOVIMENTO)
+            arestas_entrada_ambiente.append((aresta, ambiente, e["freezer_id"], e["sabor"]))
+
+    # Unidades que passam pelo nó do sabor chegam ao Aberto; as primeiras cobrem o mínimo
+    for sabor in {e["sabor"] for e in estoque}:
+        falta = max(minimo_por_sabor - aberto_por_sabor.get(sabor, 0), 0)
+        rede.adicionar_aresta(("sabor", sabor), ("sabor_aberto", sabor), falta, -RECOMPENSA_MINIMO)
+        rede.adicionar_aresta(("sabor", sabor), ("sabor_aberto", sabor), infinito, 0)
+
+    for f in freezers:
+        if espaco[f["id"]] <= 0:
+            continue
+        rede.adicionar_aresta(("freezer", f["id"]), T, espaco[f["id"]], 0)
+        aresta = rede.adicionar_aresta(("ambiente", f["ambiente"]), ("freezer", f["id"]), infinito, 0)
+        arestas_ambiente.append((aresta, f["ambiente"], f["id"]))
+        if f["ambiente"] == ESTOQUE_ABERTO:
+            for sabor in {e["sabor"] for e in estoque}:
+                aresta = rede.adicionar_aresta(("sabor_aberto", sabor), ("freezer", f["id"]), infinito, CUSTO_MOVIMENTO)
+                arestas_sabor.append((aresta, sabor, f["id"]))
+
+    picoles, custo = rede.custo_minimo(S, T)
+
+    movimentos = []
+    for ambiente in (ESTOQUE_ABERTO, ESTOQUE_FECHADO):
+        entradas = [(f_id, sabor, rede.fluxo(a)) for a, amb, f_id, sabor in arestas_entrada_ambiente
+                    if amb == ambiente and a is not None and rede.fluxo(a) > 0]
+        saidas = [(f_id, rede.fluxo(a)) for a, amb, f_id in arestas_ambiente if amb == ambiente and rede.fluxo(a) > 0]
+        movimentos += _parear(entradas, saidas)
+
+    for sabor in {e["sabor"] for e in estoque}:
+        # O que entra no nó do sabor: lotes comuns e lotes perto do vencimento do Estoque Fechado
+        entradas = {}
+        for a, f_id, s in arestas_entrada_sabor:
+            if s == sabor and a is not None:
+                entradas[f_id] = entradas.get(f_id, 0) + rede.fluxo(a)
+        saidas = [(f_id, rede.fluxo(a)) for a, s, f_id in arestas_sabor if s == sabor and rede.fluxo(a) > 0]
+        movimentos += _parear([(f_id, sabor, q) for f_id, q in sorted(entradas.items()) if q > 0], saidas)
+
+    # Junta movimentos repetidos de mesmo sabor, origem e destino
+    agrupados = {}
+    for sabor, origem, destino, quantidade in movimentos:
+        if origem != destino:
+            agrupados[(sabor, origem, destino)] = agrupados.get((sabor, origem, destino), 0) + quantidade
+
+    return {
+        "movimentos": [(s, o, d, q) for (s, o, d), q in sorted(agrupados.items(), key=lambda m: (m[0][1], m[0][2], m[0][0]))],
+        "resumo": {"picoles": picoles, "transferencias": len(agrupados), "custo": custo}
+    }
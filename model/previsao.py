@@ -0,0 +1,191 @@
+"""Previsão de demanda e ponto de reposição de cada sabor em cada freezer.
+
+O histórico diário de vendas por sabor vira uma matriz NumPy (sabores x
+dias) e todas as contas são feitas de uma vez para todos os sabores:
+
+1. Fator do dia da semana de cada sabor, puxado para 1 quando há poucas
+   semanas de histórico.
+2. Velocidade: média móvel exponencial das vendas sem o efeito do dia da
+   semana, com meia-vida de meia janela.
+3. Sazonalidade: a curva das vendas da loja inteira nas semanas seguintes à
+   mesma data do ano passado, relativa às semanas anteriores a ela. Sorvete
+   acompanha o calor; sem dados de clima, o ano anterior é o melhor sinal
+   da estação. Sem histórico das semanas anteriores a essa data a curva
+   é plana.
+
+A demanda de cada sabor é dividida entre os freezers pela participação de
+cada um nas vendas recentes (ou pelo estoque, quando o sabor não vendeu
+nada com lote identificado). O ponto de reposição é a demanda prevista
+durante o prazo de reposição mais o estoque de segurança, e os dias até a
+ruptura saem da demanda acumulada prevista contra o estoque atual.
+"""
+from datetime import timedelta
+
+import numpy as np
+
+# Janela das vendas recentes (velocidade, desvio e participação dos freezers)
+JANELA = 28
+# 52 semanas: a mesma data do ano passado cai no mesmo dia da semana
+ANO = 364
+# Histórico carregado: um ano mais duas janelas, para a sazonalidade e a velocidade
+DIAS_HISTORICO = ANO + 2 * JANELA
+# Semanas "fictícias" na média do fator do dia da semana: poucas semanas de histórico puxam o fator para 1
+PESO_DIA_SEMANA = 4
+# Limites da curva sazonal, para que um dia atípico do ano passado não dispare a previsão
+SAZONALIDADE_MINIMA = 0.5
+SAZONALIDADE_MAXIMA = 2.5
+
+
+def periodo_previsao(hoje):
+    """Datas das vendas lidas pela previsão: (início do histórico, ontem, início da janela recente)"""
+    return hoje - timedelta(days=DIAS_HISTORICO), hoje - timedelta(days=1), hoje - timedelta(days=JANELA)
+
+
+def _matriz_vendas(historico, indice, inicio):
+    """Matriz sabores x dias com as quantidades vendidas; dias sem venda ficam zerados"""
+    vendas = np.zeros((len(indice), DIAS_HISTORICO))
+    if historico:
+        dias = np.fromiter(((dia - inicio).days for dia, _, _ in historico), dtype=np.int64, count=len(historico))
+        linhas = np.fromiter((indice[sabor] for _, sabor, _ in historico), dtype=np.int64, count=len(historico))
+        quantidades = np.fromiter((quantidade for _, _, quantidade in historico), dtype=float, count=len(historico))
+        dentro = (dias >= 0) & (dias < DIAS_HISTORICO)
+        np.add.at(vendas, (linhas[dentro], dias[dentro]), quantidades[dentro])
+    return vendas
+
+
+def _desde_primeira_venda(vendas):
+    """Máscara sabores x dias, verdadeira a partir da primeira venda de cada sabor.
+
+    Os dias antes dela não são demanda zero, e sim dias em que o sabor ainda
+    não era vendido; fatores, velocidade e desvio só olham os dias marcados.
+    """
+    return np.cumsum(vendas > 0, axis=1) > 0
+
+
+def _fatores_dia_semana(vendas, dia_semana, validos):
+    """Fator de cada dia da semana por sabor (média do dia / média geral), com encolhimento para 1"""
+    semana = np.eye(7)[dia_semana]
+    contagem = validos @ semana
+    soma = vendas @ semana
+    dias = validos.sum(axis=1, keepdims=True)
+    media = np.divide(vendas.sum(axis=1, keepdims=True), dias, out=np.zeros_like(dias, dtype=float), where=dias > 0)
+    fatores = np.ones_like(soma)
+    np.divide(
+        soma + PESO_DIA_SEMANA * media, (contagem + PESO_DIA_SEMANA) * media,
+        out=fatores, where=media > 0
+    )
+    return fatores
+
+
+def _curva_sazonal(ajustadas, horizonte):
+    """Demanda relativa de cada um dos próximos `horizonte` dias, pela loja inteira no ano passado.
+
+    A curva é plana enquanto a janela de base (as semanas antes da mesma data
+    do ano passado) não estiver toda dentro do histórico: dias antes da
+    primeira venda da loja contariam como vendas zeradas e inflariam a curva.
+    """
+    total = ajustadas.sum(axis=0)
+    hoje_ano_passado = DIAS_HISTORICO - ANO
+    com_vendas = np.flatnonzero(total)
+    if not com_vendas.size or com_vendas[0] > hoje_ano_passado - JANELA:
+        return np.ones(horizonte)
+    base = total[hoje_ano_passado - JANELA:hoje_ano_passado].mean()
+    if base <= 0:
+        return np.ones(horizonte)
+    # Média móvel de 7 dias centrada em cada dia seguinte à mesma data do ano passado
+    trecho = total[hoje_ano_passado - 3:hoje_ano_passado + horizonte + 3]
+    media_movel = np.convolve(trecho, np.ones(7) / 7, mode="valid")[:horizonte]
+    return np.clip(media_movel / base, SAZONALIDADE_MINIMA, SAZONALIDADE_MAXIMA)
+
+
+def prever_estoque(historico, participacoes, estoque, hoje, prazo_reposicao=3, nivel_servico=1.65,
+                   horizonte=60, limite_sem_historico=10):
+    """Prevê a demanda e calcula o ponto de reposição de cada (sabor, freezer) do estoque.
+
+    historico: (dia, sabor, quantidade) vendida por dia, no período de `periodo_previsao(hoje)`.
+    participacoes: (sabor, freezer_id, quantidade) vendida em cada freezer na janela recente.
+    estoque: (sabor, freezer_id, quantidade) em estoque.
+    `nivel_servico` é o z do estoque de segurança (1.65 ≈ 95% dos dias sem ruptura
+    durante o prazo). Sabores sem nenhuma venda no histórico usam
+    `limite_sem_historico` como ponto de reposição.
+
+    Retorna uma lista com sabor, freezer_id, quantidade, velocidade (unidades
+    por dia na próxima semana), ponto_reposicao, dias_ate_ruptura (None se não
+    acaba dentro do horizonte), critico e sem_historico, das rupturas mais
+    próximas para as mais distantes.
+    """
+    if not estoque:
+        return []
+    horizonte = max(horizonte, prazo_reposicao, 7)
+    sabores = sorted(
+        {linha[1] for linha in historico} | {linha[0] for linha in participacoes} | {linha[0] for linha in estoque}
+    )
+    indice = {sabor: i for i, sabor in enumerate(sabores)}
+    inicio = hoje - timedelta(days=DIAS_HISTORICO)
+
+    # Demanda diária prevista de cada sabor: sabores x horizonte
+    vendas = _matriz_vendas(historico, indice, inicio)
+    dia_semana = (inicio.weekday() + np.arange(DIAS_HISTORICO)) % 7
+    validos = _desde_primeira_venda(vendas)
+    fatores = _fatores_dia_semana(vendas, dia_semana, validos)
+    ajustadas = vendas / fatores[:, dia_semana]
+
+    # Média móvel exponencial e desvio de cada sabor a partir da primeira venda dele
+    idades = np.arange(2 * JANELA)[::-1]
+    pesos = validos[:, -2 * JANELA:] * 0.5 ** (idades / (JANELA / 2))
+    soma_pesos = pesos.sum(axis=1)
+    velocidade = np.divide(
+        (ajustadas[:, -2 * JANELA:] * pesos).sum(axis=1), soma_pesos, out=np.zeros(len(sabores)), where=soma_pesos > 0
+    )
+    recentes = validos[:, -JANELA:]
+    dias_recentes = recentes.sum(axis=1)
+    quadrados = (((ajustadas[:, -JANELA:] - velocidade[:, None]) * recentes) ** 2).sum(axis=1)
+    desvio = np.sqrt(np.divide(quadrados, dias_recentes, out=np.zeros(len(sabores)), where=dias_recentes > 0))
+
+    dia_semana_futuro = (hoje.weekday() + np.arange(horizonte)) % 7
+    demanda = velocidade[:, None] * fatores[:, dia_semana_futuro] * _curva_sazonal(ajustadas, horizonte)[None, :]
+
+    # Pares (sabor, freezer) do estoque e a parte de cada um na demanda do sabor
+    par_sabor = np.fromiter((indice[sabor] for sabor, _, _ in estoque), dtype=np.int64, count=len(estoque))
+    quantidade = np.fromiter((q or 0 for _, _, q in estoque), dtype=float, count=len(estoque))
+    vendido = {(sabor, freezer_id): q for sabor, freezer_id, q in participacoes}
+    vendido_par = np.fromiter(
+        (vendido.get((sabor, freezer_id), 0) for sabor, freezer_id, _ in estoque), dtype=float, count=len(estoque)
+    )
+    vendido_sabor = np.bincount(par_sabor, weights=vendido_par, minlength=len(sabores))[par_sabor]
+    estoque_sabor = np.bincount(par_sabor, weights=np.maximum(quantidade, 0), minlength=len(sabores))[par_sabor]
+    pares_sabor = np.bincount(par_sabor, minlength=len(sabores))[par_sabor]
+    participacao = np.where(
+        vendido_sabor > 0, vendido_par / np.maximum(vendido_sabor, 1),
+        np.where(estoque_sabor > 0, np.maximum(quantidade, 0) / np.maximum(estoque_sabor, 1), 1 / pares_sabor)
+    )
+
+    demanda_par = demanda[par_sabor] * participacao[:, None]
+    seguranca = nivel_servico * desvio[par_sabor] * participacao * np.sqrt(prazo_reposicao)
+    ponto_reposicao = np.ceil(demanda_par[:, :prazo_reposicao].sum(axis=1) + seguranca)
+    sem_historico = vendas.sum(axis=1)[par_sabor] == 0
+    ponto_reposicao[sem_historico] = limite_sem_historico
+
+    # Primeiro dia em que a demanda acumulada alcança o estoque, com a fração do dia
+    acumulada = np.concatenate([np.zeros((len(estoque), 1)), demanda_par.cumsum(axis=1)], axis=1)
+    alcanca = acumulada[:, 1:] >= quantidade[:, None]
+    dia = alcanca.argmax(axis=1)
+    antes = np.take_along_axis(acumulada, dia[:, None], axis=1)[:, 0]
+    no_dia = np.take_along_axis(demanda_par, dia[:, None], axis=1)[:, 0]
+    fracao = np.divide(quantidade - antes, no_dia, out=np.zeros(len(estoque)), where=no_dia > 0)
+    dias_ate_ruptura = np.where(quantidade <= 0, 0.0, np.where(alcanca.any(axis=1), dia + fracao, np.nan))
+    dias_ate_ruptura[sem_historico & (quantidade > 0)] = np.nan
+
+    resultado = [
+        {
+            "sabor": sabor, "freezer_id": freezer_id, "quantidade": int(quantidade[i]),
+            "velocidade": round(float(demanda_par[i, :7].mean()), 2),
+            "ponto_reposicao": int(ponto_reposicao[i]),
+            "dias_ate_ruptura": None if np.isnan(dias_ate_ruptura[i]) else round(float(dias_ate_ruptura[i]), 1),
+            "critico": bool(quantidade[i] <= ponto_reposicao[i]),
+            "sem_historico": bool(sem_historico[i]),
+        }
+        for i, (sabor, freezer_id, _) in enumerate(estoque)
+    ]
+    resultado.sort(key=lambda p: (p["dias_ate_ruptura"] is None, p["dias_ate_ruptura"] or 0, p["quantidade"]))
+    return resultado
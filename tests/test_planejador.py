@@ -0,0 +1,98 @@
+"""Testes do planejador de rebalanceamento dos freezers (model/planejador.py)"""
+import random
+from collections import defaultdict
+
+import pytest
+
+from model.planejador import ESTOQUE_ABERTO, ESTOQUE_FECHADO, planejar_rebalanceamento
+
+
+def cenario(freezers, sabores, sabores_por_freezer=10, semente=1):
+    """Um terço dos freezers no Aberto com pouco estoque; o Fechado cheio, alguns acima da ocupação alvo"""
+    aleatorio = random.Random(semente)
+    lista_freezers = [
+        {"id": i, "ambiente": ESTOQUE_ABERTO if i % 3 == 0 else ESTOQUE_FECHADO, "capacidade_total": 500, "ocupado": 0}
+        for i in range(1, freezers + 1)
+    ]
+    estoque = []
+    for freezer in lista_freezers:
+        for sabor in aleatorio.sample(range(sabores), min(sabores_por_freezer, sabores)):
+            maximo = 60 if freezer["ambiente"] == ESTOQUE_FECHADO else 5
+            quantidade = aleatorio.randint(0, maximo)
+            estoque.append({
+                "freezer_id": freezer["id"], "sabor": f"Sabor {sabor}",
+                "quantidade": quantidade, "vencendo": aleatorio.randint(0, quantidade // 4)
+            })
+            freezer["ocupado"] += quantidade
+    return lista_freezers, estoque
+
+
+def aplicar(estoque, movimentos):
+    """Estoque por (freezer, sabor) depois de aplicar os movimentos"""
+    resultado = defaultdict(int)
+    for linha in estoque:
+        resultado[(linha["freezer_id"], linha["sabor"])] += linha["quantidade"]
+    for sabor, origem, destino, quantidade in movimentos:
+        resultado[(origem, sabor)] -= quantidade
+        resultado[(destino, sabor)] += quantidade
+    return resultado
+
+
+@pytest.mark.parametrize("freezers, sabores, semente", [(12, 8, 1), (30, 20, 2), (300, 200, 3)])
+def test_plano_respeita_estoque_e_ocupacao_alvo(freezers, sabores, semente):
+    lista_freezers, estoque = cenario(freezers, sabores, semente=semente)
+    ocupacao_alvo = 0.9
+    plano = planejar_rebalanceamento(lista_freezers, estoque, ocupacao_alvo=ocupacao_alvo)
+
+    assert plano["movimentos"]
+    assert all(origem != destino for _, origem, destino, _ in plano["movimentos"])
+    assert all(quantidade > 0 for *_, quantidade in plano["movimentos"])
+
+    final = aplicar(estoque, plano["movimentos"])
+    assert min(final.values()) >= 0
+
+    ocupado = defaultdict(int)
+    for (freezer_id, _), quantidade in final.items():
+        ocupado[freezer_id] += quantidade
+    destinos = {destino for _, _, destino, _ in plano["movimentos"]}
+    for freezer in lista_freezers:
+        if freezer["id"] in destinos:
+            assert ocupado[freezer["id"]] <= int(freezer["capacidade_total"] * ocupacao_alvo)
+        else:
+            assert ocupado[freezer["id"]] <= freezer["ocupado"]
+
+    assert plano["resumo"]["picoles"] == sum(q for *_, q in plano["movimentos"])
+    assert plano["resumo"]["transferencias"] == len(plano["movimentos"])
+
+
+def test_vencendo_tem_prioridade_sobre_o_minimo():
+    # O Aberto só tem espaço para 5 picolés: o Limão perto do vencimento passa
+    # na frente da Uva, que está abaixo do mínimo mas não vence
+    freezers = [
+        {"id": 1, "ambiente": ESTOQUE_ABERTO, "capacidade_total": 100, "ocupado": 85},
+        {"id": 2, "ambiente": ESTOQUE_FECHADO, "capacidade_total": 100, "ocupado": 50},
+        {"id": 3, "ambiente": ESTOQUE_FECHADO, "capacidade_total": 100, "ocupado": 50},
+    ]
+    estoque = [
+        {"freezer_id": 1, "sabor": "Limão", "quantidade": 85, "vencendo": 0},
+        {"freezer_id": 2, "sabor": "Limão", "quantidade": 50, "vencendo": 5},
+        {"freezer_id": 3, "sabor": "Uva", "quantidade": 50, "vencendo": 0},
+    ]
+    plano = planejar_rebalanceamento(freezers, estoque, minimo_por_sabor=10, ocupacao_alvo=0.9)
+
+    assert plano["movimentos"] == [("Limão", 2, 1, 5)]
+
+
+def test_sem_metas_nada_se_move():
+    freezers = [
+        {"id": 1, "ambiente": ESTOQUE_ABERTO, "capacidade_total": 100, "ocupado": 30},
+        {"id": 2, "ambiente": ESTOQUE_FECHADO, "capacidade_total": 100, "ocupado": 40},
+    ]
+    estoque = [
+        {"freezer_id": 1, "sabor": "Limão", "quantidade": 30, "vencendo": 0},
+        {"freezer_id": 2, "sabor": "Limão", "quantidade": 40, "vencendo": 0},
+    ]
+    plano = planejar_rebalanceamento(freezers, estoque, minimo_por_sabor=20)
+
+    assert plano["movimentos"] == []
+    assert plano["resumo"]["picoles"] == 0
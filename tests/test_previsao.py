@@ -0,0 +1,127 @@
+"""Testes da previsão de demanda e do ponto de reposição (model/previsao.py)"""
+from datetime import date, timedelta
+
+import pytest
+
+from model.previsao import periodo_previsao, prever_estoque
+
+HOJE = date(2026, 6, 1)
+
+
+def vendas_constantes(sabor, por_dia, dias):
+    """Histórico com `por_dia` unidades vendidas em cada um dos últimos `dias` dias"""
+    return [(HOJE - timedelta(days=d), sabor, por_dia) for d in range(1, dias + 1)]
+
+
+def por_freezer(resultado):
+    return {(linha["sabor"], linha["freezer_id"]): linha for linha in resultado}
+
+
+def test_sem_estoque_nao_ha_previsao():
+    assert prever_estoque(vendas_constantes("Limão", 5, 30), [], [], HOJE) == []
+
+
+def test_historico_vazio_usa_limite_sem_historico():
+    resultado = prever_estoque([], [], [("Limão", 1, 8), ("Limão", 2, 12), ("Uva", 1, 0)], HOJE,
+                               limite_sem_historico=10)
+    linhas = por_freezer(resultado)
+
+    for linha in resultado:
+        assert linha["sem_historico"]
+        assert linha["ponto_reposicao"] == 10
+        assert linha["velocidade"] == 0
+    assert linhas[("Limão", 1)]["critico"] and not linhas[("Limão", 2)]["critico"]
+    assert linhas[("Limão", 1)]["dias_ate_ruptura"] is None
+    assert linhas[("Limão", 2)]["dias_ate_ruptura"] is None
+    # Sem estoque a ruptura já aconteceu, com ou sem histórico
+    assert linhas[("Uva", 1)]["dias_ate_ruptura"] == 0.0
+
+
+def test_limite_sem_historico_vale_so_para_sabores_sem_vendas():
+    historico = vendas_constantes("Limão", 4, 60)
+    linhas = por_freezer(prever_estoque(historico, [("Limão", 1, 100)], [("Limão", 1, 50), ("Uva", 1, 50)], HOJE,
+                                        limite_sem_historico=25))
+
+    assert not linhas[("Limão", 1)]["sem_historico"]
+    assert linhas[("Limão", 1)]["ponto_reposicao"] != 25
+    assert linhas[("Uva", 1)]["sem_historico"]
+    assert linhas[("Uva", 1)]["ponto_reposicao"] == 25
+
+
+def test_historico_de_um_dia():
+    linhas = por_freezer(prever_estoque([(HOJE - timedelta(days=1), "Limão", 14)], [("Limão", 1, 14)],
+                                        [("Limão", 1, 30)], HOJE))
+    linha = linhas[("Limão", 1)]
+
+    # Um dia de venda: sem semanas para o fator do dia da semana, a venda de ontem é a velocidade
+    assert not linha["sem_historico"]
+    assert linha["velocidade"] == pytest.approx(14.0, abs=0.01)
+    assert linha["ponto_reposicao"] == 42
+    assert linha["dias_ate_ruptura"] == pytest.approx(30 / 14, abs=0.1)
+
+
+def test_sabor_novo_nao_conta_os_dias_antes_da_primeira_venda():
+    # Limão vende há doze semanas; a Uva começou há uma semana com 10 por dia, sem variação
+    historico = vendas_constantes("Limão", 8, 84) + vendas_constantes("Uva", 10, 7)
+    linhas = por_freezer(prever_estoque(historico, [("Uva", 1, 70)], [("Uva", 1, 100)], HOJE))
+    linha = linhas[("Uva", 1)]
+
+    assert linha["velocidade"] == pytest.approx(10.0, abs=0.01)
+    assert linha["dias_ate_ruptura"] == pytest.approx(10.0, abs=0.1)
+    # Sem os zeros de antes da primeira venda o desvio é zero: o ponto é só a demanda do prazo
+    assert linha["ponto_reposicao"] == 30
+
+
+def test_vendas_fora_do_periodo_sao_ignoradas():
+    inicio, _, _ = periodo_previsao(HOJE)
+    historico = [(inicio - timedelta(days=1), "Limão", 50), (HOJE, "Limão", 50)]
+    linha = prever_estoque(historico, [], [("Limão", 1, 20)], HOJE)[0]
+
+    assert linha["sem_historico"]
+
+
+@pytest.mark.parametrize("dias", [364, 371, 385, 420])
+def test_pouco_mais_de_um_ano_de_historico_nao_infla_a_sazonalidade(dias):
+    # Sem vendas antes do início do histórico, a base do ano passado ficaria parcialmente zerada
+    linha = prever_estoque(vendas_constantes("Limão", 8, dias), [("Limão", 1, 10)], [("Limão", 1, 100)], HOJE)[0]
+
+    assert linha["velocidade"] == pytest.approx(8.0, abs=0.01)
+    assert linha["ponto_reposicao"] == 24
+    assert linha["dias_ate_ruptura"] == pytest.approx(12.5, abs=0.1)
+
+
+def test_demanda_dividida_pela_participacao_dos_freezers():
+    historico = vendas_constantes("Limão", 8, 84)
+    participacoes = [("Limão", 1, 30), ("Limão", 2, 10)]
+    linhas = por_freezer(prever_estoque(historico, participacoes, [("Limão", 1, 100), ("Limão", 2, 100)], HOJE))
+
+    assert linhas[("Limão", 1)]["velocidade"] == pytest.approx(6.0, abs=0.01)
+    assert linhas[("Limão", 2)]["velocidade"] == pytest.approx(2.0, abs=0.01)
+
+
+def test_sem_participacao_divide_pelo_estoque():
+    historico = vendas_constantes("Limão", 8, 84)
+    linhas = por_freezer(prever_estoque(historico, [], [("Limão", 1, 60), ("Limão", 2, 20)], HOJE))
+
+    assert linhas[("Limão", 1)]["velocidade"] == pytest.approx(6.0, abs=0.01)
+    assert linhas[("Limão", 2)]["velocidade"] == pytest.approx(2.0, abs=0.01)
+
+
+def test_dias_ate_ruptura_com_demanda_constante():
+    # Doze semanas inteiras de histórico: fatores do dia da semana e curva sazonal planos,
+    # 6 por dia no freezer 1 e 2 no freezer 2
+    historico = vendas_constantes("Limão", 8, 84)
+    participacoes = [("Limão", 1, 30), ("Limão", 2, 10)]
+    estoque = [("Limão", 1, 45), ("Limão", 2, 45), ("Limão", 3, 1000)]
+    resultado = prever_estoque(historico, participacoes, estoque, HOJE, prazo_reposicao=3)
+    linhas = por_freezer(resultado)
+
+    assert linhas[("Limão", 1)]["dias_ate_ruptura"] == pytest.approx(7.5, abs=0.1)
+    assert linhas[("Limão", 2)]["dias_ate_ruptura"] == pytest.approx(22.5, abs=0.1)
+    # O freezer 3 não vendeu na janela recente: não tem parte na demanda e não acaba no horizonte
+    assert linhas[("Limão", 3)]["dias_ate_ruptura"] is None
+    # Sem variação nas vendas o estoque de segurança é zero: o ponto é a demanda do prazo
+    assert linhas[("Limão", 1)]["ponto_reposicao"] == 18
+    assert linhas[("Limão", 2)]["ponto_reposicao"] == 6
+    # Das rupturas mais próximas para as mais distantes
+    assert [linha["freezer_id"] for linha in resultado] == [1, 2, 3]
@@ -0,0 +1,305 @@
+"""API HTTP do PDV, para os terminais de venda com leitor de código de barras.
+
+Expõe as operações de venda do ControladorItem em JSON, sem passar pelo
+Streamlit: cada leitura de código ou venda é uma requisição curta, atendida
+por uma thread do servidor e pelo pool de conexões do processo. O app
+Streamlit continua sendo a retaguarda (cadastros, estoque, financeiro).
+
+Rotas:
+    GET    /saude
+    GET    /produtos/<codigo_barras>
+    POST   /carrinho/validar    {"itens": [{"codigo_barras", "quantidade"[, "id"]}], "reserva_cupom"}
+    POST   /cupons/reservas     {"codigo"}
+    DELETE /cupons/reservas/<id>
+    POST   /vendas              {"itens", "operador", "forma_pagamento", "reserva_cupom", "chave"}
+    GET    /recibos/<id>
+    GET    /recibos/<id>.pdf    (gerado no primeiro pedido; 202 até ficar pronto)
+
+O cabeçalho `X-Terminal` identifica o terminal, para que ele leia as próprias
+escritas quando houver réplica de leitura.
+
+Uso:
+    python -m view.api_pdv --porta 8600
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from controller.controlador_item import ControladorItem
+from controller.gerador_recibos import montar_texto_recibo, nome_arquivo_recibo
+
+TAMANHO_MAXIMO_CORPO = 1024 * 1024
+
+
+def _json_padrao(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    raise TypeError(f"{type(valor).__name__} não é serializável em JSON")
+
+
+class RecibosRecentes:
+    """Recibos das últimas vendas da API, por id, para os terminais buscarem depois.
+
+    O texto sai na resposta da venda; o PDF só é gerado quando algum terminal
+    o pede, para que a geração não acumule fila com centenas de vendas por
+    segundo.
+    """
+
+    def __init__(self, controlador, maximo=1000):
+        self.controlador = controlador
+        self.maximo = maximo
+        self._recibos = OrderedDict()
+        self._trava = threading.Lock()
+
+    def guardar(self, venda):
+        identificador = uuid.uuid4().hex
+        with self._trava:
+            self._recibos[identificador] = {"venda": venda, "trabalho": None}
+            while len(self._recibos) > self.maximo:
+                self._recibos.popitem(last=False)
+        return identificador
+
+    def venda(self, identificador):
+        with self._trava:
+            recibo = self._recibos.get(identificador)
+            return recibo["venda"] if recibo else None
+
+    def pdf(self, identificador):
+        """TrabalhoRecibo do PDF, enviado para geração no primeiro pedido; None se o recibo não existe"""
+        with self._trava:
+            recibo = self._recibos.get(identificador)
+            if recibo is None:
+                return None
+            if recibo["trabalho"] is None:
+                recibo["trabalho"] = self.controlador.gerar_recibo(recibo["venda"])
+            return recibo["trabalho"]
+
+
+class ErroRequisicao(Exception):
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+
+class ManipuladorPDV(BaseHTTPRequestHandler):
+    """Uma requisição da API; o controlador e os recibos são do servidor"""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "SorveteriaPDV/1.0"
+
+    # ---- respostas ----
+
+    def _responder(self, status, corpo=None, tipo="application/json; charset=utf-8"):
+        if corpo is None:
+            dados = b""
+        elif isinstance(corpo, bytes):
+            dados = corpo
+        else:
+            dados = json.dumps(corpo, ensure_ascii=False, default=_json_padrao).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(dados)
+
+    def _receber_corpo(self):
+        """Lê o corpo inteiro antes de rotear, para a conexão keep-alive seguir utilizável mesmo em erro"""
+        try:
+            tamanho = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            tamanho = -1
+        if not 0 <= tamanho <= TAMANHO_MAXIMO_CORPO:
+            self.close_connection = True
+            raise ErroRequisicao(HTTPStatus.REQUEST_ENTITY_TOO_LARGE if tamanho > 0 else HTTPStatus.BAD_REQUEST,
+                                 "Corpo da requisição inválido ou grande demais.")
+        return self.rfile.read(tamanho) if tamanho else b""
+
+    def _ler_json(self):
+        try:
+            corpo = json.loads(self._corpo or b"{}")
+        except ValueError:
+            raise ErroRequisicao(HTTPStatus.BAD_REQUEST, "Corpo da requisição não é um JSON válido.")
+        if not isinstance(corpo, dict):
+            raise ErroRequisicao(HTTPStatus.BAD_REQUEST, "O corpo da requisição deve ser um objeto JSON.")
+        return corpo
+
+    @staticmethod
+    def _itens(corpo):
+        itens = corpo.get("itens")
+        if not isinstance(itens, list) or not all(isinstance(item, dict) for item in itens):
+            raise ErroRequisicao(HTTPStatus.BAD_REQUEST, "Informe \"itens\" como uma lista de objetos.")
+        return itens
+
+    def _tratar(self, rotas):
+        partes = [parte for parte in self.path.split("?", 1)[0].split("/") if parte]
+        rota = rotas.get(partes[0] if partes else "")
+        controlador = self.server.controlador
+        pagina = f"API {self.command} /{partes[0] if partes else ''}"
+        controlador.definir_sessao(self.headers.get("X-Terminal") or self.client_address[0])
+        controlador.iniciar_pagina(pagina)
+        try:
+            self._corpo = self._receber_corpo()
+            if rota is None:
+                raise ErroRequisicao(HTTPStatus.NOT_FOUND, "Rota não encontrada.")
+            rota(self, partes[1:])
+        except ErroRequisicao as e:
+            self._responder(e.status, {"sucesso": False, "mensagem": str(e)})
+        except Exception as e:
+            print(f"❌ Erro na API do PDV ({self.command} {self.path}): {e}")
+            self._responder(HTTPStatus.INTERNAL_SERVER_ERROR, {"sucesso": False, "mensagem": "Erro interno."})
+        finally:
+            controlador.finalizar_pagina()
+
+    def do_GET(self):
+        self._tratar({"saude": ManipuladorPDV._saude, "produtos": ManipuladorPDV._produto, "recibos": ManipuladorPDV._recibo})
+
+    def do_POST(self):
+        self._tratar({"carrinho": ManipuladorPDV._validar_carrinho, "cupons": ManipuladorPDV._reservar_cupom,
+                      "vendas": ManipuladorPDV._vender})
+
+    def do_DELETE(self):
+        self._tratar({"cupons": ManipuladorPDV._liberar_cupom})
+
+    def log_message(self, formato, *args):
+        if self.server.verboso:
+            super().log_message(formato, *args)
+
+    # ---- rotas ----
+
+    def _saude(self, partes):
+        controlador = self.server.controlador
+        diario = controlador.diario.resumo()
+        self._responder(HTTPStatus.OK, {
+            "status": "ok" if controlador.sincronizador.disponivel() else "offline",
+            "indice_codigos": controlador.indice_codigos.carregado,
+            "diario": {"pendentes": diario["pendentes"], "rejeitadas": diario["rejeitadas"], "pendente_desde": diario["pendente_desde"]},
+        })
+
+    def _produto(self, partes):
+        if len(partes) != 1:
+            raise ErroRequisicao(HTTPStatus.NOT_FOUND, "Rota não encontrada.")
+        lotes = self.server.controlador.buscar_por_codigo(partes[0])
+        if lotes is None:
+            raise ErroRequisicao(HTTPStatus.SERVICE_UNAVAILABLE, "Banco de dados indisponível.")
+        if not lotes:
+            raise ErroRequisicao(HTTPStatus.NOT_FOUND, "Produto não encontrado.")
+        self._responder(HTTPStatus.OK, {"codigo_barras": partes[0], "lotes": lotes})
+
+    def _validar_carrinho(self, partes):
+        if partes != ["validar"]:
+            raise ErroRequisicao(HTTPStatus.NOT_FOUND, "Rota não encontrada.")
+        corpo = self._ler_json()
+        sucesso, mensagem, resumo = self.server.controlador.validar_carrinho(self._itens(corpo), corpo.get("reserva_cupom"))
+        status = HTTPStatus.OK if sucesso else HTTPStatus.UNPROCESSABLE_ENTITY
+        self._responder(status, {"sucesso": sucesso, "mensagem": mensagem, **resumo})
+
+    def _reservar_cupom(self, partes):
+        if partes != ["reservas"]:
+            raise ErroRequisicao(HTTPStatus.NOT_FOUND, "Rota não encontrada.")
+        sucesso, mensagem, reserva = self.server.controlador.reservar_cupom(self._ler_json().get("codigo"))
+        status = HTTPStatus.CREATED if sucesso else HTTPStatus.UNPROCESSABLE_ENTITY
+        self._responder(status, {"sucesso": sucesso, "mensagem": mensagem, "reserva": reserva})
+
+    def _liberar_cupom(self, partes):
+        if len(partes) != 2 or partes[0] != "reservas" or not partes[1].isdigit():
+            raise ErroRequisicao(HTTPStatus.NOT_FOUND, "Rota não encontrada.")
+        sucesso, mensagem = self.server.controlador.liberar_cupom(int(partes[1]))
+        self._responder(HTTPStatus.OK if sucesso else HTTPStatus.UNPROCESSABLE_ENTITY, {"sucesso": sucesso, "mensagem": mensagem})
+
+    def _vender(self, partes):
+        if partes:
+            raise ErroRequisicao(HTTPStatus.NOT_FOUND, "Rota não encontrada.")
+        corpo = self._ler_json()
+        operador = str(corpo.get("operador") or "").strip()
+        forma_pagamento = str(corpo.get("forma_pagamento") or "").strip()
+        if not operador or not forma_pagamento:
+            raise ErroRequisicao(HTTPStatus.BAD_REQUEST, "Informe \"operador\" e \"forma_pagamento\".")
+
+        chave = corpo.get("chave")
+        if chave is not None and not (isinstance(chave, str) and 0 < len(chave) <= 64):
+            raise ErroRequisicao(HTTPStatus.BAD_REQUEST, "A \"chave\" da venda deve ter de 1 a 64 caracteres.")
+
+        sucesso, mensagem, resumo = self.server.controlador.vender(
+            self._itens(corpo), operador, forma_pagamento, corpo.get("reserva_cupom"), chave
+        )
+        if not sucesso:
+            # Falta de estoque (em geral, outro terminal vendeu antes) é conflito; o resto é carrinho inválido
+            status = HTTPStatus.CONFLICT if resumo["falhas"] and "disponivel" in resumo["falhas"][0] else HTTPStatus.UNPROCESSABLE_ENTITY
+            self._responder(status, {"sucesso": False, "mensagem": mensagem, **resumo})
+            return
+
+        # Itens e totais do resumo são os gravados pela transação; venda já registrada (mesma chave) vem sem recibo
+        venda = resumo.pop("venda")
+        recibo = None
+        if venda is not None:
+            identificador = self.server.recibos.guardar(venda)
+            recibo = {"id": identificador, "texto": montar_texto_recibo(venda), "pdf": f"/recibos/{identificador}.pdf"}
+        self._responder(HTTPStatus.CREATED, {"sucesso": True, "mensagem": mensagem, **resumo, "recibo": recibo})
+
+    def _recibo(self, partes):
+        if len(partes) != 1:
+            raise ErroRequisicao(HTTPStatus.NOT_FOUND, "Rota não encontrada.")
+        identificador, _, extensao = partes[0].partition(".")
+        venda = self.server.recibos.venda(identificador)
+        if venda is None or extensao not in ("", "pdf"):
+            raise ErroRequisicao(HTTPStatus.NOT_FOUND, "Recibo não encontrado.")
+
+        if extensao == "":
+            self._responder(HTTPStatus.OK, {
+                "id": identificador, "texto": montar_texto_recibo(venda), "nome_arquivo": nome_arquivo_recibo(venda),
+                "pdf": f"/recibos/{identificador}.pdf"
+            })
+            return
+
+        trabalho = self.server.recibos.pdf(identificador)
+        if not trabalho.pronto():
+            self._responder(HTTPStatus.ACCEPTED, {"pronto": False, "mensagem": "O PDF do recibo está sendo gerado."})
+        elif trabalho.erro():
+            self._responder(HTTPStatus.INTERNAL_SERVER_ERROR, {"pronto": True, "mensagem": f"Erro ao gerar o recibo: {trabalho.erro()}"})
+        else:
+            self._responder(HTTPStatus.OK, trabalho.pdf(), tipo="application/pdf")
+
+
+class ServidorPDV(ThreadingHTTPServer):
+    """Servidor HTTP com uma thread por conexão; as conexões dos terminais ficam abertas (keep-alive)"""
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, endereco, controlador=None, verboso=False):
+        super().__init__(endereco, ManipuladorPDV)
+        self.controlador = controlador or ControladorItem()
+        self.recibos = RecibosRecentes(self.controlador)
+        self.verboso = verboso
+        # Carrega o índice de códigos antes de aceitar vendas
+        self.controlador.indice_codigos.iniciar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endereco", default=os.environ.get("SORVETERIA_API_ENDERECO", "127.0.0.1"))
+    parser.add_argument("--porta", type=int, default=int(os.environ.get("SORVETERIA_API_PORTA", "8600")))
+    parser.add_argument("--verboso", action="store_true", help="registra cada requisição no terminal")
+    args = parser.parse_args()
+
+    servidor = ServidorPDV((args.endereco, args.porta), verboso=args.verboso)
+    print(f"🍦 API do PDV em http://{args.endereco}:{servidor.server_port}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,49 @@
 import streamlit as st
 import os 
 import sys
+import json
+import uuid
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 from controller.controlador_item import ControladorItem
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
 import tempfile
 import pdfkit
-from fpdf import FPDF
 import os
 
 
 # Configuração da página
 st.set_page_config(page_title="App-Sorveteria-Raio-de-Sol")
 
-# Instanciando a Classe do Controlador
-controlador = ControladorItem()
+# Instanciando a Classe do Controlador uma única vez por processo (compartilhada entre sessões e reruns)
+@st.cache_resource
+def obter_controlador():
+    return ControladorItem()
+
+controlador = obter_controlador()
+
+LANCAMENTOS_POR_PAGINA = 50
 
 def interface():
+    controlador.definir_sessao(st.session_state.setdefault("sessao_id", uuid.uuid4().hex))
     st.title("🍦 Sorveteria Raio de Sol")
-    menu = st.sidebar.selectbox("Escolha uma opção:", ["Cadastrar Sorvete","Cadastrar Despesas Gerais","Cadastrar Eletrônico","Estoque Aberto", "Estoque Fechado","Transferencia de Produtos","Financeiro","PDV (Venda)","Cupons"])
+    opcoes = ["Cadastrar Sorvete","Cadastrar Despesas Gerais","Cadastrar Eletrônico","Estoque Aberto", "Estoque Fechado","Transferencia de Produtos","Financeiro","PDV (Venda)","Cupons"]
+    # Página oculta: aparece só com ?diagnostico=1 na URL ou SORVETERIA_DIAGNOSTICO=1
+    if st.query_params.get("diagnostico") == "1" or os.environ.get("SORVETERIA_DIAGNOSTICO") == "1":
+        opcoes.append("Diagnóstico")
+    menu = st.sidebar.selectbox("Escolha uma opção:", opcoes)
+    controlador.iniciar_pagina(menu)
+
+    cache = controlador.estatisticas_cache()
+    st.sidebar.caption(f"🗃️ Cache: {cache['acertos']} acertos | {cache['falhas']} falhas ({cache['taxa_acerto']}%) | TTL {cache['ttl']:.0f}s")
+
+    diario = controlador.obter_situacao_diario()
+    if diario["pendentes"] or diario["rejeitadas"] or not diario["banco_disponivel"]:
+        st.sidebar.warning(
+            f"📒 Diário offline: {diario['pendentes']} venda(s) aguardando o banco"
+            + (f", {diario['rejeitadas']} rejeitada(s)" if diario["rejeitadas"] else "")
+            + ("" if diario["banco_disponivel"] else " — banco indisponível")
+        )
 
     #Cadastrar Item
     if menu == "Cadastrar Sorvete":
@@ -51,44 +75,51 @@ def interface():
                     st.success(mensagem)
                 else:
                     st.error(mensagem)
-        else:          
+        else:
             st.warning("⚠️ Nenhum freezer disponível para cadastro. Libere espaço antes de adicionar novos itens!")
+
+        st.divider()
+        st.subheader("📦 Entrada em Lote (CSV)")
+        st.caption("Colunas: nome, sabor, valor_compra, valor_venda, quantidade, validade, freezer_id, codigo_barras")
+
+        arquivo_csv = st.file_uploader("Arquivo da entrega:", type=["csv"])
+        if arquivo_csv is not None and st.button("Dar Entrada"):
+            sucesso, mensagem, relatorio = controlador.importar_entrada_csv(arquivo_csv.getvalue())
+            if sucesso:
+                st.success(mensagem)
+            else:
+                st.error(mensagem)
+
+            rejeitadas = [linha for linha in relatorio if linha["status"] == "rejeitada"]
+            if rejeitadas:
+                st.warning(f"⚠️ {len(rejeitadas)} linha(s) rejeitada(s):")
+                st.dataframe(pd.DataFrame(rejeitadas).rename(columns={
+                    "linha": "Linha", "status": "Status", "motivo": "Motivo"
+                }), use_container_width=True)
       
     #Estoque Aberto
     elif menu == "Estoque Aberto":
         st.header("📦 Estoque Aberto - Visão Geral")
 
-        estoque = controlador.obter_estoque()
-        custo_armazenamento = controlador.obter_total_armazenamento()
-        limite_critico = 10
-        estoque_por_sabor_freezer = {}
+        ambiente = "Estoque Aberto"
+        dados_pagina = controlador.obter_pagina_estoque(ambiente, dias=10, desconto=0.30)
+        painel = dados_pagina["painel"]
+        custo_armazenamento = painel["total_armazenamento"]
 
-        for item in controlador.listar_itens():
-            chave = (item["sabor"], item["freezer_id"])
-            estoque_por_sabor_freezer[chave] = estoque_por_sabor_freezer.get(chave, 0) + item["quantidade"]
         itens_criticos = [
-            f"{sabor} - {quantidade} unidade(s) (Freezer {freezer_id})"
-            for (sabor, freezer_id), quantidade in estoque_por_sabor_freezer.items()
-            if quantidade <= limite_critico
+            f"{item['sabor']} - {item['quantidade']} unidade(s) (Freezer {item['freezer_id']}) · "
+            f"reposição em {item['ponto_reposicao']} un."
+            + (f" · acaba em ~{item['dias_ate_ruptura']:.0f} dia(s)" if item["dias_ate_ruptura"] is not None else "")
+            for item in dados_pagina["estoque_critico"]
         ]
         if itens_criticos:
             st.warning("⚠️ Atenção! Os seguintes produtos estão com estoque crítico em seus respectivos freezers:\n\n" + "\n".join(itens_criticos))
 
-        hoje = datetime.today().date()
-        limite_validade = hoje + timedelta(days=10)
-        produtos_promocao = []
-
-        for item in controlador.listar_itens():
-            validade = item.get("validade")
-
-            if validade and isinstance(validade, str):
-                validade = datetime.strptime(validade, "%d/%m/%Y").date()
-
-            if validade and validade <= limite_validade:  
-                preco_original = item["valor_venda"]
-                preco_promocional = round(preco_original * 0.7, 2)
-                produtos_promocao.append(f"🔔 {item['nome']} ({item['sabor']}) - Validade: {validade.strftime('%d/%m/%Y')} "
-                                        f"➡️ Sugestão de Promoção: **R$ {preco_promocional:.2f}** (de R$ {preco_original:.2f})")
+        produtos_promocao = [
+            f"🔔 {item['nome']} ({item['sabor']}) - Validade: {item['validade'].strftime('%d/%m/%Y')} "
+            f"➡️ Sugestão de Promoção: **R$ {item['preco_promocional']:.2f}** (de R$ {item['valor_venda']:.2f})"
+            for item in dados_pagina["produtos_vencendo"]
+        ]
 
         if produtos_promocao:
             st.warning("⚠️ **Atenção! Produtos próximos da validade:**\n\n" + "\n".join(produtos_promocao))
@@ -96,10 +127,12 @@ def interface():
 
         st.markdown("---")
         preco_kwh = st.number_input("💡 Preço do kWh (R$):", min_value=0.0, value=0.90, format="%.2f")
-        ambiente = "Estoque Aberto"  
-        consumo_energia = controlador.obter_consumo_energia(preco_kwh, ambiente)
-        freezers = controlador.listar_status_freezers(ambiente)
-        estoque_ambiente = controlador.calcular_estoque_por_ambiente(ambiente)
+        consumo_energia = {
+            "consumo_mensal_kwh": painel["consumo_mensal_kwh"],
+            "custo_total": round(painel["consumo_mensal_kwh"] * preco_kwh, 2)
+        }
+        freezers = painel["freezers"]
+        estoque_ambiente = painel["estoque"]
 
         st.markdown("---")
         st.write(f"📦 {ambiente}: **{estoque_ambiente['quantidade']}** — 💰 Valor: **R$ {estoque_ambiente['valor']:.2f}**")
@@ -109,7 +142,7 @@ def interface():
 
         st.markdown("---")
         st.subheader(f"🏆 Principais Produtos no Estoque")
-        top_produtos = controlador.obter_top_produtos(ambiente=ambiente)
+        top_produtos = painel["top_produtos"]
         for i, (nome, quantidade) in enumerate(top_produtos, start=1):
             st.write(f"**{i}. {nome}** - {quantidade} unidades")
 
@@ -127,7 +160,7 @@ def interface():
         nome_produto = st.text_input(f"Digite o nome do produto no Estoque")
 
         if st.button("Buscar") or nome_produto == "":
-            resultados = controlador.buscar_produto(nome_produto if nome_produto else None, ambiente=ambiente)
+            resultados = controlador.buscar_produto(nome_produto, ambiente=ambiente) if nome_produto else painel["produtos"]
             if resultados:
                 df_resultados = pd.DataFrame(resultados)
                 df_resultados["valor"] = df_resultados["valor"].apply(lambda x: f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
@@ -178,47 +211,37 @@ def interface():
     elif menu == "Estoque Fechado":
         st.header("🔒 Estoque Fechado - Visão Geral")
 
-        estoque = controlador.obter_estoque()
-        custo_armazenamento = controlador.obter_total_armazenamento()
-        limite_critico = 10
-        estoque_por_sabor_freezer = {}
+        ambiente = "Estoque Fechado"
+        dados_pagina = controlador.obter_pagina_estoque(ambiente, dias=10, desconto=0.30)
+        painel = dados_pagina["painel"]
+        custo_armazenamento = painel["total_armazenamento"]
 
-        for item in controlador.listar_itens():
-            chave = (item["sabor"], item["freezer_id"])
-            estoque_por_sabor_freezer[chave] = estoque_por_sabor_freezer.get(chave, 0) + item["quantidade"]
         itens_criticos = [
-            f"{sabor} - {quantidade} unidade(s) (Freezer {freezer_id})"
-            for (sabor, freezer_id), quantidade in estoque_por_sabor_freezer.items()
-            if quantidade <= limite_critico
+            f"{item['sabor']} - {item['quantidade']} unidade(s) (Freezer {item['freezer_id']}) · "
+            f"reposição em {item['ponto_reposicao']} un."
+            + (f" · acaba em ~{item['dias_ate_ruptura']:.0f} dia(s)" if item["dias_ate_ruptura"] is not None else "")
+            for item in dados_pagina["estoque_critico"]
         ]
         if itens_criticos:
             st.warning("⚠️ Atenção! Os seguintes produtos estão com estoque crítico em seus respectivos freezers:\n\n" + "\n".join(itens_criticos))
         
-        hoje = datetime.today().date()
-        limite_validade = hoje + timedelta(days=10)
-        produtos_promocao = []
-
-        for item in controlador.listar_itens():
-            validade = item.get("validade")
-
-            if validade and isinstance(validade, str):
-                validade = datetime.strptime(validade, "%d/%m/%Y").date()
-
-            if validade and validade <= limite_validade:  
-                preco_original = item["valor_venda"]
-                preco_promocional = round(preco_original * 0.7, 2)
-                produtos_promocao.append(f"🔔 {item['nome']} ({item['sabor']}) - Validade: {validade.strftime('%d/%m/%Y')} "
-                                        f"➡️ Sugestão de Promoção: **R$ {preco_promocional:.2f}** (de R$ {preco_original:.2f})")
+        produtos_promocao = [
+            f"🔔 {item['nome']} ({item['sabor']}) - Validade: {item['validade'].strftime('%d/%m/%Y')} "
+            f"➡️ Sugestão de Promoção: **R$ {item['preco_promocional']:.2f}** (de R$ {item['valor_venda']:.2f})"
+            for item in dados_pagina["produtos_vencendo"]
+        ]
 
         if produtos_promocao:
             st.warning("⚠️ **Atenção! Produtos próximos da validade:**\n\n" + "\n".join(produtos_promocao))
 
         st.markdown("---")
         preco_kwh = st.number_input("💡 Preço do kWh (R$):", min_value=0.0, value=0.90, format="%.2f")
-        ambiente = "Estoque Fechado"  
-        consumo_energia = controlador.obter_consumo_energia(preco_kwh, ambiente)
-        freezers = controlador.listar_status_freezers(ambiente)
-        estoque_ambiente = controlador.calcular_estoque_por_ambiente(ambiente)
+        consumo_energia = {
+            "consumo_mensal_kwh": painel["consumo_mensal_kwh"],
+            "custo_total": round(painel["consumo_mensal_kwh"] * preco_kwh, 2)
+        }
+        freezers = painel["freezers"]
+        estoque_ambiente = painel["estoque"]
 
         st.markdown("---")
         st.write(f"📦 {ambiente}: **{estoque_ambiente['quantidade']}** — 💰 Valor: **R$ {estoque_ambiente['valor']:.2f}**")
@@ -228,7 +251,7 @@ def interface():
 
         st.markdown("---")
         st.subheader(f"🏆 Principais Produtos no Estoque")
-        top_produtos = controlador.obter_top_produtos(ambiente=ambiente)
+        top_produtos = painel["top_produtos"]
         for i, (nome, quantidade) in enumerate(top_produtos, start=1):
             st.write(f"**{i}. {nome}** - {quantidade} unidades")
 
@@ -246,7 +269,7 @@ def interface():
         nome_produto = st.text_input(f"Digite o nome do produto no Estoque")
 
         if st.button("Buscar") or nome_produto == "":
-            resultados = controlador.buscar_produto(nome_produto if nome_produto else None, ambiente=ambiente)
+            resultados = controlador.buscar_produto(nome_produto, ambiente=ambiente) if nome_produto else painel["produtos"]
             if resultados:
                 df_resultados = pd.DataFrame(resultados)
                 df_resultados["valor"] = df_resultados["valor"].apply(lambda x: f"R$ {x:,.2f}".replace(",", "X").replace(".", ",").replace("X", "."))
@@ -267,11 +290,14 @@ def interface():
     elif menu == "Transferencia de Produtos":
         st.subheader("📦 Transferencia de Produtos")
 
+        if "transferencias" not in st.session_state:
+            st.session_state.transferencias = []
+
         sabores = {item["sabor"] for item in controlador.listar_itens()}
         sabor = st.selectbox("Escolha o sabor:", list(sabores))
 
-        freezers_disponiveis = controlador.banco.listar_status_freezers("Estoque Aberto") + controlador.banco.listar_status_freezers("Estoque Fechado")
-        quantidades_por_freezer = controlador.banco.obter_quantidade_por_sabor()
+        freezers_disponiveis = controlador.listar_status_freezers("Estoque Aberto") + controlador.listar_status_freezers("Estoque Fechado")
+        quantidades_por_freezer = controlador.obter_quantidade_por_sabor()
 
         freezers_info = {
             freezer["id"]: {
@@ -322,14 +348,59 @@ def interface():
                 if quantidade_maxima > 0:
                     quantidade = st.number_input("Quantidade a ser movida:", min_value=1, max_value=quantidade_maxima, step=1)
 
-                    if st.button("Mover"):
+                    col_mover, col_lista = st.columns(2)
+                    if col_mover.button("Mover"):
                         sucesso, mensagem = controlador.mover_picole(sabor, freezer_origem, freezer_destino, quantidade)
                         if sucesso:
                             st.success(mensagem)
                         else:
                             st.error(mensagem)
+                    if col_lista.button("Adicionar à Lista"):
+                        st.session_state.transferencias.append((sabor, freezer_origem, freezer_destino, quantidade))
                 else:
                     st.warning("⚠️ Não há picolés suficientes para mover ou o freezer de destino está cheio.")
+
+        with st.expander("🤖 Rebalanceamento Automático"):
+            col1, col2, col3 = st.columns(3)
+            minimo_por_sabor = col1.number_input("Mínimo por sabor no Aberto:", min_value=0, value=20, step=1)
+            ocupacao_alvo = col2.slider("Ocupação alvo (%):", min_value=50, max_value=100, value=90)
+            dias_vencimento = col3.number_input("Vencendo em até (dias):", min_value=0, value=10, step=1)
+
+            col_simular, col_executar = st.columns(2)
+            simular = col_simular.button("Simular Plano")
+            executar = col_executar.button("Executar Plano")
+            if simular or executar:
+                plano = controlador.rebalancear_freezers(minimo_por_sabor, ocupacao_alvo / 100, dias_vencimento, executar=executar)
+                if plano["sucesso"]:
+                    st.success(plano["mensagem"])
+                else:
+                    st.error(plano["mensagem"])
+                    for falha in plano["falhas"]:
+                        st.error(f"❌ {falha['sabor'] + ': ' if falha['sabor'] else ''}{falha['motivo']}")
+                if plano["movimentos"]:
+                    st.dataframe(pd.DataFrame(plano["movimentos"], columns=["Sabor", "Origem", "Destino", "Quantidade"]),
+                                 use_container_width=True)
+
+        # Várias transferências executadas juntas, em uma única transação
+        if st.session_state.transferencias:
+            st.divider()
+            st.subheader("📋 Transferências Pendentes")
+            st.dataframe(pd.DataFrame(st.session_state.transferencias, columns=["Sabor", "Origem", "Destino", "Quantidade"]),
+                         use_container_width=True)
+
+            col_executar, col_limpar = st.columns(2)
+            if col_executar.button("Executar Transferências"):
+                sucesso, mensagem, falhas = controlador.transferir_picoles(st.session_state.transferencias)
+                if sucesso:
+                    st.session_state.transferencias = []
+                    st.success(mensagem)
+                else:
+                    st.error(mensagem)
+                    for falha in falhas:
+                        st.error(f"❌ {falha['sabor'] + ': ' if falha['sabor'] else ''}{falha['motivo']}")
+            if col_limpar.button("Limpar Lista"):
+                st.session_state.transferencias = []
+                st.rerun()
         
     elif menu == "Financeiro":
         st.subheader("💰 Lançar Receita ou Despesa")
@@ -360,11 +431,10 @@ def interface():
             st.warning("⚠️ A data inicial não pode ser maior que a final.")
             return
 
-        resultados = controlador.listar_lancamentos(data_inicio, data_fim)
-
-        receitas = sum(l["valor"] for l in resultados if l["tipo"] == "Receita")
-        despesas = sum(l["valor"] for l in resultados if l["tipo"] == "Despesa")
-        saldo = receitas - despesas
+        totais, facetas = controlador.obter_resumo_financeiro_periodo(data_inicio, data_fim)
+        receitas = totais["receitas"]
+        despesas = totais["despesas"]
+        saldo = totais["saldo"]
 
         col1, col2, col3 = st.columns(3)
         col1.metric("💰 Total de Receitas", f"R$ {receitas:.2f}")
@@ -375,21 +445,34 @@ def interface():
         st.divider()
         st.subheader("📂 Filtros e Tabela Completa de Lançamentos")
 
-        tipos_disponiveis = list(set(l["tipo"] for l in resultados))
-        categorias_disponiveis = list(set(l["categoria"] for l in resultados))
-        operadores_disponiveis = list(set(l["operador"] for l in resultados))
+        tipos_disponiveis = facetas["tipos"]
+        categorias_disponiveis = facetas["categorias"]
+        operadores_disponiveis = facetas["operadores"]
 
         tipo_filtro = st.multiselect("Filtrar por Tipo:", tipos_disponiveis, default=tipos_disponiveis)
         categoria_filtro = st.multiselect("Filtrar por Categoria:", categorias_disponiveis, default=categorias_disponiveis)
         operador_filtro = st.multiselect("Filtrar por Operador:", operadores_disponiveis, default=operadores_disponiveis)
 
-        filtrados = [
-            l for l in resultados
-            if l["tipo"] in tipo_filtro and l["categoria"] in categoria_filtro and l["operador"] in operador_filtro
-        ]
+        # Filtro com todas as opções marcadas não precisa restringir a consulta
+        filtros = (
+            None if len(tipo_filtro) == len(tipos_disponiveis) else tipo_filtro,
+            None if len(categoria_filtro) == len(categorias_disponiveis) else categoria_filtro,
+            None if len(operador_filtro) == len(operadores_disponiveis) else operador_filtro
+        )
+
+        # Pilha de cursores das páginas visitadas; volta ao início quando período ou filtros mudam
+        chave_filtros = (data_inicio, data_fim, filtros)
+        if st.session_state.get("financeiro_filtros") != chave_filtros:
+            st.session_state.financeiro_filtros = chave_filtros
+            st.session_state.financeiro_cursores = [None]
+
+        cursores = st.session_state.financeiro_cursores
+        lancamentos, proximo, por_dia = controlador.obter_lancamentos_e_grafico(
+            data_inicio, data_fim, *filtros, limite=LANCAMENTOS_POR_PAGINA, apos=cursores[-1]
+        )
 
         # Cria DataFrame e exibe
-        df_filtrado = pd.DataFrame(filtrados)
+        df_filtrado = pd.DataFrame(lancamentos)
         if not df_filtrado.empty:
             df_filtrado["valor"] = df_filtrado["valor"].map(lambda x: f"R$ {x:.2f}")
             st.dataframe(df_filtrado.rename(columns={
@@ -403,25 +486,29 @@ def interface():
             }), use_container_width=True)
         else:
             st.info("⚠️ Nenhum lançamento encontrado com os filtros aplicados.")
+
+        col_anterior, col_pagina, col_proxima = st.columns([1, 2, 1])
+        if col_anterior.button("⬅️ Anterior", disabled=len(cursores) == 1):
+            cursores.pop()
+            st.rerun()
+        col_pagina.caption(f"Página {len(cursores)} · {LANCAMENTOS_POR_PAGINA} lançamentos por página")
+        if col_proxima.button("Próxima ➡️", disabled=proximo is None):
+            cursores.append(proximo)
+            st.rerun()
         
         st.divider()
         st.subheader("📊 Gráfico de Receita vs Despesa por Data")
 
-        df = pd.DataFrame(resultados)
-        if not df.empty:
-            df["data"] = pd.to_datetime(df["data"], format="%d/%m/%Y")  # aplica o formato correto
-
-            resumo = df.groupby(["data", "tipo"])["valor"].sum().reset_index()
-            pivotado = resumo.pivot(index="data", columns="tipo", values="valor").fillna(0)
-
+        if por_dia:
+            pivotado = pd.DataFrame(por_dia, columns=["data", "Receita", "Despesa"]).set_index("data")
             st.line_chart(pivotado)
         else:
             st.info("Sem dados suficientes para gerar o gráfico.")
         
         st.divider()
 
-        with st.expander("📄 Ver todos os lançamentos detalhados"):
-            for lancamento in resultados:
+        with st.expander("📄 Ver lançamentos detalhados da página"):
+            for lancamento in lancamentos:
                 col1, col2 = st.columns([6, 1])
                 with col1:
                     st.markdown(
@@ -432,7 +519,31 @@ def interface():
                     if st.button("🗑️", key=f"del_{lancamento['id']}"):
                         controlador.excluir_lancamento_financeiro(lancamento['id'])
                         st.rerun()
-    
+
+        with st.expander("🍧 Vendas por Sabor e Produto no período"):
+            por_sabor = controlador.obter_vendas_por_sabor(data_inicio, data_fim)
+            if por_sabor:
+                sabor_escolhido = st.selectbox(
+                    "Produtos do sabor:", ["Todos"] + [linha["sabor"] for linha in por_sabor], key="vendas_sabor"
+                )
+                col_sabor, col_produto = st.columns(2)
+                col_sabor.dataframe(pd.DataFrame(por_sabor).rename(columns={
+                    "sabor": "Sabor", "quantidade": "Quantidade", "receita": "Receita (R$)"
+                }), use_container_width=True)
+                por_produto = controlador.obter_vendas_por_produto(
+                    data_inicio, data_fim, None if sabor_escolhido == "Todos" else sabor_escolhido
+                )
+                col_produto.dataframe(pd.DataFrame(por_produto).rename(columns={
+                    "nome": "Produto", "sabor": "Sabor", "quantidade": "Quantidade", "receita": "Receita (R$)"
+                }), use_container_width=True)
+            else:
+                st.info("Nenhuma venda com itens no período.")
+
+        with st.expander("🧾 Reemitir recibos do período"):
+            if st.button("Reemitir Recibos"):
+                arquivos = controlador.reemitir_recibos(data_inicio, data_fim)
+                st.success(f"✅ {len(arquivos)} recibo(s) gerado(s) na pasta recibos/.")
+
     elif menu == "PDV (Venda)":
         st.subheader("🛒 Ponto de Venda (PDV)")
 
@@ -456,21 +567,29 @@ def interface():
                 if not codigo:
                     st.warning("⚠️ Código de barras não informado.")
                 else:
-                    item = controlador.banco.buscar_item_por_codigo(codigo)
-                    if item:
-                        if item["quantidade"] < quantidade:
-                            st.error(f"❌ Apenas {item['quantidade']} unidade(s) disponíveis em estoque.")
+                    lotes = controlador.buscar_por_codigo(codigo)
+                    if lotes is None:
+                        st.error("❌ Banco de dados indisponível e índice de códigos ainda não carregado; "
+                                 "não é possível buscar o produto agora.")
+                    elif lotes:
+                        # Os lotes que vencem primeiro saem primeiro; a quantidade pode ocupar vários lotes
+                        linhas, falhas = controlador.montar_carrinho([{"codigo_barras": codigo, "quantidade": quantidade}])
+                        if falhas:
+                            st.error(f"❌ Apenas {falhas[0].get('disponivel', 0)} unidade(s) disponíveis "
+                                     f"em {len(lotes)} lote(s).")
                         else:
-                            item["vendendo"] = quantidade
-                            st.session_state.carrinho.append(item)
-                            st.success(f"✅ Produto '{item['nome']} - {item['sabor']}' adicionado ao carrinho.")
+                            for linha in linhas:
+                                st.session_state.carrinho.append(dict(linha, vendendo=linha["quantidade"]))
+                            st.success(f"✅ Produto '{linhas[0]['nome']} - {linhas[0]['sabor']}' adicionado ao carrinho"
+                                       f"{f' ({len(linhas)} lotes)' if len(linhas) > 1 else ''}.")
                     else:
                         # Se não achou pelo código, permite selecionar manualmente
                         todos = controlador.listar_itens()
                         lista_produtos = [f"{i['nome']} - {i['sabor']} | Estoque: {i['quantidade']}" for i in todos if i['quantidade'] > 0]
                         escolhido = st.selectbox("🔎 Produto não encontrado. Selecione manualmente:", lista_produtos)
                         if escolhido:
-                            i = todos[lista_produtos.index(escolhido)]
+                            # Copia o item: a lista vem do cache compartilhado entre as sessões
+                            i = dict([p for p in todos if p['quantidade'] > 0][lista_produtos.index(escolhido)])
                             if i["quantidade"] < quantidade:
                                 st.error(f"❌ Apenas {i['quantidade']} unidade(s) disponíveis.")
                             else:
@@ -492,7 +611,7 @@ def interface():
                 with col3:
                     st.write(f"Qtd. vendida: {item['vendendo']}")
                 with col4:
-                    st.write(f"Estoque: {item['quantidade']}")
+                    st.write(f"Lote: {item['id']}")
                 with col5:
                     if st.button("❌", key=f"del_{idx}"):
                         st.session_state.carrinho.pop(idx)
@@ -501,95 +620,140 @@ def interface():
 
             st.markdown(f"**💵 Subtotal:** R$ {total:.2f}")
 
-            # Cupom
+            # Cupom: o uso fica reservado até a venda ser finalizada ou o cupom ser removido
             with st.form("form_cupom"):
                 cupom_input = st.text_input("🎟️ Cupom de Desconto")
                 aplicar = st.form_submit_button("Aplicar Cupom")
                 if aplicar and cupom_input:
-                    sucesso, mensagem, valor_desconto = controlador.banco.aplicar_cupom(cupom_input, total)
-                    if valor_desconto > 0:
-                        st.session_state.cupom_aplicado = {"codigo": cupom_input, "valor": valor_desconto}
-                        st.success(f"✅ Cupom '{cupom_input}' aplicado! Desconto de R$ {valor_desconto:.2f}")
+                    sucesso, mensagem, reserva = controlador.reservar_cupom(cupom_input)
+                    if sucesso:
+                        if st.session_state.cupom_aplicado:
+                            controlador.liberar_cupom(st.session_state.cupom_aplicado["id"])
+                        st.session_state.cupom_aplicado = reserva
                     else:
-                        st.error("❌ Cupom inválido, expirado, esgotado ou não aplicável.")
-            
-            valor_desconto = 0.0 
-
-            if "cupom_input" in st.session_state and st.session_state.cupom_input_aplicado:
-                sucesso, mensagem, valor_desconto = controlador.banco.aplicar_cupom(
-                    st.session_state.cupom_input, total
-                )
-                if sucesso:
-                    st.success(mensagem)
-                else:
-                    st.warning(mensagem)
-                    valor_desconto = 0.0
+                        st.error(mensagem)
+
+            desconto = 0.0
+            cupom = st.session_state.cupom_aplicado
+            if cupom:
+                desconto = controlador.calcular_desconto_cupom(cupom["percentual_desconto"], total)
+                col_cupom, col_remover = st.columns([4, 1])
+                col_cupom.success(f"✅ Cupom '{cupom['codigo']}' aplicado! Desconto de R$ {desconto:.2f} "
+                                  f"(reservado até {cupom['expira_em'].strftime('%H:%M')})")
+                if col_remover.button("Remover Cupom"):
+                    controlador.liberar_cupom(cupom["id"])
+                    st.session_state.cupom_aplicado = None
+                    st.rerun()
 
-            desconto = st.session_state.cupom_aplicado["valor"] if st.session_state.cupom_aplicado else 0
-            total_final = total - valor_desconto
+            total_final = total - desconto
 
             forma_pagamento = st.selectbox("💳 Forma de Pagamento", ["Dinheiro", "Cartão", "Pix", "Outros"])
 
             st.markdown(f"**🧾 Total com Desconto:** R$ {total_final:.2f}")
 
             if st.button("Finalizar Venda"):
-                sucesso = True
-                descricao_itens = []
-                for item in st.session_state.carrinho:
-                    for _ in range(item["vendendo"]):
-                        ok, msg = controlador.banco.baixar_estoque(item["id"])
-                        if not ok:
-                            st.error(msg)
-                            sucesso = False
-                            break
-                    if not sucesso:
-                        break
-                    descricao_itens.append(f"{item['vendendo']}x {item['nome']} - {item['sabor']}")
+                linhas_venda = [
+                    {
+                        "id": item["id"],
+                        "nome": item["nome"],
+                        "sabor": item["sabor"],
+                        "valor_venda": item["valor_venda"],
+                        "quantidade": item["vendendo"],
+                        # Itens lidos pelo código são realocados aos lotes pela validade na hora da baixa
+                        "codigo_barras": item.get("codigo_barras")
+                    }
+                    for item in st.session_state.carrinho
+                ]
+                # Uma chave por carrinho: um clique repetido não registra a venda duas vezes
+                sucesso, mensagem, falhas, venda = controlador.finalizar_venda_com_carrinho(
+                    linhas_venda, operador, forma_pagamento, cupom=cupom,
+                    chave=st.session_state.setdefault("chave_venda", uuid.uuid4().hex)
+                )
 
-                if sucesso:
-                    descricao_venda = f"{operador} | " + " | ".join(descricao_itens)
-                    data_venda = datetime.now().date()
-
-                    categoria = f"Venda - {forma_pagamento}"
-                    controlador.banco.lancar_financeiro(
-                        tipo="Receita",
-                        categoria=categoria,
-                        descricao=descricao_venda,
-                        valor=total_final,
-                        data=data_venda,
-                        operador=operador
-                    )
+                if not sucesso:
+                    st.error(mensagem)
+                    for falha in falhas:
+                        st.error(f"❌ {falha['nome']} - {falha['sabor']}: solicitado {falha['solicitado']}, disponível {falha['disponivel']}")
 
-                    st.success("✅ Venda finalizada com sucesso!")
-
-                    with st.expander("🧾 Recibo da Venda", expanded=True):
-                        recibo = f"Recibo - {data_venda.strftime('%d/%m/%Y %H:%M:%S')}\nOperador: {operador}\n\n"
-                        for i in st.session_state.carrinho:
-                            linha = f"{i['vendendo']}x {i['nome']} - {i['sabor']} @ R$ {i['valor_venda']:.2f}"
-                            st.markdown(f"- {linha}")
-                            recibo += linha + "\n"
-                        recibo += f"\nSubtotal: R$ {total:.2f}\n"
-                        if desconto > 0:
-                            recibo += f"Desconto ({st.session_state.cupom_aplicado['codigo']}): -R$ {desconto:.2f}\n"
-                        recibo += f"Total Final: R$ {total_final:.2f}\nForma de Pagamento: {forma_pagamento}"
-
-                        pdf = FPDF()
-                        pdf.add_page()
-                        pdf.set_font("Arial", size=12)
-                        for linha in recibo.strip().split("\n"):
-                            pdf.cell(200, 10, txt=linha, ln=True)
-                        nome_arquivo = f"recibo_{data_venda.strftime('%Y%m%d_%H%M%S')}.pdf"
-                        caminho = f"recibos/{nome_arquivo}"
-                        os.makedirs("recibos", exist_ok=True)
-                        pdf.output(caminho)
-
-                        with open(caminho, "rb") as f:
-                            st.download_button("📥 Baixar Recibo em PDF", f, file_name=nome_arquivo)
+                if sucesso:
+                    st.success(mensagem)
+                    chave_venda = st.session_state.pop("chave_venda", None)
+
+                    # O PDF é gerado em segundo plano; a venda já está confirmada. Lotes e valores são os
+                    # gravados pela transação, que realoca os itens lidos pelo código ao estoque do momento
+                    if venda is not None:
+                        st.session_state.recibo = controlador.gerar_recibo({
+                            **venda,
+                            "chave": chave_venda,
+                            "operador": operador,
+                            "cupom": cupom["codigo"] if cupom else None,
+                            "forma_pagamento": forma_pagamento
+                        })
 
                     st.session_state.carrinho.clear()
                     st.session_state.cupom_aplicado = None
         else:
             st.info("🧺 O carrinho está vazio.")
+
+        recibo = st.session_state.get("recibo")
+        if recibo is not None:
+            with st.expander("🧾 Recibo da Venda", expanded=True):
+                st.text(recibo.texto)
+                if not recibo.pronto():
+                    st.info("⏳ Gerando o PDF do recibo...")
+                    st.button("🔄 Atualizar")
+                elif recibo.erro():
+                    st.error(f"❌ Erro ao gerar o recibo: {recibo.erro()}")
+                else:
+                    st.download_button("📥 Baixar Recibo em PDF", recibo.pdf(), file_name=recibo.nome_arquivo, mime="application/pdf")
+                if st.button("Fechar Recibo"):
+                    st.session_state.recibo = None
+                    st.rerun()
+
+        situacao = controlador.obter_situacao_diario()
+        with st.expander("📒 Diário de Vendas Offline", expanded=bool(situacao["pendentes"] or situacao["rejeitadas"])):
+            st.caption("Com o banco fora do ar, as vendas ficam guardadas neste computador e são enviadas automaticamente quando ele volta.")
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Aguardando o banco", situacao["pendentes"])
+            col2.metric("Rejeitadas", situacao["rejeitadas"])
+            col3.metric("Banco", "Disponível" if situacao["banco_disponivel"] else "Indisponível")
+            if situacao["pendente_desde"]:
+                st.write(f"⏳ Venda pendente mais antiga: {situacao['pendente_desde'].strftime('%d/%m/%Y %H:%M:%S')}")
+            if situacao["ultima_sincronizacao"]:
+                st.write(f"🔄 Último envio: {situacao['ultima_sincronizacao'].strftime('%d/%m/%Y %H:%M:%S')}")
+            if situacao["ultimo_erro"]:
+                st.error(f"❌ Último erro: {situacao['ultimo_erro']}")
+
+            if st.button("🔄 Sincronizar Agora"):
+                totais = controlador.sincronizar_diario()
+                st.success(f"✅ {totais['aplicadas']} venda(s) enviada(s), {totais['repetidas']} já registrada(s), "
+                           f"{totais['rejeitadas']} rejeitada(s).")
+
+            vendas_diario = controlador.listar_vendas_diario()
+            if vendas_diario:
+                st.dataframe(pd.DataFrame(vendas_diario).rename(columns={
+                    "chave": "Chave", "criada_em": "Registrada em", "situacao": "Situação", "tentativas": "Tentativas",
+                    "erro": "Erro", "operador": "Operador", "total": "Total (R$)"
+                }), use_container_width=True)
+                rejeitadas = [venda["chave"] for venda in vendas_diario if venda["situacao"] == "rejeitada"]
+                if rejeitadas:
+                    chave_reenvio = st.selectbox("Venda rejeitada para reenviar:", rejeitadas)
+                    if st.button("Reenviar Venda"):
+                        controlador.reenviar_venda_diario(chave_reenvio)
+                        st.rerun()
+
+            divergencias_estoque = [d for d in situacao["divergencias"] if "reserva_cupom" not in d]
+            divergencias_cupom = [d for d in situacao["divergencias"] if "reserva_cupom" in d]
+            if divergencias_estoque:
+                st.warning("⚠️ Vendas offline acima do estoque registrado (o lote foi zerado; confira o estoque físico):")
+                st.dataframe(pd.DataFrame(divergencias_estoque).rename(columns={
+                    "id": "Lote", "vendido": "Vendido", "em_estoque": "Em Estoque", "momento": "Momento"
+                }), use_container_width=True)
+            if divergencias_cupom:
+                st.warning("⚠️ Vendas offline com cupom cuja reserva venceu antes do envio e que passaram do limite de uso:")
+                st.dataframe(pd.DataFrame(divergencias_cupom).rename(columns={
+                    "chave": "Venda", "reserva_cupom": "Reserva", "cupom": "Cupom", "motivo": "Motivo", "momento": "Momento"
+                }), use_container_width=True)
         
     elif menu == "Cupons":
         st.subheader("🎟️ Gerenciar Cupons de Desconto")
@@ -627,7 +791,49 @@ def interface():
                         st.success(f"Cupom {cupom['codigo']} excluído com sucesso!")
                         st.rerun()
 
+    elif menu == "Diagnóstico":
+        st.subheader("🩺 Diagnóstico do Banco de Dados")
+
+        diagnostico = controlador.obter_diagnostico()
+        ativa = st.toggle("Instrumentação ativa", value=diagnostico["ativa"])
+        if ativa != diagnostico["ativa"]:
+            controlador.ativar_instrumentacao(ativa)
+            st.rerun()
+        st.caption(f"Coletando desde {diagnostico['desde'].strftime('%d/%m/%Y %H:%M:%S')}. "
+                   "As execuções de página também vão para o log JSON rotativo (SORVETERIA_INSTRUMENTACAO_LOG).")
+
+        col_zerar, col_prometheus, col_json = st.columns(3)
+        if col_zerar.button("🧹 Zerar Contadores"):
+            controlador.zerar_diagnostico()
+            st.rerun()
+        col_prometheus.download_button("📥 Métricas (Prometheus)", controlador.exportar_diagnostico_prometheus(),
+                                       file_name="sorveteria_metricas.txt", mime="text/plain")
+        col_json.download_button("📥 Execuções (JSON)", json.dumps(diagnostico, default=str, ensure_ascii=False, indent=2),
+                                 file_name="sorveteria_diagnostico.json", mime="application/json")
+
+        st.markdown("### 📄 Por página")
+        if diagnostico["por_pagina"]:
+            por_pagina = pd.DataFrame.from_dict(diagnostico["por_pagina"], orient="index").rename(columns={"chamadas": "execucoes"})
+            por_pagina["consultas_por_execucao"] = (por_pagina["consultas"] / por_pagina["execucoes"]).round(1)
+            st.dataframe(por_pagina.sort_values("consultas", ascending=False), use_container_width=True)
+        else:
+            st.info("Nenhuma execução de página registrada. Ative a instrumentação e navegue pelo app.")
+
+        st.markdown("### 🧩 Por método do banco")
+        if diagnostico["por_metodo"]:
+            por_metodo = pd.DataFrame.from_dict(diagnostico["por_metodo"], orient="index")
+            st.dataframe(por_metodo.sort_values("tempo_ms", ascending=False), use_container_width=True)
+
+        st.markdown("### 🕒 Últimas execuções")
+        if diagnostico["execucoes"]:
+            ultimas = pd.DataFrame(diagnostico["execucoes"][::-1])
+            ultimas["metodos"] = ultimas["metodos"].apply(lambda metodos: ", ".join(f"{m} ×{n}" for m, n in metodos.items()))
+            st.dataframe(ultimas, use_container_width=True)
+
         
 
 if __name__ == "__main__":
-    interface()
\ No newline at end of file
+    try:
+        interface()
+    finally:
+        controlador.finalizar_pagina()
\ No newline at end of file